@@ -1,27 +1,33 @@
-import requests, base64, os, logging, json
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from .redis_client import redis_get
-
-# URL base da API da Facta
-base_url = "https://webservice.facta.com.br"
+import base64, os, logging, json, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from .budget import submit
+from .facta_combos import cidade_code, estado_civil_code
+from .http_pool import async_request, async_upstream_errors, get_session, upstream_errors
+from .metrics import timed
+from .redis_client import redis_get, redis_set
+from .state_store import get_fields
+from .token_cache import call_with_token, call_with_token_async
+
+# URL base da API da Facta (FACTA_BASE_URL aponta para outro ambiente, ex.: benchmarks)
+base_url = os.getenv("FACTA_BASE_URL", "https://webservice.facta.com.br")
 timeout = 60
 
+# etapas concluídas do cadastro de proposta ficam no Redis por FACTA_CHECKPOINT_TTL segundos
+checkpoint_ttl = int(os.getenv("FACTA_CHECKPOINT_TTL", 86400))
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("FACTA_PROPOSAL_WORKERS", 8)), thread_name_prefix="facta")
+
 # Configuração básica de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class FactaClient:
     def __init__(self):
-        self.session = requests.Session()
+        # sessão compartilhada pelo processo; tenta de novo até 3x se der erro de rede ou 5xx
+        self.session = get_session("facta")
         self.credentials = os.getenv("CREDENCIAIS_FACTA") # credenciais no .env
 
-        # tenta de novo até 3x se der erro de rede ou 5xx
-        retry = Retry(total=3, backoff_factor=0.05, status_forcelist=[429, 500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retry)
-
-        self.session.mount("https://", adapter)
-        
         # gera header de auth básica em base64
         credentials_base64 = base64.b64encode(self.credentials.encode()).decode()
         auth_header = f"Basic {credentials_base64}"
@@ -34,27 +40,44 @@ class FactaClient:
         
         return response.json()
     
-    def gera_token(self) -> str:
+    # a Facta informa a expiração como data/hora de Brasília (dd/mm/aaaa hh:mm:ss)
+    def _expires_in(self, data: dict) -> float | None:
+        if not data.get("expira"):
+            return None
+
         try:
-            response = self.session.get(f"{base_url}/gera-token", headers=self.headers, timeout=timeout)
+            expira = datetime.strptime(data.get("expira"), "%d/%m/%Y %H:%M:%S").replace(tzinfo=ZoneInfo("America/Sao_Paulo"))
 
-            return self._handle_response(response).get("token")
-        except requests.RequestException as exception:
-            logger.exception("Erro ao obter token: %s", exception)
+            return (expira - datetime.now(expira.tzinfo)).total_seconds()
+        except ValueError:
+            logger.warning("Formato de expiração do token Facta desconhecido: %s", data.get("expira"))
 
-            raise
+            return None
+
+    @timed("facta", "gera_token")
+    def _fetch_token(self):
+        response = self.session.get(f"{base_url}/gera-token", headers=self.headers, timeout=timeout)
+        data = self._handle_response(response)
+
+        return data.get("token"), self._expires_in(data)
+
+    # executa call(token) com o token compartilhado entre os workers; em 401 renova e tenta de novo
+    def with_token(self, call):
+        return call_with_token("facta", self._fetch_token, call)
 
+    @timed("facta")
     def fgts_saldo(self, cpf: str, token: str) -> dict:
         try:
             headers = {"Authorization": f"Bearer {token}"}
             response = self.session.get(f"{base_url}/fgts/saldo?cpf={cpf}", headers=headers, timeout=timeout)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro ao consultar saldo FGTS para CPF %s: %s", cpf, exception)
 
             raise
     
+    @timed("facta")
     def fgts_calculo(self, token: str, payload: dict) -> dict:
         try:
             headers = {
@@ -65,52 +88,64 @@ class FactaClient:
             response = self.session.post(f"{base_url}/fgts/calculo", headers=headers, json=payload, timeout=timeout)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro ao realizar cálculo FGTS: %s", exception)
 
             raise
 
+    @timed("facta")
     def proposta_etapa1_simulador(self, token: str, payload: dict) -> dict:
         try:
             headers = {"Authorization": f"Bearer {token}"}
             response = self.session.post(f"{base_url}/proposta/etapa1-simulador", headers=headers, json=payload, timeout=timeout)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro na Etapa 1 do simulador: %s", exception)
 
             raise
 
+    @timed("facta")
     def proposta_etapa2_dados_pessoais(self, token: str, payload: dict) -> dict:
         try:
             headers = {"Authorization": f"Bearer {token}"}
             response = self.session.post(f"{base_url}/proposta/etapa2-dados-pessoais", headers=headers, json=payload, timeout=timeout)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro na Etapa 2 dos dados pessoais: %s", exception)
 
             raise
 
-    def proposta_combos_estado_civil(self, token: str, estadoCivil: str) -> str | None:
+    # tabela completa de estados civis: {codigo: descricao}
+    @timed("facta")
+    def proposta_combos_estado_civil_lista(self, token: str) -> dict:
         try:
             headers = {"Authorization": f"Bearer {token}"}
             response = self.session.get(f"{base_url}/proposta-combos/estado-civil", headers=headers, timeout=timeout)
-            data = self._handle_response(response)
-            matrialStatus = data.get("estado_civil")
-
-            for key, value in matrialStatus.items():
-            
-                if value == estadoCivil:
-                    return key
 
-            return None  
-        except requests.RequestException as exception:
+            return self._handle_response(response).get("estado_civil") or {}
+        except upstream_errors as exception:
             logger.exception("Erro ao obter estado civil: %s", exception)
 
             raise
 
-    def proposta_combos_cidade(self, token: str, estado: str, cidade: str) -> str:
+    def proposta_combos_estado_civil(self, token: str, estadoCivil: str) -> str | None:
+        matrialStatus = self.proposta_combos_estado_civil_lista(token)
+
+        return self._estado_civil_key(matrialStatus, estadoCivil)
+
+    def _estado_civil_key(self, matrialStatus: dict, estadoCivil: str) -> str | None:
+        for key, value in matrialStatus.items():
+        
+            if value == estadoCivil:
+                return key
+
+        return None  
+
+    # cidades do estado que batem com o nome buscado: {codigo: nome}
+    @timed("facta")
+    def proposta_combos_cidade_lista(self, token: str, estado: str, cidade: str) -> dict:
         try:
             headers = {"Authorization": f"Bearer {token}"}
             
@@ -120,9 +155,18 @@ class FactaClient:
             }
 
             response = self.session.get(f"{base_url}/proposta-combos/cidade", headers=headers, params=params, timeout=timeout)
-            data = self._handle_response(response)
-            cities = data.get("cidade") or {}
 
+            return self._handle_response(response).get("cidade") or {}
+        except upstream_errors as exception:
+            logger.exception("Erro ao consultar cidade combo para cidade %s, estado %s: %s", cidade, estado, exception)
+
+            raise
+
+    def proposta_combos_cidade(self, token: str, estado: str, cidade: str) -> str:
+        return self._first_city(self.proposta_combos_cidade_lista(token, estado, cidade), estado, cidade)
+
+    def _first_city(self, cities: dict, estado: str, cidade: str) -> str:
+        try:
             if not cities:
                 raise ValueError(f"Cidade '{cidade}' não encontrada para o estado '{estado}'.")
             
@@ -132,57 +176,128 @@ class FactaClient:
                 raise ValueError(f"Cidade '{cidade}' não encontrada na resposta.")
             
             return city_id
-        except requests.RequestException as exception:
-            logger.exception("Erro ao consultar cidade combo para cidade %s, estado %s: %s", cidade, estado, exception)
-
-            raise
         except ValueError as value_error:
             logger.exception(value_error)
 
             raise
     
+    @timed("facta")
     def proposta_etapa3_proposta_cadastro(self, token: str, payload: dict):
         try:
             headers = {"Authorization": f"Bearer {token}"}
             response = self.session.post(f"{base_url}/proposta/etapa3-proposta-cadastro", headers=headers, json=payload, timeout=timeout)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro na Etapa 3 do cadastro da proposta: %s", exception)
 
             raise
 
+# só o que a cotação assíncrona usa (quote.run_quotes_async), com httpx: token, saldo e
+# cálculo FGTS. O cadastro de proposta continua no FactaClient
+class AsyncFactaClient(FactaClient):
+    @timed("facta", "gera_token")
+    async def _fetch_token(self):
+        response = await async_request("facta", "GET", f"{base_url}/gera-token", headers=self.headers, timeout=timeout)
+        data = self._handle_response(response)
+
+        return data.get("token"), self._expires_in(data)
+
+    async def with_token(self, call):
+        return await call_with_token_async("facta", self._fetch_token, call)
+
+    @timed("facta")
+    async def fgts_saldo(self, cpf: str, token: str) -> dict:
+        try:
+            headers = {"Authorization": f"Bearer {token}"}
+            response = await async_request("facta", "GET", f"{base_url}/fgts/saldo?cpf={cpf}", headers=headers, timeout=timeout)
+
+            return self._handle_response(response)
+        except async_upstream_errors as exception:
+            logger.exception("Erro ao consultar saldo FGTS para CPF %s: %s", cpf, exception)
+
+            raise
+
+    @timed("facta")
+    async def fgts_calculo(self, token: str, payload: dict) -> dict:
+        try:
+            headers = {
+                "Authorization": f"Bearer {token}", 
+                "Content-Type": "application/json"
+            }
+
+            response = await async_request("facta", "POST", f"{base_url}/fgts/calculo", headers=headers, json=payload, timeout=timeout)
+
+            return self._handle_response(response)
+        except async_upstream_errors as exception:
+            logger.exception("Erro ao realizar cálculo FGTS: %s", exception)
+
+            raise
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+# uma simulação (contato + CPF + simulação FGTS escolhida) gera no máximo um id_simulador
+def _checkpoint_key(contactId, cpf, simulacao_fgts):
+    return f"facta:proposta:{contactId}:{cpf}:{_digest(simulacao_fgts)}"
+
+def _load_checkpoint(key) -> dict:
+    cached = redis_get(key)
+
+    return json.loads(cached) if cached else {}
+
+def _save_checkpoint(key, checkpoint: dict, **stage):
+    checkpoint.update(stage)
+    redis_set(key, json.dumps(checkpoint), ex=checkpoint_ttl)
+
+# Cadastro da proposta em etapas: etapa1 (id_simulador) roda junto com a busca dos
+# combos, e cada etapa concluída é gravada no Redis. Se uma etapa falhar, a próxima
+# tentativa continua de onde parou em vez de criar outro id_simulador na Facta.
+# A etapa 2 é refeita se os dados pessoais/bancários mudarem (ex.: conta corrigida).
 def register_proposal_facta(contactId, cpf, dataNascimento, renda, nome, sexo, estadoCivil, rg, estadoRg, dataExpedicao, celular, cep, endereco, numero, bairro, estado, nomeMae, nomePai, clienteIletradoImpossibilitado, banco, agencia, conta, tipoConta, cidade):
     try:
-        state_json = redis_get(contactId)
-        state = json.loads(state_json)
-        simulacao_fgts = state.get("simulacao_fgts")
+        simulacao_fgts = get_fields(contactId, "simulacao_fgts").get("simulacao_fgts")
         client = FactaClient()
-        token = client.gera_token()
-
-        # monta payload inicial
-        payload = {
-            "produto": "D",
-            "tipo_operacao": "13",
-            "averbador": "20095",
-            "convenio": "3",
-            "cpf": cpf,
-            "data_nascimento": dataNascimento,
-            "valor_renda": renda,
-            "simulacao_fgts": simulacao_fgts,
-            "login_certificado": os.getenv("LOGIN_CERTIFICADO"),  
-        }
+        key = _checkpoint_key(contactId, cpf, simulacao_fgts)
+        checkpoint = _load_checkpoint(key)
+
+        # proposta já cadastrada nesta simulação (ex.: falhou depois, na Newcorban)
+        if checkpoint.get("codigo"):
+            logger.info("Proposta Facta %s já cadastrada para o contato %s", checkpoint.get("codigo"), contactId)
+
+            return checkpoint.get("codigo"), checkpoint.get("url_formalizacao")
+
+        # combos não dependem da etapa 1: busca em paralelo (tabelas em cache local)
+        estado_civil_future = submit(_executor, estado_civil_code, client, estadoCivil)
+        city_future = submit(_executor, cidade_code, client, estado, cidade)
 
         # etapa 1
-        response = client.proposta_etapa1_simulador(token, payload)
-        logger.debug(f"[RESPONSE - proposta_etapa1_simulador]: {response}")
-        # busca código do estado civil e cidade
-        estado_civil = client.proposta_combos_estado_civil(token, estadoCivil)
-        city = client.proposta_combos_cidade(token, estado, cidade)
+        if not checkpoint.get("id_simulador"):
+            payload = {
+                "produto": "D",
+                "tipo_operacao": "13",
+                "averbador": "20095",
+                "convenio": "3",
+                "cpf": cpf,
+                "data_nascimento": dataNascimento,
+                "valor_renda": renda,
+                "simulacao_fgts": simulacao_fgts,
+                "login_certificado": os.getenv("LOGIN_CERTIFICADO"),  
+            }
+
+            response = client.with_token(lambda token: client.proposta_etapa1_simulador(token, payload))
+            logger.debug(f"[RESPONSE - proposta_etapa1_simulador]: {response}")
+
+            if response.get("id_simulador"):
+                _save_checkpoint(key, checkpoint, id_simulador=response.get("id_simulador"))
+
+        id_simulador = checkpoint.get("id_simulador")
+        estado_civil = estado_civil_future.result()
+        city = city_future.result()
 
         # etapa 2
         payload_etapa2 = {
-            "id_simulador": response.get("id_simulador"),
+            "id_simulador": id_simulador,
             "cpf": cpf,
             "nome": nome,
             "sexo": sexo[0] if sexo else None,
@@ -213,20 +328,30 @@ def register_proposal_facta(contactId, cpf, dataNascimento, renda, nome, sexo, e
             "tipo_conta": "C" if tipoConta == "CONTA_CORRENTE" else "P",
             "email": os.getenv("EMAIL")
         }
+        dados = _digest(payload_etapa2)
 
-        responseEtapa2 = client.proposta_etapa2_dados_pessoais(token, payload_etapa2)
+        if not checkpoint.get("codigo_cliente") or checkpoint.get("dados") != dados:
+            responseEtapa2 = client.with_token(lambda token: client.proposta_etapa2_dados_pessoais(token, payload_etapa2))
+
+            if responseEtapa2.get("codigo_cliente"):
+                _save_checkpoint(key, checkpoint, codigo_cliente=responseEtapa2.get("codigo_cliente"), dados=dados)
+            else:
+                checkpoint["codigo_cliente"] = None
 
         # etapa 3
         payload_etapa3 = {
-            "codigo_cliente": responseEtapa2.get("codigo_cliente"),
-            "id_simulador": response.get("id_simulador"),
+            "codigo_cliente": checkpoint.get("codigo_cliente"),
+            "id_simulador": id_simulador,
             "po_formalizacao": "DIG"
         }
 
-        responseEtapa3 = client.proposta_etapa3_proposta_cadastro(token, payload_etapa3)
+        responseEtapa3 = client.with_token(lambda token: client.proposta_etapa3_proposta_cadastro(token, payload_etapa3))
+
+        if responseEtapa3.get("codigo"):
+            _save_checkpoint(key, checkpoint, codigo=responseEtapa3.get("codigo"), url_formalizacao=responseEtapa3.get("url_formalizacao"))
 
         return responseEtapa3.get("codigo"), responseEtapa3.get("url_formalizacao")
-    except requests.RequestException as exception:
+    except upstream_errors as exception:
         logger.exception("Erro ao registrar proposta: %s", exception)
 
-        raise
\ No newline at end of file
+        raise
@@ -1,17 +1,34 @@
-import json, requests, os, logging, base64, re
+import json, requests, os, logging, re, time
 from enum import Enum
 from pathlib import Path
-from flask import Flask, request
+from flask import Flask, Response, jsonify, request
 from pydantic import BaseModel, field_validator
-from clients.parana import ParanaClient
 from services.proposal import create_proposal
-from clients.redis_client import redis_get, redis_set
+from services.banks import bank_name, resolve_bank
+from services.cpf import validate_cpf
+from services.dedup import dedup_stats, first_delivery, forget_delivery
+from services.dispatcher import dead_letter_count, dispatch, dispatcher
+from services.media import load_asset
+from services.quote import best_quote, run_quotes
+from clients.budget import budget
+from clients.circuit_breaker import breaker_stats
+from clients.contact_lock import ContactBusyError, contact_lock, done_pending, drop_pending, next_pending, push_pending
+from clients.http_pool import get_session, pool_stats, upstream_errors
+from clients.metrics import await_reply, observe, render, span
+from clients.redis_client import cache_stats
+from clients.state_store import finish_state, finished_field, load_state, save_state
+from services.task_queue import RetryLater, celery_app, enqueue, task
+from services.ticket_cache import get_assignment, set_assignment, update_from_event
 
 app = Flask(__name__)
 contact_mapping = {}
 url = os.getenv("URL")
 service_id = os.getenv("SERVICE_ID")
 token = os.getenv("DIGISAC_TOKEN")
+digisac = get_session("digisac")
+
+# mídias carregadas uma vez na inicialização
+bank_authorization_image = load_asset(Path(__file__).resolve().parent / "a.jpeg", "image/jpeg")
 
 headers = {
     "Authorization": token,
@@ -20,6 +37,9 @@ headers = {
 
 
 logging.getLogger("werkzeug").setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
+
+unavailable_message = "Estamos com instabilidade no momento 😕 Por favor, tente novamente em alguns minutos."
 
 class State(Enum):
     INICIAL = "INICIAL"
@@ -113,7 +133,7 @@ def process_response(text, contactId, number, state):
     
     if len(partes) == 4:
         dados_bancarios["tipo_conta"] = partes[0].capitalize()  
-        dados_bancarios["banco"] = 260 if partes[1] == "nubank" else partes[1] 
+        dados_bancarios["banco"] = resolve_bank(partes[1]) or partes[1]
         dados_bancarios["agencia"] = partes[2]  
         dados_bancarios["conta"] = partes[3]  
     
@@ -126,7 +146,7 @@ def process_response(text, contactId, number, state):
     message = (
         "Confirma as informações abaixo?\n\n"
         f"- Tipo da conta: {dados_bancarios["tipo_conta"]}\n"
-        f"- Nome do banco: {dados_bancarios["banco"]}\n"
+        f"- Nome do banco: {bank_name(dados_bancarios["banco"]) or dados_bancarios["banco"]}\n"
         f"- Número da agência: {dados_bancarios["agencia"]}\n"
         f"- Número da conta: {dados_bancarios["conta"]}\n"
     )
@@ -141,23 +161,6 @@ def process_response(text, contactId, number, state):
     set_state(contactId, state)
     send_message(message, contactId, number, type="interactive", name="confirmar_dados_bancarios", buttons=["ESTÃO CORRETAS", "NÃO ESTÃO CORRETAS"])  
 
-def validate_cpf(cpf):
-    cpf = re.sub(r'\D', '', cpf)  
-
-    if len(cpf) != 11 or cpf == cpf[0] * 11:  
-        return False
-    
-    def calculate_digit(cpf, positions):
-        soma = sum(int(cpf[i]) * positions[i] for i in range(len(positions)))
-        return 0 if soma % 11 < 2 else 11 - (soma % 11)
-    
-    position1 = list(range(10, 1, -1))
-    position2 = list(range(11, 1, -1))
-    digit1 = calculate_digit(cpf, position1)
-    digit2 = calculate_digit(cpf, position2)
-    
-    return cpf[-2:] == f"{digit1}{digit2}"
-
 def handle_simulate_loan_state(contact_id, number, text, state):
     if text == "SIM":
         state["state"] = State.INICIAL.value
@@ -174,10 +177,14 @@ def handle_confirmar_dados_bancarios_state(contact_id, number, text, state):
         set_state(contact_id, state)
 
     message = create_proposal(contact_id)
-    print(text)
+    logger.debug("Confirmação dos dados bancários do contato %s: %s", contact_id, text)
     
     if text == "ESTÃO CORRETAS":
         send_message(message, contact_id, number)
+
+        # proposta cadastrada: conversa encerrada (vai para o arquivo se o cliente não voltar)
+        if message != "Nenhuma conta encontrada!":
+            finish_state(contact_id)
     elif "pouco" in text.lower() or "muito pouco" in text.lower():
         name = state.get("name")
 
@@ -194,19 +201,19 @@ def handle_confirmar_dados_bancarios_state(contact_id, number, text, state):
         send_message(message, contact_id, number, type="interactive", name="confirmar_dados_bancarios", buttons=["ESTÃO CORRETAS", "NÃO ESTÃO CORRETAS"])
 
 def get_state(contactId):
-    state = redis_get(contactId)
-    print(f"[STATE]: {state} \n")
+    state = load_state(contactId)
 
-    if state:
-        return json.loads(state)
-    
-    return {"interation": 0}
+    if not state:
+        state["interation"] = 0
+
+    return state
 
 def set_state(contactId, state):
-    redis_set(contactId, json.dumps(state))
+    save_state(contactId, state)
 
 def menu_initial(contactId, number, state):
     state["state"] = State.INICIAL.value
+    state.pop(finished_field, None)
     name = state.get("name", "")
 
     message = (
@@ -218,41 +225,37 @@ def menu_initial(contactId, number, state):
     send_message(message, contactId, number, type="interactive", name="menu_inicial", buttons=["CONSIGNADO CLT", "ANTECIPAR FGTS"])
     set_state(contactId, state)
 
-def send_message(message, contactId, number, type="simple", name=None, buttons=None):
-    try:
-        payload = {"contactId": contactId, "number": number, "serviceId": service_id}
-        
-        if type == "simple":
-            payload.update({
-                "type": "chat",
-                "origin": "bot",
-                "text": message
-            })
-        else:
-            payload.update({
-                "type": "chat",
-                "interactiveMessage": {
-                    "name": name,
-                    "interactive": {
-                        "type": "button",
-                        "action": {
-                            "buttons": [{"type": "reply", "reply": {"title": title}} for title in buttons]
-                        },
-                        "body": {
-                            "text": message
-                        }
+def message_payload(message, contactId, number, type="simple", name=None, buttons=None):
+    payload = {"contactId": contactId, "number": number, "serviceId": service_id}
+    
+    if type == "simple":
+        payload.update({
+            "type": "chat",
+            "origin": "bot",
+            "text": message
+        })
+    else:
+        payload.update({
+            "type": "chat",
+            "interactiveMessage": {
+                "name": name,
+                "interactive": {
+                    "type": "button",
+                    "action": {
+                        "buttons": [{"type": "reply", "reply": {"title": title}} for title in buttons]
+                    },
+                    "body": {
+                        "text": message
                     }
                 }
-            })
+            }
+        })
 
-        response = requests.post(f"{url}/api/v1/messages", json=payload, headers=headers, timeout=60)  
+    return payload
 
-        if response.status_code != 200:
-            logging.error(f"Falha ao enviar mensagem. Status: {response.status_code}, Response: {response.text}")
-    except requests.exceptions.Timeout as exception:
-        logging.exception("A requisição excedeu o tempo de resposta (timeout): %s", exception)
-    except requests.exceptions.RequestException as exception:
-        logging.exception("Ocorreu um erro durante a requisição: %s", exception)
+# coloca a mensagem na fila de envio do contato; o dispatcher entrega em ordem, com retry
+def send_message(message, contactId, number, type="simple", name=None, buttons=None):
+    dispatch(contactId, "POST", "/api/v1/messages", json=message_payload(message, contactId, number, type, name, buttons))
 
 def handle_state_inicial(contact_id, number, text, state):
     if text == "ANTECIPAR FGTS":
@@ -365,35 +368,42 @@ def simulate_fgts(text, contactId, number, state):
         state["CPF"] = cpf
         set_state(contactId, state)
 
-    parana = ParanaClient()
-    valor_liberado_parana = 0
+    results = run_quotes(cpf)
+    best = best_quote(results)
 
-    try:
-        token_parana_response = parana.auth_token()
-        token_parana = token_parana_response.get("access_token")
-        saldo_response = parana.fgts_saque_aniversario_saldo_disponivel(token_parana, cpf)
+    if best:
+        message = (
+            f"{name}, ótima notícia! Você tem *R${best["valorLiberado"]}* disponíveis para antecipação do seu saque-aniversário do FGTS. Esse valor já é seu e pode ser transferido rapidamente para sua conta assim que confirmarmos os dados. 😊\n"
+            "Gostaria de continuar com a antecipação e receber esse valor agora?"
+        )
 
-        if saldo_response.get("codigo") == "9":
-            send_message(saldo_response.get("mensagem"), contactId, number)
+        state["valorLiberado"] = best["valorLiberado"]
+        state["bancoId"] = best["bancoId"]
 
-            return
-        
-        if saldo_response.get("saldoTotal"):
-            saldos_por_periodos = saldo_response.get("saldosPorPeriodos")
-            simulacao_response = parana.fgts_saque_aniversario_simulacao(token_parana, cpf, saldos_por_periodos)
-            valor_liberado_parana = simulacao_response.get("valorLiberado")
-    except requests.RequestException as exception:
-        logging.exception("Erro ao interagir com a API Parana: %s", exception)
+        if best["banco"] == "facta":
+            state["prazo"] = best["prazo"]
+            state["taxa"] = best["taxa"]
+            state["tabela"] = best["tabela"]
+            state["simulacao_fgts"] = best["simulacao_fgts"]
+
+        state["state"] = "CONFIRMAR_DADOS_BANCARIOS"
 
-    from clients.api_facta import FactaClient
+        set_state(contactId, state)
+        send_message(message, contactId, number, type="interactive", name="simulate_fgts", buttons=["REALIZAR ANTECIPAÇÃO"])
+
+        return
 
-    facta = FactaClient()
-    token_facta = facta.gera_token()
-    saldo_facta = facta.fgts_saldo(cpf, token_facta)
-    print(f"[SALDO FACTA]: {saldo_facta}")
+    saldo_parana = results.get("parana") or {}
+    saldo_facta = results.get("facta")
+
+    if saldo_parana.get("codigo") == "9":
+        send_message(saldo_parana.get("mensagem"), contactId, number)
+    elif saldo_facta is None:
+        # nenhum banco respondeu a tempo
+        send_message("Um de nossos especialistas já vai te atender!", contactId, number)
+        transfer_call(contactId)
+    elif saldo_facta.get("erro"):
 
-    if saldo_facta.get("erro"):
-        
         if saldo_facta.get("mensagem") == "Existe uma Operação Fiduciária em andamento. Tente mais tarde. (5)":
             send_message("Não conseguimos simular a antecipação neste momento devido à data de seu aniversário. Mas fique tranquilo, nossa equipe está à disposição para te ajudar a encontrar a melhor solução assim que possível.", contactId, number)
         elif saldo_facta.get("mensagem") == "Cliente não possui saldo FGTS (101)":
@@ -405,77 +415,12 @@ def simulate_fgts(text, contactId, number, state):
 
             set_state(contactId, state)
             state_antecipar_fgts_autorizar_bancos(contactId, number, state.get("interation"))
-
-        return
-
-    retorno = saldo_facta.get("retorno")
-    retorno_normalizado = { key: ("0" if key.startswith("valor_") and float(value) < 5 else value) for key, value in retorno.items() }
-
-    payload = {
-        "cpf": cpf, 
-        "taxa": "1.8", 
-        "tabela": "60151", 
-        "parcelas": retorno_normalizado
-    }
-
-    pyld = {
-        "cpf": payload["cpf"], 
-        "taxa": payload["taxa"], 
-        "tabela": payload["tabela"], 
-        "parcelas": []
-    }   
-
-    for i in range(1, 11):
-        data = f"dataRepasse_{i}"
-        valor = f"valor_{i}"
-        data_val = payload["parcelas"].get(data)
-        valor_val = payload["parcelas"].get(valor)
-
-        if data_val is not None and valor_val is not None:
-            pyld["parcelas"].append({data: data_val, valor: valor_val})
-
-    response_calculo = facta.fgts_calculo(token_facta, pyld)
-    print(f"[RESPONSE_CALCULO]: {response_calculo}\n")
-
-    if response_calculo.get("permitido") == "NAO":
+    elif saldo_facta.get("permitido") == "NAO":
         send_message("Infelizmente não encontramos valor liberado. Atualmente você trabalha de carteira assinada? Se sim dia 20 seu saldo será atualizado", contactId, number)
-        
-        return
-    
-    valor_liberado_facta = response_calculo.get("valor_liquido")
-    prazo = sum(1 for key, value in retorno_normalizado.items() if key.startswith("valor_") and float(value) > 5)
-
-    if float(valor_liberado_parana or 0) > float(valor_liberado_facta or 0):
-        message = (
-            f"{name}, ótima notícia! Você tem *R${valor_liberado_parana}* disponíveis para antecipação do seu saque-aniversário do FGTS. Esse valor já é seu e pode ser transferido rapidamente para sua conta assim que confirmarmos os dados. 😊\n"
-            "Gostaria de continuar com a antecipação e receber esse valor agora?"
-        )
-        
-        state["valorLiberado"] = valor_liberado_parana
-        state["bancoId"] = 254
-    elif valor_liberado_facta == None:
+    else:
         send_message("Infelizmente não encontramos valor liberado. Atualmente você trabalha de carteira assinada? Se sim dia 20 seu saldo será atualizado", contactId, number)
         transfer_call(contactId)
 
-        return
-    else:
-        message = (
-            f"{name}, ótima notícia! Você tem *R${valor_liberado_facta}* disponíveis para antecipação do seu saque-aniversário do FGTS. Esse valor já é seu e pode ser transferido rapidamente para sua conta assim que confirmarmos os dados. 😊\n"
-            "Gostaria de continuar com a antecipação e receber esse valor agora?"
-        )
-        
-        state["valorLiberado"] = valor_liberado_facta
-        state["bancoId"] = 935
-        state["prazo"] = prazo
-        state["taxa"] = "1.8"
-        state["tabela"] = "60151" if valor_liberado_facta < 100 else ("60119" if valor_liberado_facta < 900 else "53694")
-        state["simulacao_fgts"] = response_calculo.get("simulacao_fgts")
-
-    state["state"] = "CONFIRMAR_DADOS_BANCARIOS"
-    
-    set_state(contactId, state)
-    send_message(message, contactId, number, type="interactive", name="simulate_fgts", buttons=["REALIZAR ANTECIPAÇÃO"])
-
 def state_antecipar_fgts_autorizar_bancos(contactId, number, interation):
 
     if interation == 1:    
@@ -488,43 +433,22 @@ def state_antecipar_fgts_autorizar_bancos(contactId, number, interation):
 
         send_message(message, contactId, number, type="interactive", name="antecipar_fgts_autorizar_bancos", buttons=["OK, AUTORIZADO", "QUERO TIRAR DÚVIDAS"])
 
-        image = Path(__file__).resolve().parent / "a.jpeg"
-
-        if not image:
+        if not bank_authorization_image:
             logging.error("Imagem não encontrada.")
 
             return
 
-        try:
-            with open(image, "rb") as file:
-                b64 = base64.b64encode(file.read()).decode("utf-8")
-        except Exception as exception:
-            logging.error(f"Erro ao ler a imagem {image.name}: {exception}")
-
+        file = bank_authorization_image.file_payload()
         payload = {
             "type": "media",
             "origin": "bot",
-            "file": {
-                "base64": b64,
-                "mimetype": "image/jpeg",
-                "name": image.name
-            },
+            "file": file,
             "serviceId": service_id,
             "contactId": contactId,
             "number": number
         }
 
-        try:
-            response = requests.post(f"{url}/api/v1/messages", json=payload, headers=headers, timeout=60)
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logging.error(f"Falha ao enviar imagem. Status: {response.status_code}, Response: {response.text}")
-        except requests.exceptions.Timeout as exception:
-            logging.exception("A requisição para enviar imagem excedeu o tempo de resposta (timeout): %s", exception)
-        except requests.exceptions.RequestException as e:
-            logging.exception("Ocorreu um erro durante a requisição para enviar imagem: %s", exception)
+        dispatch(contactId, "POST", "/api/v1/messages", **bank_authorization_image.callbacks(file), json=payload)
     if interation > 1:
         message = (
             "Vi aqui que nenhum banco está autorizado ainda!"
@@ -550,82 +474,213 @@ def transfer_call(contactId):
         "departmentId": "b17ee5c5-3ae8-4add-b0b7-c887cec43bbd"   
     }
 
-    requests.post(f"{url}/api/v1/contacts/{contactId}/ticket/transfer", headers=headers, data=payload)
+    # vai pela mesma fila das mensagens, pra transferir só depois que elas forem entregues
+    # o estado fica: o cliente costuma voltar para o bot depois do atendente, então a
+    # conversa transferida só sai do Redis pelo STATE_IDLE_TTL, não como encerrada
+    dispatch(contactId, "POST", f"/api/v1/contacts/{contactId}/ticket/transfer", data=payload)
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
-    print('123')
-    payload = request.get_json()
-    event = payload.get("event")
+    return "", accept_event(request.get_json(silent=True))
+
+# valida, filtra e enfileira o evento do Digisac; devolve o status HTTP da resposta
+# (usado pelo Flask e pela entrada ASGI em asgi.py)
+def accept_event(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get("data"), dict):
+        return 400
+
+    event = payload.get("event") or ""
     data = payload.get("data")
     contact_id = data.get("contactId")
-    text = data.get("text")
 
-    print(payload)
+    logger.debug("Webhook recebido: %s", payload)
 
-    if event == "message.updated" or data.get("isFromMe") or not contact_id or "ticket" in event:
-        return "", 200
+    # eventos de ticket só atualizam o cache de atendimento
+    if "ticket" in event:
+        update_from_event(event, data)
 
-    if contact_id:
-        query = {
-            "where": {"isOpen": True},
-            "include": [
-                {
-                    "model": "contact",
-                    "required": True,
-                    "where": {
-                        "visible": True,
-                        "id": contact_id
-                    }
+        return 200
+
+    if event == "message.updated" or data.get("isFromMe") or not contact_id:
+        return 200
+
+    # o Digisac reenvia o evento quando a resposta demora: processa cada mensagem uma vez só
+    with span("chatbot_stage_seconds", stage="dedup", state=""):
+        if not first_delivery(event, data.get("id")):
+            return 200
+
+    # horário de chegada, para a latência de ponta a ponta (mensagem → resposta do bot)
+    payload["received_at"] = time.time()
+
+    # responde o Digisac na hora e deixa o atendimento para os workers da fila; o evento
+    # entra na lista do contato na ordem de chegada e a tarefa só avisa que há o que processar
+    with span("chatbot_stage_seconds", stage="enqueue", state=""):
+        raw = push_pending(contact_id, payload)
+
+        try:
+            enqueue(process_contact, contact_id, key=contact_id)
+        except Exception:
+            # sem fila o evento não foi processado: tira da lista e libera a chave pra aceitar a reentrega
+            drop_pending(contact_id, raw)
+            forget_delivery(event, data.get("id"))
+
+            raise
+
+    return 200
+
+# verifica se o ticket aberto do contato já foi assumido por um atendente
+def contact_has_attendant(contact_id):
+    cached = get_assignment(contact_id)
+
+    if cached is not None:
+        return bool(cached.get("userId"))
+
+    query = {
+        "where": {"isOpen": True},
+        "include": [
+            {
+                "model": "contact",
+                "required": True,
+                "where": {
+                    "visible": True,
+                    "id": contact_id
                 }
-            ]
-        }
+            }
+        ]
+    }
+
+    query_string = json.dumps(query)
+    final_url = f"{url}/api/v1/tickets?query={query_string}"
+    responseTickets = digisac.get(final_url, headers=headers, timeout=60)
+    responseTickets_json = responseTickets.json()
+    dataTickets = next(iter(responseTickets_json.get("data") or []), None)
 
-        query_string = json.dumps(query)
-        final_url = f"{url}/api/v1/tickets?query={query_string}"
-        responseTickets = requests.get(final_url, headers=headers)
-        responseTickets_json = responseTickets.json()
-        dataTickets = responseTickets_json["data"][0]
+    set_assignment(contact_id, dataTickets)
 
-        if dataTickets.get("userId"):
-            print('Cliente já está em um chamado')
-            return "", 200
+    return bool(dataTickets and dataTickets.get("userId"))
+
+@task
+def process_contact(contact_id):
+    started = time.perf_counter()
+
+    # um contato por vez, um evento por lock: mensagens seguidas do mesmo contato não
+    # disputam o estado e são atendidas na ordem em que o webhook as recebeu;
+    # cada evento tem o seu prazo MESSAGE_DEADLINE
+    try:
+        while True:
+            with contact_lock(contact_id):
+                if started:
+                    observe("chatbot_stage_seconds", time.perf_counter() - started, stage="lock_wait", state="", outcome="ok")
+                    started = None
+
+                payload = next_pending(contact_id)
+
+                if payload is None:
+                    return
+
+                try:
+                    with budget():
+                        handle_event(payload)
+                except upstream_errors as exception:
+                    # banco, Newcorban ou Digisac fora do ar (ou lento além do prazo): o cliente
+                    # recebe um aviso em vez de ficar sem resposta
+                    logger.warning("Atendimento do contato %s interrompido por falha externa: %s", contact_id, exception)
+                    reply_unavailable(payload)
+                except Exception as exception:
+                    logger.exception("Erro ao processar evento do contato %s: %s", contact_id, exception)
+
+                done_pending(contact_id)
+    except ContactBusyError as exception:
+        # outro worker está com o contato e processa a lista: volta para a fila em vez de
+        # esperar o lock aqui, para o caso de ele já ter terminado antes deste evento chegar
+        raise RetryLater(str(exception)) from exception
+
+def reply_unavailable(payload):
+    data = payload.get("data")
+    number = (data.get("data") or {}).get("number")
+
+    if number:
+        send_message(unavailable_message, data.get("contactId"), number)
+
+# formato anterior da tarefa (evento inteiro na mensagem): atende o que já estava na fila no deploy
+@task
+def process_event(payload):
+    contact_id = payload.get("data").get("contactId")
+    push_pending(contact_id, payload)
+    process_contact(contact_id)
+
+def handle_event(payload):
+    data = payload.get("data")
+    contact_id = data.get("contactId")
+    text = data.get("text")
+
+    if contact_id:
+        with span("chatbot_stage_seconds", stage="ticket_lookup", state=""):
+            has_attendant = contact_has_attendant(contact_id)
+
+        if has_attendant:
+            logger.debug("Contato %s já está em um chamado", contact_id)
+            return
             
         
-        state = get_state(contact_id)
+        with span("chatbot_stage_seconds", stage="state_load", state=""):
+            state = get_state(contact_id)
+
         number = data.get("data").get("number")
+        current_state = state.get("state") or "NOVO"
+
+        await_reply(contact_id, payload.get("received_at"), current_state)
 
         if "name" not in state:
-            response = requests.get(f"{url}/api/v1/contacts/{contact_id or number}", headers=headers)
-            response_json = response.json()
+            with span("chatbot_stage_seconds", stage="contact_lookup", state=current_state):
+                response = digisac.get(f"{url}/api/v1/contacts/{contact_id or number}", headers=headers)
+                response_json = response.json()
 
             if response_json.get("isGroup"):
-                return "", 200
+                return
 
             state["name"] = response_json.get("name")
             set_state(contact_id, state)
 
-        if "state" not in state or text == "0" or state == None:
-            menu_initial(contact_id, number, state)
+        with span("chatbot_stage_seconds", stage="handler", state=current_state):
+            handle_state(contact_id, number, text, state)
 
-            return "", 200
-        
-        if state.get("state") == State.INICIAL.value:
-            handle_state_inicial(contact_id, number, text, state)
-        elif state.get("state") == State.ANTECIPAR_FGTS.value:
-            hanlde_state_antecipar_fgts(contact_id, number, text, state)
-        elif state.get("state") == State.ANTECIPAR_FGTS_OPTANTE_SAQUE_ANIVERSARIO.value:
-            handle_state_antecipar_fgts_verificar_saque_aniversario_tirar_duvidas(text, contact_id, number, state)
-        elif state.get("state") == State.CONFIRMAR_DADOS_BANCARIOS.value or state.get("state") == State.MAKE_ANTECIPATION.value:
-            handle_confirmar_dados_bancarios_state(contact_id, number, text, state)
-        elif state.get("state") == State.CREDITO_CONSIGNADO.value:
-            handle_simulate_loan_state(contact_id, number, text, state)
-        elif state.get("state") == State.COLETAR_DADOS_BANCARIOS.value:
-            process_response(text, contact_id, number, state)
-        else:
-            pass
+def handle_state(contact_id, number, text, state):
+    if "state" not in state or text == "0" or state == None:
+        menu_initial(contact_id, number, state)
 
-    return "", 200
+        return
+    
+    if state.get("state") == State.INICIAL.value:
+        handle_state_inicial(contact_id, number, text, state)
+    elif state.get("state") == State.ANTECIPAR_FGTS.value:
+        hanlde_state_antecipar_fgts(contact_id, number, text, state)
+    elif state.get("state") == State.ANTECIPAR_FGTS_OPTANTE_SAQUE_ANIVERSARIO.value:
+        handle_state_antecipar_fgts_verificar_saque_aniversario_tirar_duvidas(text, contact_id, number, state)
+    elif state.get("state") == State.CONFIRMAR_DADOS_BANCARIOS.value or state.get("state") == State.MAKE_ANTECIPATION.value:
+        handle_confirmar_dados_bancarios_state(contact_id, number, text, state)
+    elif state.get("state") == State.CREDITO_CONSIGNADO.value:
+        handle_simulate_loan_state(contact_id, number, text, state)
+    elif state.get("state") == State.COLETAR_DADOS_BANCARIOS.value:
+        process_response(text, contact_id, number, state)
+    else:
+        pass
+
+# estatísticas internas para ajuste de pools e filas
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "http_pools": pool_stats(),
+        "webhook_dedup": dedup_stats(),
+        "dispatcher": {"pending": dispatcher.pending(), "dead_letters": dead_letter_count()},
+        "circuit_breakers": breaker_stats(),
+        "redis_cache": cache_stats()
+    })
+
+# histogramas de latência e gauges no formato do Prometheus
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 3000))
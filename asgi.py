@@ -0,0 +1,77 @@
+import json, asyncio, logging
+from app import accept_event
+from clients.http_pool import close_async_clients
+from clients.metrics import render
+
+# Entrada ASGI do webhook, para rodar com qualquer servidor ASGI (ex.: `uvicorn asgi:application`).
+# O corpo é lido sem ocupar thread e só a aceitação do evento (dedup + fila, rápida) vai
+# para uma thread. O atendimento (handle_event) continua nas threads bloqueantes das
+# partições da fila (QUEUE_WORKERS): com QUOTE_ENGINE=async só as consultas de cotação
+# aos bancos rodam no event loop do httpx, enquanto a thread da partição espera o resultado.
+logger = logging.getLogger(__name__)
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    return body
+
+async def _respond(send, status, body=b""):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+    await send({"type": "http.response.body", "body": body})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+
+        return
+
+    if scope["type"] != "http":
+        return
+
+    if scope["path"] == "/metrics" and scope["method"] == "GET":
+        await _respond(send, 200, (await asyncio.to_thread(render)).encode())
+
+        return
+
+    if scope["path"] != "/webhook":
+        await _respond(send, 404)
+
+        return
+
+    if scope["method"] != "POST":
+        await _respond(send, 405)
+
+        return
+
+    body = await _read_body(receive)
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+
+    try:
+        status = await asyncio.to_thread(accept_event, payload)
+    except Exception as exception:
+        logger.exception("Erro ao aceitar evento do webhook: %s", exception)
+        status = 500
+
+    await _respond(send, status)
@@ -0,0 +1,113 @@
+import os, csv, json, time, logging, threading, unicodedata
+from pathlib import Path
+from clients.http_pool import get_session
+from clients.redis_client import redis_get, redis_set
+
+# Registro local de bancos (código COMPE -> nome), carregado na inicialização a
+# partir do banks.csv que vai junto com o código. Com BANKS_REFRESH_INTERVAL > 0
+# a lista completa é atualizada periodicamente pela BrasilAPI e compartilhada
+# entre os workers via Redis; sem rede, o arquivo embarcado continua valendo.
+# A lista do Redis só é lida na primeira consulta, pra que a inicialização não
+# dependa do Redis (nem espere por ele quando estiver fora do ar).
+refresh_interval = int(os.getenv("BANKS_REFRESH_INTERVAL", 0))
+brasilapi_url = os.getenv("BRASILAPI_URL", "https://brasilapi.com.br")
+data_file = Path(__file__).resolve().parent / "banks.csv"
+
+logger = logging.getLogger(__name__)
+
+# nomes que os clientes costumam digitar
+aliases = {
+    "NUBANK": 260, "NU": 260, "ITAU": 341, "BRADESCO": 237, "NEXT": 237,
+    "CAIXA": 104, "CAIXA ECONOMICA": 104, "CEF": 104, "BANCO DO BRASIL": 1, "BB": 1,
+    "SANTANDER": 33, "INTER": 77, "BANCO INTER": 77, "C6": 336, "C6 BANK": 336,
+    "PICPAY": 380, "MERCADO PAGO": 323, "PAGBANK": 290, "PAGSEGURO": 290, "NEON": 536,
+    "ORIGINAL": 212, "SICOOB": 756, "SICREDI": 748, "BANRISUL": 41, "SAFRA": 422,
+    "BTG": 208, "PAN": 623, "BANCO PAN": 623, "AGIBANK": 121, "BMG": 318, "DIGIO": 335,
+    "XP": 348, "STONE": 197, "CORA": 403, "BRB": 70, "BNB": 4, "DAYCOVAL": 707, "MERCANTIL": 389
+}
+
+_names = {}
+_codes = {}
+_refresh_thread = None
+_overlay_loaded = False
+_overlay_lock = threading.Lock()
+
+def normalize(text) -> str:
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return " ".join(text.upper().split())
+
+def _apply(names: dict):
+    global _names, _codes
+
+    _names = dict(names)
+    _codes = {normalize(name): code for code, name in names.items()}
+
+def _load():
+    with open(data_file, encoding="utf-8") as file:
+        _apply({int(row["codigo"]): row["nome"] for row in csv.DictReader(file, delimiter=";")})
+
+# lista atualizada que algum worker gravou no Redis (refresh_banks), por cima do arquivo
+def _load_overlay():
+    global _overlay_loaded
+
+    if _overlay_loaded:
+        return
+
+    with _overlay_lock:
+        if _overlay_loaded:
+            return
+
+        cached = redis_get("banks:index")
+
+        if cached:
+            _apply({**_names, **{int(code): name for code, name in json.loads(cached).items()}})
+
+        _overlay_loaded = True
+
+def bank_name(code) -> str | None:
+    _load_overlay()
+
+    try:
+        return _names.get(int(code))
+    except (TypeError, ValueError):
+        return None
+
+# converte o que o cliente digitou (código, apelido ou nome) no código do banco
+def resolve_bank(text) -> int | None:
+    _load_overlay()
+    value = normalize(text)
+
+    if value.isdigit():
+        return int(value) if int(value) in _names else None
+
+    for prefix in ("BANCO ", "BCO "):
+        if value.startswith(prefix) and value[len(prefix):] in aliases:
+            return aliases[value[len(prefix):]]
+
+    return aliases.get(value) or _codes.get(value)
+
+def refresh_banks():
+    response = get_session("brasilapi").get(f"{brasilapi_url}/api/banks/v1", timeout=30)
+    response.raise_for_status()
+    names = {bank["code"]: bank["name"] for bank in response.json() if bank.get("code")}
+
+    redis_set("banks:index", json.dumps(names))
+    _apply({**_names, **names})
+    logger.info("Registro de bancos atualizado (%s bancos)", len(names))
+
+def _refresh_loop():
+    while True:
+        try:
+            refresh_banks()
+        except Exception as exception:
+            logger.exception("Erro ao atualizar registro de bancos: %s", exception)
+
+        time.sleep(refresh_interval)
+
+_load()
+
+if refresh_interval > 0:
+    _refresh_thread = threading.Thread(target=_refresh_loop, daemon=True, name="banks-refresh")
+    _refresh_thread.start()
@@ -0,0 +1,90 @@
+import sys, json, time, random, argparse
+from .load import random_cpf
+
+# Benchmark da validação de CPF em lote (services.cpf): validate_cpf() linha a linha
+# contra validate_cpfs()/normalize_cpfs() com NumPy, numa lista parecida com as de
+# campanha (CPFs com e sem máscara, dígito errado, zeros à esquerda perdidos, lixo).
+# Confere também que as duas formas dão o mesmo resultado.
+#
+#   python -m benchmarks.cpf
+#   python -m benchmarks.cpf --rows 5000000 --json cpf.json
+
+def sample_values(rng, rows) -> list:
+    values = []
+
+    for _ in range(rows):
+        cpf = random_cpf(rng)
+        roll = rng.random()
+
+        if roll < 0.3:
+            cpf = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+        elif roll < 0.4:
+            cpf = cpf[:-1] + str((int(cpf[-1]) + 1) % 10)
+        elif roll < 0.45:
+            cpf = cpf.lstrip("0") or "0"
+        elif roll < 0.47:
+            cpf = cpf[0] * 11
+        elif roll < 0.5:
+            cpf = f"CPF {cpf} "
+
+        values.append(cpf)
+
+    return values
+
+def _best(fn, repeat) -> float:
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.cpf", description="Validação de CPF linha a linha x em lote (NumPy).")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="ARQUIVO")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from services.cpf import normalize_cpfs, validate_cpf, validate_cpfs
+
+    values = sample_values(random.Random(args.seed), args.rows)
+    column = np.array(values)
+    expected = np.fromiter((validate_cpf(value) for value in values), dtype=bool, count=len(values))
+
+    if not (validate_cpfs(column) == expected).all():
+        raise SystemExit("validate_cpfs divergiu de validate_cpf")
+
+    timings = {
+        "validate_cpf (loop)": _best(lambda: [validate_cpf(value) for value in values], args.repeat),
+        "validate_cpfs (lista)": _best(lambda: validate_cpfs(values), args.repeat),
+        "validate_cpfs (array)": _best(lambda: validate_cpfs(column), args.repeat),
+        "normalize_cpfs (array)": _best(lambda: normalize_cpfs(column), args.repeat)
+    }
+    baseline = timings["validate_cpf (loop)"]
+    result = {
+        "rows": args.rows,
+        "valid": int(expected.sum()),
+        "valid_padded": int(normalize_cpfs(column)[1].sum()),
+        "timings": {name: {"seconds": round(seconds, 4), "rows_per_second": round(args.rows / seconds), "speedup": round(baseline / seconds, 1)} for name, seconds in timings.items()}
+    }
+
+    print(f"{args.rows} linhas, {result['valid']} válidas ({result['valid_padded']} com zeros à esquerda restaurados)\n")
+    print(f"{'método':<26}{'segundos':>10}{'linhas/s':>14}{'speedup':>9}")
+
+    for name, timing in result["timings"].items():
+        print(f"{name:<26}{timing['seconds']:>10}{timing['rows_per_second']:>14}{timing['speedup']:>8}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
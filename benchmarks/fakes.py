@@ -0,0 +1,339 @@
+import json, time, uuid, base64, random, threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Servidores HTTP locais que fazem o papel do Digisac, Paraná, Facta, Newcorban e
+# BrasilAPI nos benchmarks. Cada um tem o seu Behavior:
+#   - latency: distribuição do tempo de resposta, "fixed:MS", "uniform:MIN:MAX" ou
+#     "lognormal:MEDIANA_MS:SIGMA"
+#   - error_rate: fração de respostas 500
+#   - throttle_rate: fração de respostas 429 (com Retry-After: 1)
+#   - timeout_rate: fração de requisições que ficam paradas timeout_seconds antes de responder
+
+class Behavior:
+    def __init__(self, latency="fixed:0", error_rate=0.0, throttle_rate=0.0, timeout_rate=0.0, timeout_seconds=65.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.random = random.Random()
+
+    def delay(self) -> float:
+        kind, *params = self.latency.split(":")
+        params = [float(param) for param in params]
+
+        if kind == "fixed":
+            return params[0] / 1000
+
+        if kind == "uniform":
+            return self.random.uniform(params[0], params[1]) / 1000
+
+        if kind == "lognormal":
+            return params[0] * self.random.lognormvariate(0, params[1]) / 1000
+
+        raise ValueError(f"Distribuição de latência desconhecida: {self.latency}")
+
+    # status forçado (429/500) ou None para responder normalmente
+    def outcome(self):
+        roll = self.random.random()
+
+        if roll < self.timeout_rate:
+            time.sleep(self.timeout_seconds)
+        elif roll < self.timeout_rate + self.error_rate:
+            return 500
+        elif roll < self.timeout_rate + self.error_rate + self.throttle_rate:
+            return 429
+
+        return None
+
+class FakeUpstream:
+    """Servidor HTTP local; subclasses definem routes() -> {(método, caminho): handler}."""
+
+    name = None
+
+    def __init__(self, behavior=None):
+        self.behavior = behavior or Behavior()
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        self.server = None
+
+    def routes(self) -> dict:
+        raise NotImplementedError
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+
+        return f"http://{host}:{port}"
+
+    def start(self):
+        upstream = self
+        routes = self.routes()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                handler = routes.get((method, parsed.path))
+
+                if handler is None:
+                    handler = next((route for (route_method, prefix), route in routes.items() if route_method == method and prefix.endswith("/") and parsed.path.startswith(prefix)), None)
+
+                with upstream.lock:
+                    upstream.counts[f"{method} {parsed.path}"] += 1
+
+                time.sleep(upstream.behavior.delay())
+                status = upstream.behavior.outcome()
+
+                if handler is None:
+                    status, payload = 404, {"error": "not found"}
+                elif status is None:
+                    status, payload = handler(self, parsed, parse_qs(parsed.query), body)
+                else:
+                    payload = {"error": "simulado"}
+
+                data = json.dumps(payload).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True, name=f"fake-{self.name}").start()
+
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+def _json(body):
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        return {}
+
+class FakeDigisac(FakeUpstream):
+    name = "digisac"
+
+    def __init__(self, behavior=None):
+        super().__init__(behavior)
+        # contactId -> horários (time.perf_counter) em que as respostas do bot chegaram
+        self.received = defaultdict(list)
+
+    def _record(self, contact_id):
+        with self.lock:
+            self.received[contact_id].append(time.perf_counter())
+
+    def last_received(self, contact_id, since) -> float | None:
+        with self.lock:
+            times = [moment for moment in self.received.get(contact_id, ()) if moment >= since]
+
+        return max(times) if times else None
+
+    def routes(self):
+        def tickets(handler, parsed, query, body):
+            return 200, {"data": []}
+
+        def contact(handler, parsed, query, body):
+            contact_id = parsed.path.rsplit("/", 1)[-1]
+
+            return 200, {"id": contact_id, "name": f"Cliente {contact_id[-4:]}", "isGroup": False}
+
+        def messages(handler, parsed, query, body):
+            self._record(_json(body).get("contactId"))
+
+            return 200, {"id": str(uuid.uuid4())}
+
+        def transfer(handler, parsed, query, body):
+            self._record(parsed.path.split("/")[4])
+
+            return 200, {}
+
+        # caminhos terminados em "/" valem como prefixo (ex.: /api/v1/contacts/<id>/ticket/transfer)
+        return {
+            ("GET", "/api/v1/tickets"): tickets,
+            ("GET", "/api/v1/contacts/"): contact,
+            ("POST", "/api/v1/messages"): messages,
+            ("POST", "/api/v1/contacts/"): transfer
+        }
+
+class FakeParana(FakeUpstream):
+    name = "parana"
+
+    def __init__(self, behavior=None, require_authorization=True):
+        super().__init__(behavior)
+        # na primeira consulta de cada CPF o banco ainda não foi autorizado no app do FGTS
+        self.require_authorization = require_authorization
+        self.authorized = set()
+
+    def routes(self):
+        def token(handler, parsed, query, body):
+            return 200, {"access_token": uuid.uuid4().hex, "expires_in": 3600}
+
+        def saldo(handler, parsed, query, body):
+            cpf = _json(body).get("cpf")
+
+            with self.lock:
+                first = cpf not in self.authorized
+                self.authorized.add(cpf)
+
+            if self.require_authorization and first:
+                return 200, {"codigo": "7", "mensagem": "Instituição não autorizada pelo trabalhador."}
+
+            periodos = [{"dataRepasse": f"2027-{month:02d}-01", "valor": 150.0} for month in range(1, 11)]
+
+            return 200, {"saldoTotal": 1500.0, "saldosPorPeriodos": periodos}
+
+        def simulacao(handler, parsed, query, body):
+            return 200, {"valorLiberado": 900.0}
+
+        return {
+            ("POST", "/v1/auth/token"): token,
+            ("POST", "/v1/fgts/saque-aniversario/saldo-disponivel"): saldo,
+            ("POST", "/v3/fgts/saque-aniversario/simulacao"): simulacao
+        }
+
+class FakeFacta(FakeUpstream):
+    name = "facta"
+
+    def __init__(self, behavior=None, require_authorization=True):
+        super().__init__(behavior)
+        # na primeira consulta de cada CPF o banco ainda não foi autorizado no app do FGTS
+        self.require_authorization = require_authorization
+        self.authorized = set()
+
+    def routes(self):
+        def token(handler, parsed, query, body):
+            expira = (datetime.now() + timedelta(hours=1)).strftime("%d/%m/%Y %H:%M:%S")
+
+            return 200, {"erro": False, "token": uuid.uuid4().hex, "expira": expira}
+
+        def saldo(handler, parsed, query, body):
+            cpf = (query.get("cpf") or [""])[0]
+
+            with self.lock:
+                first = cpf not in self.authorized
+                self.authorized.add(cpf)
+
+            if self.require_authorization and first:
+                return 200, {"erro": True, "mensagem": "Instituição Fiduciária não possui autorização do Trabalhador para Operação Fiduciária."}
+
+            retorno = {"data_saldo": "01/01/2027", "saldo_total": "3500.00"}
+
+            for i in range(1, 11):
+                retorno[f"dataRepasse_{i}"] = f"01/{i:02d}/2027"
+                retorno[f"valor_{i}"] = "350.00"
+
+            return 200, {"erro": False, "retorno": retorno}
+
+        def calculo(handler, parsed, query, body):
+            return 200, {"erro": False, "permitido": "SIM", "valor_liquido": 1200.5, "simulacao_fgts": str(uuid.uuid4().int)[:8]}
+
+        def etapa1(handler, parsed, query, body):
+            return 200, {"erro": False, "id_simulador": str(uuid.uuid4().int)[:10]}
+
+        def estado_civil(handler, parsed, query, body):
+            return 200, {"erro": False, "estado_civil": {"1": "CASADO", "2": "SOLTEIRO", "3": "DIVORCIADO", "4": "VIUVO"}}
+
+        def cidade(handler, parsed, query, body):
+            nome = (query.get("nome_cidade") or ["SAO PAULO"])[0].upper()
+
+            return 200, {"erro": False, "cidade": {"3550308": nome}}
+
+        def etapa2(handler, parsed, query, body):
+            return 200, {"erro": False, "codigo_cliente": str(uuid.uuid4().int)[:8]}
+
+        def etapa3(handler, parsed, query, body):
+            codigo = str(uuid.uuid4().int)[:9]
+
+            return 200, {"erro": False, "codigo": codigo, "url_formalizacao": f"https://formalizacao.example/{codigo}"}
+
+        return {
+            ("GET", "/gera-token"): token,
+            ("GET", "/fgts/saldo"): saldo,
+            ("POST", "/fgts/calculo"): calculo,
+            ("POST", "/proposta/etapa1-simulador"): etapa1,
+            ("GET", "/proposta-combos/estado-civil"): estado_civil,
+            ("GET", "/proposta-combos/cidade"): cidade,
+            ("POST", "/proposta/etapa2-dados-pessoais"): etapa2,
+            ("POST", "/proposta/etapa3-proposta-cadastro"): etapa3
+        }
+
+class FakeNewcorban(FakeUpstream):
+    name = "newcorban"
+
+    def routes(self):
+        def login(handler, parsed, query, body):
+            claims = base64.urlsafe_b64encode(json.dumps({"exp": int(time.time()) + 3600}).encode()).decode().rstrip("=")
+
+            return 200, {"token": f"e30.{claims}.assinatura"}
+
+        def cliente(handler, parsed, query, body):
+            cpf = (query.get("cpf") or [""])[0]
+
+            if (query.get("action") or [""])[0] == "getBankAccountHistory":
+                return 200, [{"tipo_liberacao": "CONTA_CORRENTE", "banco_averbacao": "341", "agencia": "1234", "conta": "123456", "conta_digito": "7"}]
+
+            return 200, {
+                "cliente": {
+                    "pessoais": {"cpf": cpf, "nome": "CLIENTE TESTE", "nascimento": "1990-05-10", "renda": "3000.00", "sexo": "MASCULINO", "estado_civil": "SOLTEIRO", "mae": "MAE TESTE", "pai": "PAI TESTE", "analfabeto": False},
+                    "documentos": {"11": {"numero": "123456789", "uf": "SP", "data_emissao": "2015-03-10"}},
+                    "telefones": {"22": {"ddd": "11", "numero": "999990000"}},
+                    "enderecos": {"33": {"cep": "01001000", "logradouro": "PRACA DA SE", "numero": "1", "bairro": "SE", "uf": "SP", "cidade": "SAO PAULO"}}
+                }
+            }
+
+        def propostas(handler, parsed, query, body):
+            return 200, {"status": "ok"}
+
+        return {
+            ("POST", "/api/v2/login"): login,
+            ("GET", "/system/cliente.php"): cliente,
+            ("POST", "/api/propostas/"): propostas
+        }
+
+class FakeBrasilAPI(FakeUpstream):
+    name = "brasilapi"
+
+    def routes(self):
+        def banks(handler, parsed, query, body):
+            return 200, [{"ispb": "60701190", "name": "ITAÚ UNIBANCO", "code": 341, "fullName": "ITAÚ UNIBANCO S.A."}]
+
+        return {("GET", "/api/banks/v1"): banks}
+
+fakes = {fake.name: fake for fake in (FakeDigisac, FakeParana, FakeFacta, FakeNewcorban, FakeBrasilAPI)}
+
+# variáveis de ambiente que apontam os clientes para os servidores falsos
+def environment(servers: dict) -> dict:
+    return {
+        "URL": servers["digisac"].url,
+        "PARANA_BASE_URL": servers["parana"].url,
+        "FACTA_BASE_URL": servers["facta"].url,
+        "NEWCORBAN_SERVER_URL": servers["newcorban"].url,
+        "NEWCORBAN_API_URL": servers["newcorban"].url,
+        "BRASILAPI_URL": servers["brasilapi"].url
+    }
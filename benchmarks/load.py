@@ -0,0 +1,302 @@
+import os, sys, json, time, uuid, random, argparse, resource, threading, tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from .fakes import Behavior, environment, fakes
+
+# Benchmark de ponta a ponta: sobe servidores falsos para todos os upstreams, aponta
+# os clientes para eles e manda conversas roteirizadas pelo webhook() com N contatos
+# ao mesmo tempo. Mede, para cada etapa da conversa, o tempo entre o POST no webhook
+# e a última resposta do bot entregue ao Digisac falso.
+#
+#   python -m benchmarks.load --contacts 50
+#   python -m benchmarks.load --contacts 200 --latency facta=lognormal:120:0.6 --errors parana=0.02 --json resultado.json
+#
+# Precisa de um Redis (REDIS_URL); com --fake-redis usa o fakeredis[lua] em memória (CI sem Redis).
+
+# (etapa, mensagem do cliente); None = CPF do contato
+script = [
+    ("menu", "oi"),
+    ("inicial", "ANTECIPAR FGTS"),
+    ("saque_aniversario", "SIM"),
+    ("cpf", None),
+    ("autorizacao", "OK, AUTORIZADO"),
+    ("dados_bancarios", "REALIZAR ANTECIPAÇÃO"),
+    ("proposta", "ESTÃO CORRETAS")
+]
+
+def random_cpf(rng) -> str:
+    digits = [rng.randint(0, 9) for _ in range(9)]
+
+    for length in (9, 10):
+        total = sum(digit * weight for digit, weight in zip(digits, range(length + 1, 1, -1)))
+        digits.append(0 if total % 11 < 2 else 11 - total % 11)
+
+    return "".join(map(str, digits))
+
+def percentile(values, p) -> float:
+    values = sorted(values)
+
+    if not values:
+        return 0.0
+
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def _per_upstream(pairs, cast=float) -> dict:
+    values = {}
+
+    for pair in pairs or ():
+        name, _, value = pair.partition("=")
+
+        if name not in fakes:
+            raise SystemExit(f"Upstream desconhecido: {name} (use {', '.join(fakes)})")
+
+        values[name] = cast(value)
+
+    return values
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="Benchmark de ponta a ponta do webhook com upstreams falsos.")
+    parser.add_argument("--contacts", type=int, default=20, help="contatos conversando ao mesmo tempo")
+    parser.add_argument("--conversations", type=int, default=1, help="conversas completas por contato")
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=DIST", help="ex.: facta=lognormal:120:0.5, parana=uniform:50:300, digisac=fixed:20")
+    parser.add_argument("--errors", action="append", metavar="UPSTREAM=FRACAO", help="fração de respostas 500")
+    parser.add_argument("--throttle", action="append", metavar="UPSTREAM=FRACAO", help="fração de respostas 429")
+    parser.add_argument("--timeouts", action="append", metavar="UPSTREAM=FRACAO", help="fração de requisições que não respondem a tempo")
+    parser.add_argument("--timeout-seconds", type=float, default=65.0, help="quanto uma requisição 'travada' demora")
+    parser.add_argument("--step-timeout", type=float, default=120.0, help="tempo máximo de uma etapa antes de abandonar a conversa")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--fake-redis", action="store_true", help="usa fakeredis em memória em vez de REDIS_URL")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava o resultado em JSON (ex.: artefato de CI)")
+    parser.add_argument("--max-p95", type=float, default=None, metavar="MS", help="sai com erro se o p95 de alguma etapa passar disso")
+    parser.add_argument("--strict", action="store_true", help="sai com erro se alguma conversa não terminar")
+
+    return parser.parse_args(argv)
+
+def start_fakes(args) -> dict:
+    latencies = _per_upstream(args.latency, str)
+    errors = _per_upstream(args.errors)
+    throttles = _per_upstream(args.throttle)
+    timeouts = _per_upstream(args.timeouts)
+    servers = {}
+
+    for name, fake in fakes.items():
+        behavior = Behavior(latencies.get(name, "fixed:0"), errors.get(name, 0.0), throttles.get(name, 0.0), timeouts.get(name, 0.0), args.timeout_seconds)
+
+        if args.seed is not None:
+            behavior.random.seed(f"{args.seed}:{name}")
+
+        servers[name] = fake(behavior).start()
+
+    return servers
+
+def configure(args, servers):
+    os.environ.update(environment(servers))
+
+    # padrões do benchmark; qualquer um pode ser sobrescrito pelo ambiente
+    defaults = {
+        "QUEUE_BACKEND": "local",
+        "QUEUE_WORKERS": str(max(8, args.contacts)),
+        "DISPATCH_MODE": "async",
+        "DISPATCH_WORKERS": "16",
+        "DISPATCH_BACKOFF": "0.05",
+        "DIGISAC_RATE_LIMIT": "1000",
+        "HTTP_POOL_MAXSIZE": str(max(16, args.contacts)),
+        "SIMULATION_SHARE_TTL": "0",
+        "CONTACT_LOCK_WAIT": str(args.step_timeout),
+        "CREDENCIAIS_FACTA": "benchmark:benchmark",
+        "NEWCORBAN_USERNAME": "benchmark",
+        "NEWCORBAN_PASSWORD": "benchmark",
+        "SERVICE_ID": "benchmark",
+        "DIGISAC_TOKEN": "benchmark"
+    }
+
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+    if args.fake_redis:
+        try:
+            import fakeredis
+        except ImportError:
+            raise SystemExit("--fake-redis precisa do pacote fakeredis[lua]")
+
+        from clients import redis_client
+
+        redis_client._redis = fakeredis.FakeRedis(decode_responses=True)
+
+class Run:
+    def __init__(self, args, servers):
+        import app as chatbot
+        from services.dispatcher import dispatcher
+
+        self.args = args
+        self.digisac = servers["digisac"]
+        self.dispatcher = dispatcher
+        self.flask = chatbot.app
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.messages = 0
+        self.completed = 0
+        self.lock = threading.Lock()
+        self.done = {}
+        self.errors = {}
+        self.rng = random.Random(args.seed)
+        self.run_id = uuid.uuid4().hex[:8]
+
+        # avisa o driver quando o handler do contato termina (inclusive com erro)
+        handle_event = chatbot.handle_event
+
+        def instrumented(payload):
+            contact_id = payload.get("data").get("contactId")
+
+            try:
+                handle_event(payload)
+            except Exception:
+                self.errors[contact_id] = True
+
+                raise
+            finally:
+                event = self.done.get(contact_id)
+
+                if event:
+                    event.set()
+
+        chatbot.handle_event = instrumented
+
+    def _payload(self, contact_id, number, text):
+        return {
+            "event": "message.created",
+            "data": {
+                "id": str(uuid.uuid4()),
+                "contactId": contact_id,
+                "text": text,
+                "isFromMe": False,
+                "data": {"number": number}
+            }
+        }
+
+    # espera as respostas do contato saírem da fila do dispatcher
+    def _wait_replies(self, contact_id, deadline):
+        while self.dispatcher.pending(contact_id) and time.perf_counter() < deadline:
+            time.sleep(0.002)
+
+    def step(self, client, contact_id, number, label, text) -> bool:
+        event = self.done[contact_id] = threading.Event()
+        self.errors.pop(contact_id, None)
+        start = time.perf_counter()
+        deadline = start + self.args.step_timeout
+        response = client.post("/webhook", json=self._payload(contact_id, number, text))
+
+        ok = response.status_code == 200 and event.wait(self.args.step_timeout)
+
+        if ok:
+            self._wait_replies(contact_id, deadline)
+
+        finished = self.digisac.last_received(contact_id, start) or time.perf_counter()
+        ok = ok and not self.errors.get(contact_id) and not self.dispatcher.pending(contact_id)
+
+        with self.lock:
+            self.messages += 1
+
+            if ok:
+                self.latencies[label].append(finished - start)
+            else:
+                self.failures[label] += 1
+
+        return ok
+
+    def converse(self, index):
+        client = self.flask.test_client()
+
+        for conversation in range(self.args.conversations):
+            contact_id = f"bench-{self.run_id}-{index}-{conversation}"
+            number = f"5511{90000000 + index:08d}"
+
+            with self.lock:
+                cpf = random_cpf(self.rng)
+
+            for label, text in script:
+                if not self.step(client, contact_id, number, label, cpf if text is None else text):
+                    break
+            else:
+                with self.lock:
+                    self.completed += 1
+
+    def run(self) -> float:
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.args.contacts, thread_name_prefix="contact") as executor:
+            list(executor.map(self.converse, range(self.args.contacts)))
+
+        return time.perf_counter() - start
+
+def report(args, run, elapsed, servers) -> dict:
+    steps = {}
+
+    for label, _ in script:
+        values = run.latencies.get(label, [])
+        steps[label] = {
+            "count": len(values),
+            "failures": run.failures.get(label, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2)
+        }
+
+    _, peak_traced = tracemalloc.get_traced_memory()
+
+    return {
+        "contacts": args.contacts,
+        "conversations": args.contacts * args.conversations,
+        "completed": run.completed,
+        "messages": run.messages,
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_second": round(run.messages / elapsed, 2) if elapsed else 0.0,
+        "peak_memory_mb": round(peak_traced / 1024 / 1024, 2),
+        # ru_maxrss vem em KB no Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+        "steps": steps,
+        "upstream_requests": {name: dict(server.counts) for name, server in servers.items()}
+    }
+
+def print_report(result):
+    print(f"\n{result['conversations']} conversas ({result['completed']} completas), {result['messages']} mensagens em {result['elapsed_s']}s")
+    print(f"{result['messages_per_second']} mensagens/s, pico de memória Python {result['peak_memory_mb']} MB, RSS máximo {result['max_rss_mb']} MB\n")
+    print(f"{'etapa':<20}{'n':>7}{'falhas':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    for label, step in result["steps"].items():
+        print(f"{label:<20}{step['count']:>7}{step['failures']:>8}{step['p50_ms']:>10}{step['p95_ms']:>10}{step['p99_ms']:>10}")
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    tracemalloc.start()
+    servers = start_fakes(args)
+
+    try:
+        configure(args, servers)
+        run = Run(args, servers)
+        elapsed = run.run()
+        result = report(args, run, elapsed, servers)
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    if args.strict and result["completed"] < result["conversations"]:
+        return 1
+
+    if args.max_p95 is not None and any(step["p95_ms"] > args.max_p95 for step in result["steps"].values()):
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import sys, json, time, uuid, random, argparse, statistics
+from .load import random_cpf
+
+# Benchmark do estado de conversa: tamanho por contato e custo de codificar/decodificar
+# nos três formatos que o projeto já usou:
+#   - blob: JSON único na chave contactId (formato original)
+#   - hash: hash com um campo por chave, valores em JSON compacto
+#   - compact: hash com os campos grandes comprimidos e o perfil Newcorban destacado
+#     (formato atual do state_store)
+# "mensagem" é o custo de CPU de uma mensagem típica: ler o estado, mudar um campo e gravar.
+# Com --redis (REDIS_URL) ou --fake-redis também grava --contacts estados e mede
+# MEMORY USAGE por chave (só Redis de verdade) e o tempo de save/load pelo state_store.
+#
+#   python -m benchmarks.state
+#   python -m benchmarks.state --accounts 12 --redis --contacts 5000 --json estado.json
+
+def sample_state(rng, accounts=6) -> dict:
+    cpf = random_cpf(rng)
+    contas = [
+        {
+            "id": str(rng.randint(100000, 999999)),
+            "tipo_liberacao": rng.choice(["CONTA_CORRENTE", "CONTA_POUPANCA"]),
+            "banco_averbacao": rng.choice(["001", "033", "104", "237", "341", "260"]),
+            "agencia": f"{rng.randint(1, 9999):04d}",
+            "conta": str(rng.randint(10000, 99999999)),
+            "conta_digito": str(rng.randint(0, 9)),
+            "data_cadastro": f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00:00",
+            "origem": "PROPOSTA",
+            "proposta_id": str(rng.randint(1000000, 9999999))
+        }
+        for _ in range(accounts)
+    ]
+    pessoais = {
+        "cpf": cpf, "nome": "CLIENTE DE TESTE DA SILVA", "nascimento": "1990-05-10", "renda": "3000.00",
+        "sexo": "MASCULINO", "estado_civil": "SOLTEIRO", "mae": "MAE DE TESTE DA SILVA", "pai": "PAI DE TESTE DA SILVA",
+        "analfabeto": False, "nacionalidade": "BRASILEIRA", "naturalidade": "SAO PAULO", "naturalidade_uf": "SP",
+        "email": f"cliente{rng.randint(1, 99999)}@exemplo.com.br", "profissao": "AUXILIAR ADMINISTRATIVO",
+        "data_cadastro": "2024-01-15 09:30:00", "observacoes": ""
+    }
+
+    return {
+        "interation": 1,
+        "name": "Cliente de Teste",
+        "state": "MAKE_ANTECIPATION",
+        "CPF": cpf,
+        "valorLiberado": round(rng.uniform(100, 5000), 2),
+        "bancoId": 935,
+        "prazo": 10,
+        "taxa": "1.8",
+        "tabela": "53694",
+        "simulacao_fgts": str(rng.randint(10000000, 99999999)),
+        "perfil_newcorban": {
+            "cpf": cpf,
+            "fetched_at": time.time(),
+            "pessoais": pessoais,
+            "documento": ["11", {"numero": str(rng.randint(10000000, 99999999)), "uf": "SP", "data_emissao": "2015-03-10", "orgao_emissor": "SSP"}],
+            "telefone": ["22", {"ddd": "11", "numero": f"9{rng.randint(10000000, 99999999)}", "whatsapp": True}],
+            "endereco": ["33", {"cep": "01001000", "logradouro": "PRACA DA SE", "numero": "1", "complemento": "", "bairro": "SE", "uf": "SP", "cidade": "SAO PAULO"}],
+            "contas": contas
+        }
+    }
+
+def _median_us(fn, iterations) -> float:
+    samples = []
+
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    return round(statistics.median(samples) * 1e6, 2)
+
+def _hash_size(mapping) -> int:
+    return sum(len(field.encode()) + len(value.encode()) for field, value in mapping.items())
+
+def _message_blob(raw):
+    state = json.loads(raw)
+    state["interation"] += 1
+
+    return json.dumps(state)
+
+def _message_hash(raw):
+    from clients import state_store
+
+    state = {field: json.loads(value) for field, value in raw.items()}
+    state["interation"] += 1
+
+    return {field: value for field, value in ((field, state_store._encode(value)) for field, value in state.items()) if raw.get(field) != value}
+
+def _message_compact(raw):
+    from clients import state_store
+
+    state = state_store._from_hash("benchmark", raw)
+    state["interation"] += 1
+    encoded = {field: state_store._encode(value) for field, value in state.items()}
+
+    return {field: state_store._pack(value) for field, value in encoded.items() if state.loaded.get(field) != value}
+
+# formato -> (codificar estado completo, decodificar estado completo, mensagem típica)
+def codecs():
+    import services.customer_profile
+    from clients import state_store
+
+    return {
+        "blob": (lambda state: json.dumps(state), json.loads, _message_blob),
+        "hash": (
+            lambda state: {field: state_store._encode(value) for field, value in state.items()},
+            lambda raw: {field: json.loads(value) for field, value in raw.items()},
+            _message_hash
+        ),
+        "compact": (
+            lambda state: {field: state_store._pack(state_store._encode(value)) for field, value in state.items()},
+            lambda raw: {field: json.loads(state_store._unpack(value)) for field, value in raw.items()},
+            _message_compact
+        )
+    }
+
+def measure_codecs(states, iterations) -> dict:
+    results = {}
+
+    sample = min(len(states), 100)
+
+    for name, (encode, decode, message) in codecs().items():
+        encoded = [encode(state) for state in states]
+        sizes = [len(value.encode()) if isinstance(value, str) else _hash_size(value) for value in encoded]
+
+        results[name] = {
+            "bytes_per_contact": round(statistics.mean(sizes), 1),
+            "encode_us": round(_median_us(lambda: [encode(state) for state in states[:sample]], iterations) / sample, 2),
+            "decode_us": round(_median_us(lambda: [decode(value) for value in encoded[:sample]], iterations) / sample, 2),
+            "message_us": round(_median_us(lambda: [message(value) for value in encoded[:sample]], iterations) / sample, 2)
+        }
+
+    return results
+
+def _memory_usage(client, key):
+    try:
+        return client.memory_usage(key, samples=0)
+    except Exception:
+        return None
+
+def measure_redis(states) -> dict:
+    from clients import redis_client, state_store
+
+    client = redis_client._redis
+    prefix = f"bench-state-{uuid.uuid4().hex[:8]}"
+    encoders = {name: codec[0] for name, codec in codecs().items()}
+    results = {}
+
+    try:
+        for name, encode in encoders.items():
+            usage = []
+
+            for index, state in enumerate(states):
+                key = f"{prefix}:{name}:{index}"
+                value = encode(state)
+
+                if isinstance(value, str):
+                    client.set(key, value)
+                else:
+                    client.hset(key, mapping=value)
+
+                usage.append(_memory_usage(client, key))
+
+            known = [value for value in usage if value is not None]
+            results[name] = {"memory_usage_bytes": round(statistics.mean(known), 1) if known else None}
+
+        # ida e volta completa pelo state_store (save + load), no formato atual
+        state_store.namespace = prefix
+        contact_ids = [f"contato-{index}" for index in range(len(states))]
+        start = time.perf_counter()
+
+        for contact_id, state in zip(contact_ids, states):
+            state_store.save_state(contact_id, state)
+
+        save_us = (time.perf_counter() - start) / len(states) * 1e6
+        start = time.perf_counter()
+
+        for contact_id in contact_ids:
+            state_store.load_state(contact_id)
+
+        load_us = (time.perf_counter() - start) / len(states) * 1e6
+        results["compact"].update({"save_us": round(save_us, 2), "load_us": round(load_us, 2)})
+    finally:
+        for key in client.scan_iter(match=f"{prefix}:*", count=1000):
+            client.delete(key)
+
+    return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.state", description="Tamanho e custo de codificação do estado de conversa.")
+    parser.add_argument("--contacts", type=int, default=1000, help="estados gerados")
+    parser.add_argument("--accounts", type=int, default=6, help="contas no histórico bancário do perfil Newcorban")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--redis", action="store_true", help="mede também no Redis de REDIS_URL")
+    parser.add_argument("--fake-redis", action="store_true", help="usa fakeredis (sem MEMORY USAGE)")
+    parser.add_argument("--json", metavar="ARQUIVO")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    states = [sample_state(rng, args.accounts) for _ in range(args.contacts)]
+    result = {"contacts": args.contacts, "codecs": measure_codecs(states, args.iterations)}
+
+    if args.fake_redis:
+        import fakeredis
+        from clients import redis_client
+
+        redis_client._redis = fakeredis.FakeRedis(decode_responses=True)
+
+    if args.redis or args.fake_redis:
+        result["redis"] = measure_redis(states)
+
+    print(f"{'formato':<10}{'bytes/contato':>15}{'encode µs':>12}{'decode µs':>12}{'mensagem µs':>14}{'MEMORY USAGE':>15}")
+
+    for name, codec in result["codecs"].items():
+        usage = (result.get("redis") or {}).get(name, {}).get("memory_usage_bytes")
+        print(f"{name:<10}{codec['bytes_per_contact']:>15}{codec['encode_us']:>12}{codec['decode_us']:>12}{codec['message_us']:>14}{usage if usage is not None else '-':>15}")
+
+    if "redis" in result:
+        compact = result["redis"]["compact"]
+        print(f"\nstate_store (compact): save {compact['save_us']} µs, load {compact['load_us']} µs por contato")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
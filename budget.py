@@ -0,0 +1,55 @@
+import os, time, contextvars
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Prazo total para atender uma mensagem (MESSAGE_DEADLINE segundos), compartilhado por
+# todas as chamadas feitas durante o atendimento: cada requisição usa no máximo o tempo
+# que ainda resta e os retries param quando o prazo acaba.
+# O prazo vive numa ContextVar: vale para a thread/corrotina atual e para as tarefas
+# criadas a partir dela (em thread pools, usar submit() deste módulo).
+message_deadline = float(os.getenv("MESSAGE_DEADLINE", 90))
+
+_deadline = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+# abre um prazo de `seconds`; dentro de um prazo maior, vale o que terminar antes
+@contextmanager
+def budget(seconds: float | None = None):
+    deadline = time.monotonic() + (message_deadline if seconds is None else seconds)
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+# segundos restantes do prazo atual (None = sem prazo)
+def remaining() -> float | None:
+    deadline = _deadline.get()
+
+    return None if deadline is None else deadline - time.monotonic()
+
+# timeout de uma tentativa: o pedido, limitado ao que resta do prazo
+def timeout_for(timeout: float | None) -> float | None:
+    left = remaining()
+
+    if left is None:
+        return timeout
+
+    if left <= 0:
+        raise DeadlineExceeded("Prazo da mensagem esgotado")
+
+    return left if timeout is None else min(timeout, left)
+
+# ainda dá tempo de esperar `seconds` e tentar de novo?
+def allows(seconds: float) -> bool:
+    left = remaining()
+
+    return left is None or left > seconds
+
+# executor.submit() levando o contexto (prazo, lease do contato) para a thread do pool
+def submit(executor, fn, *args, **kwargs):
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
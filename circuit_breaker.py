@@ -0,0 +1,107 @@
+import os, time, logging, threading
+from .metrics import register_gauge
+
+# Disjuntor por upstream (neste processo).
+#
+# Depois de CIRCUIT_FAILURES falhas seguidas (erro de conexão, timeout ou 5xx) o
+# circuito abre e as chamadas para aquele upstream falham na hora com CircuitOpenError,
+# sem esperar timeouts e retries. Passados CIRCUIT_RESET_TIMEOUT segundos uma chamada
+# de teste é liberada: se der certo o circuito fecha, se falhar abre de novo.
+# Por upstream: CIRCUIT_<UPSTREAM>_FAILURES e CIRCUIT_<UPSTREAM>_RESET_TIMEOUT.
+failures_threshold = int(os.getenv("CIRCUIT_FAILURES", 5))
+reset_timeout = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+logger = logging.getLogger(__name__)
+
+_breakers = {}
+_lock = threading.Lock()
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, name, failures_threshold, reset_timeout):
+        self.name = name
+        self.failures_threshold = failures_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+
+        return "half_open" if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    # segundos até o upstream poder ser chamado de novo (0 = pode chamar agora)
+    def retry_in(self) -> float:
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+
+            if self.probing:
+                return min(1.0, self.reset_timeout)
+
+            return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    # chamado antes de cada requisição
+    def before(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuito do upstream {self.name} aberto")
+
+            self.probing = True
+
+    # resultado da requisição: True = sucesso, False = falha do upstream,
+    # None = inconclusivo (ex.: timeout encurtado pelo prazo da mensagem)
+    def record(self, ok: bool | None):
+        with self.lock:
+            probing, self.probing = self.probing, False
+
+            if ok is None:
+                return
+
+            if ok:
+                if self.opened_at is not None:
+                    logger.info("Circuito do upstream %s fechado", self.name)
+
+                self.failures = 0
+                self.opened_at = None
+
+                return
+
+            self.failures += 1
+
+            if probing or (self.opened_at is None and self.failures >= self.failures_threshold):
+                logger.warning("Circuito do upstream %s aberto após %s falhas seguidas", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(name)
+
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    int(os.getenv(f"CIRCUIT_{name.upper()}_FAILURES", failures_threshold)),
+                    float(os.getenv(f"CIRCUIT_{name.upper()}_RESET_TIMEOUT", reset_timeout))
+                )
+
+    return breaker
+
+def is_open(name: str) -> bool:
+    return get_breaker(name).retry_in() > 0
+
+def breaker_stats() -> dict:
+    return {name: {"state": breaker.state, "failures": breaker.failures} for name, breaker in list(_breakers.items())}
+
+register_gauge("chatbot_circuit_open", "1 se o circuito do upstream está aberto (falhando na hora)", lambda: [({"upstream": name}, int(breaker.state != "closed")) for name, breaker in list(_breakers.items())])
@@ -0,0 +1,101 @@
+import os, json, time, logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .redis_client import redis_set, redis_incr, redis_delete, redis_list_first, redis_list_pop, redis_list_push, redis_list_remove, release_lock
+
+# Lock por contato (lease no Redis com token de fencing) para que dois workers
+# nunca processem mensagens do mesmo contato ao mesmo tempo.
+# Cada aquisição recebe um token crescente; as gravações de estado feitas dentro
+# do lock só são aceitas enquanto o lock ainda estiver com esse token, então um
+# worker cujo lease expirou não sobrescreve o estado de quem assumiu depois.
+# A espera pelo lock é curta: ela prende a thread (ou a partição/slot da fila) inteira,
+# então quem não consegue o lock deve desistir e tentar de novo mais tarde
+# (process_contact volta para a fila com RetryLater, ver services/task_queue.py).
+#
+# A ordem dos eventos não depende da fila: o webhook põe cada evento no fim da lista
+# pendente do contato e quem está com o lock processa a lista do começo. Uma tarefa que
+# volta para a fila (ou roda fora de ordem num worker com concurrency > 1) só encontra
+# a lista já processada por quem estava com o lock, ou continua dela na ordem de chegada.
+lease = int(os.getenv("CONTACT_LOCK_LEASE", 180))
+wait_timeout = float(os.getenv("CONTACT_LOCK_WAIT", 5))
+pending_ttl = int(os.getenv("CONTACT_PENDING_TTL", 86400))
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("contact_lease", default=None)
+
+class ContactBusyError(Exception):
+    pass
+
+class StaleLeaseError(Exception):
+    pass
+
+def _key(contact_id):
+    return f"lock:contact:{contact_id}"
+
+# (lock_key, token) do lease ativo para o contato, se houver
+def current_fence(contact_id):
+    current = _current.get()
+
+    if current and current[0] == _key(contact_id):
+        return current
+
+    return None
+
+# apaga o contador de fencing de um contato arquivado (chamar com o lock na mão);
+# a contagem recomeça na próxima conversa, dias depois de qualquer lease antigo
+def delete_fence(contact_id):
+    redis_delete(f"{_key(contact_id)}:fence")
+
+def _pending_key(contact_id):
+    return f"pending:contact:{contact_id}"
+
+# coloca o evento no fim da lista do contato; devolve o valor gravado (para drop_pending)
+def push_pending(contact_id, payload) -> str:
+    raw = json.dumps(payload)
+    redis_list_push(_pending_key(contact_id), raw, ex=pending_ttl)
+
+    return raw
+
+# desfaz um push_pending (ex.: a tarefa não entrou na fila)
+def drop_pending(contact_id, raw):
+    redis_list_remove(_pending_key(contact_id), raw)
+
+# próximo evento do contato (chamar com o lock na mão). Ele só sai da lista em
+# done_pending, depois de processado: se o worker cair no meio, o evento continua lá
+def next_pending(contact_id):
+    raw = redis_list_first(_pending_key(contact_id))
+
+    return json.loads(raw) if raw else None
+
+# tira o evento processado, só se o lease ainda for nosso: com o lease vencido,
+# quem assumiu o contato já está processando a lista
+def done_pending(contact_id):
+    fence = current_fence(contact_id)
+
+    if not fence or not redis_list_pop(_pending_key(contact_id), fence=fence):
+        raise StaleLeaseError(f"Lock do contato {contact_id} expirou; evento fica para quem assumiu")
+
+# wait: quanto esperar o lock (padrão CONTACT_LOCK_WAIT; 0 = desiste na hora se estiver ocupado)
+@contextmanager
+def contact_lock(contact_id, wait=None):
+    key = _key(contact_id)
+    wait = wait_timeout if wait is None else wait
+    token = str(redis_incr(f"{key}:fence"))
+    deadline = time.time() + wait
+    delay = 0.05
+
+    while not redis_set(key, token, ex=lease, nx=True):
+        if time.time() > deadline:
+            raise ContactBusyError(f"Contato {contact_id} ocupado há mais de {wait}s")
+
+        time.sleep(delay)
+        delay = min(delay * 2, 1)
+
+    reset = _current.set((key, token))
+
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+        release_lock(key, token)
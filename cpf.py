@@ -0,0 +1,95 @@
+import re
+import numpy as np
+
+# Regras do CPF: 11 dígitos, não todos iguais, e os dois últimos são dígitos verificadores
+# (módulo 11 dos 9 e dos 10 primeiros dígitos, com os pesos abaixo).
+# validate_cpf() checa um CPF por vez (chat); validate_cpfs()/normalize_cpfs() aplicam as
+# mesmas regras a colunas inteiras com NumPy (listas de contatos de campanha, milhões de linhas).
+weights_1 = tuple(range(10, 1, -1))
+weights_2 = tuple(range(11, 1, -1))
+
+# dígito verificador para a soma ponderada; vale para int e para arrays do NumPy
+def check_digit(total):
+    rest = total % 11
+
+    return (11 - rest) * (rest >= 2)
+
+def validate_cpf(cpf):
+    cpf = re.sub(r'\D', '', cpf)
+
+    if len(cpf) != 11 or cpf == cpf[0] * 11:
+        return False
+
+    digits = [int(digit) for digit in cpf]
+
+    return digits[9] == check_digit(sum(digit * weight for digit, weight in zip(digits, weights_1))) and digits[10] == check_digit(sum(digit * weight for digit, weight in zip(digits, weights_2)))
+
+# só os dígitos; pad=True devolve os zeros à esquerda que planilhas costumam comer
+def normalize_cpf(value, pad=True) -> str | None:
+    digits = re.sub(r"\D", "", str(value if value is not None else ""))
+
+    if not digits or len(digits) > 11 or (len(digits) < 11 and not pad):
+        return None
+
+    return digits.zfill(11)
+
+# matriz (n, 11) de dígitos e máscara de quem tem o tamanho certo
+def _digits_from_ints(values, pad):
+    values = values.astype(np.int64, copy=False)
+    ok = (values >= 0) & (values < 10 ** 11)
+
+    if not pad:
+        ok &= values >= 10 ** 10
+
+    digits = (values[:, None] // 10 ** np.arange(10, -1, -1, dtype=np.int64)) % 10
+
+    return digits.astype(np.int8), ok
+
+# texto com ou sem máscara: descarta o que não é dígito, linha a linha, sem laço em Python
+def _digits_from_text(values, pad):
+    rows = len(values)
+    width = max(values.dtype.itemsize // 4, 1)
+    codes = np.ascontiguousarray(values).view(np.uint32).reshape(rows, width)
+    # (código - "0") sem sinal: o que não é dígito dá negativo e vira número enorme
+    is_digit = codes - 48 <= 9
+    counter = np.int8 if width < 128 else np.int32
+    count = is_digit.sum(axis=1, dtype=counter)
+    ok = (count >= (1 if pad else 11)) & (count <= 11)
+
+    # posição de cada dígito na saída, já alinhado à direita (zeros à esquerda)
+    target = np.cumsum(is_digit, axis=1, dtype=counter) + (10 - count)[:, None]
+    keep = is_digit & ok[:, None]
+    positions = (np.arange(rows, dtype=np.int64) * 11)[:, None] + target
+    digits = np.zeros(rows * 11, dtype=np.int8)
+    digits[positions[keep]] = codes[keep] - 48
+
+    return digits.reshape(rows, 11), ok
+
+# valores normalizados (11 dígitos, "" quando inválido) e máscara de CPFs válidos
+def normalize_cpfs(values, pad=True):
+    array = np.asarray(values).reshape(-1)
+
+    if array.dtype.kind == "f":
+        integral = np.isfinite(array) & (array == np.floor(array))
+        digits, ok = _digits_from_ints(np.where(integral, array, -1), pad)
+    elif array.dtype.kind in "iu":
+        digits, ok = _digits_from_ints(array, pad)
+    else:
+        # None e outros objetos viram texto sem dígitos (inválidos)
+        digits, ok = _digits_from_text(array if array.dtype.kind == "U" else array.astype(str), pad)
+
+    wide = digits.astype(np.int32)
+    valid = (
+        ok
+        & (wide[:, 9] == check_digit(wide[:, :9] @ np.array(weights_1, dtype=np.int32)))
+        & (wide[:, 10] == check_digit(wide[:, :10] @ np.array(weights_2, dtype=np.int32)))
+        & (wide != wide[:, :1]).any(axis=1)
+    )
+
+    normalized = (digits + 48).astype(np.uint8).view("S11").reshape(-1).astype("U11")
+    normalized[~valid] = ""
+
+    return normalized, valid
+
+def validate_cpfs(values, pad=False):
+    return normalize_cpfs(values, pad)[1]
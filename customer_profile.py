@@ -0,0 +1,59 @@
+import os, time, logging
+from concurrent.futures import ThreadPoolExecutor
+from clients.budget import submit
+from clients.newcorban import NewcorbanClient
+from clients.state_store import detach_field, get_fields, update_fields
+
+# Perfil do cliente na Newcorban (dados pessoais, documento, telefone, endereço e
+# histórico bancário), buscado uma vez por conversa: os dois endpoints são
+# consultados ao mesmo tempo e o resultado fica no campo "perfil_newcorban" do
+# estado, pra que a confirmação dos dados bancários e o envio da proposta usem
+# a mesma leitura. Depois de CUSTOMER_PROFILE_TTL segundos (ou se o CPF mudar)
+# o perfil é buscado de novo. Se qualquer uma das duas consultas falhar (inclusive sessão
+# recusada duas vezes), nada é salvo: um perfil incompleto nunca vai para o estado.
+ttl = int(os.getenv("CUSTOMER_PROFILE_TTL", 1800))
+field = "perfil_newcorban"
+
+# só é lido aqui (get_fields): fica fora do load_state/save_state de cada mensagem
+detach_field(field)
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CUSTOMER_PROFILE_WORKERS", 8)), thread_name_prefix="profile")
+
+# primeiro item (id, dados) de um dicionário da Newcorban
+def _first(items):
+    return list(next(iter(items.items()))) if items else [None, None]
+
+def _parse(cpf, cliente_json, contas):
+    cliente = cliente_json.get("cliente") or {}
+
+    return {
+        "cpf": cpf,
+        "fetched_at": time.time(),
+        "pessoais": cliente.get("pessoais") or {},
+        "documento": _first(cliente.get("documentos")),
+        "telefone": _first(cliente.get("telefones")),
+        "endereco": _first(cliente.get("enderecos")),
+        "contas": contas
+    }
+
+def fetch_profile(cpf: str) -> dict:
+    newcorban = NewcorbanClient()
+    cliente = submit(_executor, newcorban.with_token, lambda token: newcorban.cliente_buscar(token, cpf))
+    contas = submit(_executor, newcorban.with_token, lambda token: newcorban.cliente_historico_bancario(token, cpf))
+
+    return _parse(cpf, cliente.result(), contas.result())
+
+# perfil salvo na conversa, ou busca na Newcorban e salva
+def get_profile(contact_id: str, cpf: str) -> dict:
+    profile = get_fields(contact_id, field)[field]
+
+    if profile and profile.get("cpf") == cpf and time.time() - profile.get("fetched_at", 0) < ttl:
+        return profile
+
+    profile = fetch_profile(cpf)
+    update_fields(contact_id, **{field: profile})
+    logger.info("Perfil Newcorban do contato %s atualizado", contact_id)
+
+    return profile
@@ -0,0 +1,33 @@
+import os, logging
+from clients.redis_client import redis_set, redis_delete, redis_hgetall, redis_hincrby
+
+# Idempotência do webhook: o Digisac reenvia o evento quando a resposta demora,
+# então cada evento é registrado no Redis (SET NX) por WEBHOOK_DEDUP_TTL segundos
+# e as entregas repetidas são descartadas antes de qualquer leitura de estado.
+ttl = int(os.getenv("WEBHOOK_DEDUP_TTL", 900))
+stats_key = "webhook:dedup:stats"
+
+logger = logging.getLogger(__name__)
+
+# True na primeira entrega do evento, False nas repetições
+def first_delivery(event: str, event_id) -> bool:
+    if not event_id:
+        return True
+
+    first = bool(redis_set(f"webhook:dedup:{event}:{event_id}", "1", ex=ttl, nx=True))
+    redis_hincrby(stats_key, "checked")
+
+    if not first:
+        redis_hincrby(stats_key, "dropped")
+        logger.info("Evento %s %s repetido, descartado", event, event_id)
+
+    return first
+
+def forget_delivery(event: str, event_id):
+    if event_id:
+        redis_delete(f"webhook:dedup:{event}:{event_id}")
+
+def dedup_stats() -> dict:
+    stats = redis_hgetall(stats_key)
+
+    return {"checked": int(stats.get("checked") or 0), "dropped": int(stats.get("dropped") or 0)}
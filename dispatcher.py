@@ -0,0 +1,240 @@
+import os, json, time, queue, logging, threading
+from collections import deque
+from clients.circuit_breaker import get_breaker
+from clients.http_pool import get_session, upstream_errors
+from clients.metrics import register_gauge, replied
+from clients.rate_limit import RateLimitExceeded, acquire_shared
+from clients.redis_client import redis_list_push, redis_list_pop, redis_list_len
+
+# Envio assíncrono de mensagens para o Digisac.
+#
+# Os handlers só colocam a requisição na fila e seguem. Cada contato tem a sua
+# fila (as mensagens chegam na ordem em que foram enviadas), contatos diferentes
+# são atendidos em paralelo por DISPATCH_WORKERS threads e o total de envios, somando
+# todos os workers e máquinas, respeita DIGISAC_RATE_LIMIT requisições por segundo
+# (token bucket no Redis, ver clients/rate_limit.py).
+# Falhas de rede, 429 e 5xx são tentadas de novo com backoff exponencial; depois
+# de DISPATCH_MAX_ATTEMPTS tentativas (ou em erro 4xx, ou erro inesperado no envio) a
+# requisição vai para a lista de dead-letter no Redis e pode ser reenviada com
+# replay_dead_letters(). on_success roda depois de um envio com sucesso e on_failure
+# quando o envio vai para a dead-letter; nenhum dos dois vai junto para a dead-letter:
+# no reenvio os callbacks não rodam, então eles só devem guardar otimizações
+# (ex.: referência de mídia em media.py), nunca estado do atendimento.
+# As filas ficam em memória: o que estiver pendente se perde se o processo cair.
+# Com DISPATCH_MODE=sync o envio é feito na hora (útil em testes).
+mode = os.getenv("DISPATCH_MODE", "async")
+workers = int(os.getenv("DISPATCH_WORKERS", 4))
+rate_limit = float(os.getenv("DIGISAC_RATE_LIMIT", 20))
+max_attempts = int(os.getenv("DISPATCH_MAX_ATTEMPTS", 5))
+backoff = float(os.getenv("DISPATCH_BACKOFF", 0.5))
+dead_letter_key = "outbox:dead"
+
+url = os.getenv("URL")
+token = os.getenv("DIGISAC_TOKEN")
+timeout = 60
+
+headers = {
+    "Authorization": token,
+    "Content-Type": "application/json"
+}
+
+logger = logging.getLogger(__name__)
+
+class Dispatcher:
+    def __init__(self):
+        self.session = get_session("digisac")
+        self.breaker = get_breaker("digisac")
+        self.queues = {}
+        self.ready = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def _start(self):
+        with self.lock:
+            if self.threads:
+                return
+
+            for i in range(workers):
+                thread = threading.Thread(target=self._worker, daemon=True, name=f"dispatcher-{i}")
+                thread.start()
+                self.threads.append(thread)
+
+    # envia a requisição; devolve (sucesso, pode tentar de novo)
+    def _send(self, item):
+        try:
+            response = self.session.request(item["method"], f"{url}{item['path']}", headers=headers, timeout=timeout, **item["kwargs"])
+        except upstream_errors as exception:
+            logger.warning("Erro ao enviar para o Digisac (%s): %s", item["path"], exception)
+
+            return False, True
+
+        return self._result(item, response)
+
+    def _result(self, item, response):
+        if response.status_code == 200:
+            if item["path"] == "/api/v1/messages":
+                replied(item["contactId"])
+
+            if item.get("on_success"):
+                try:
+                    item["on_success"](response.json())
+                except Exception as exception:
+                    logger.exception("Erro no callback do envio: %s", exception)
+
+            return True, False
+
+        logger.error(f"Falha ao enviar para o Digisac ({item['path']}). Status: {response.status_code}, Response: {response.text}")
+
+        return False, response.status_code == 429 or response.status_code >= 500
+
+    def _retry_later(self, contact_id, seconds):
+        threading.Timer(seconds, self.ready.put, args=(contact_id,)).start()
+
+    # tenta enviar o primeiro item do contato; devolve False se ele foi reagendado
+    def _attempt(self, contact_id, item) -> bool:
+        # Digisac fora do ar (circuito aberto): o contato espera sem gastar tentativas
+        wait = self.breaker.retry_in()
+
+        if wait:
+            self._retry_later(contact_id, wait)
+
+            return False
+
+        try:
+            acquire_shared("digisac", rate_limit)
+        except RateLimitExceeded:
+            # fila de envios maior que RATE_LIMIT_MAX_WAIT: também não gasta tentativa
+            self._retry_later(contact_id, 1)
+
+            return False
+
+        item["attempts"] += 1
+        ok, retry = self._send(item)
+
+        if not ok and retry and item["attempts"] < max_attempts:
+            # o contato fica parado até a nova tentativa, pra não inverter a ordem
+            self._retry_later(contact_id, backoff * 2 ** (item["attempts"] - 1))
+
+            return False
+
+        if not ok:
+            give_up(item)
+
+        return True
+
+    def _worker(self):
+        while True:
+            contact_id = self.ready.get()
+
+            with self.lock:
+                item = self.queues[contact_id][0]
+
+            try:
+                if not self._attempt(contact_id, item):
+                    continue
+            except Exception as exception:
+                # erro inesperado (ex.: resposta que não é JSON): o item sai da fila para a
+                # dead-letter e o worker segue, senão o contato ficaria travado até reiniciar
+                logger.exception("Erro inesperado no envio para %s do contato %s: %s", item["path"], contact_id, exception)
+
+                try:
+                    give_up(item)
+                except Exception:
+                    logger.exception("Envio do contato %s descartado: não foi possível gravar na dead-letter", contact_id)
+
+            with self.lock:
+                pending = self.queues[contact_id]
+                pending.popleft()
+
+                if pending:
+                    self.ready.put(contact_id)
+                else:
+                    del self.queues[contact_id]
+
+    def _item(self, contact_id, method, path, on_success, on_failure, kwargs):
+        return {"contactId": contact_id, "method": method, "path": path, "kwargs": kwargs, "on_success": on_success, "on_failure": on_failure, "attempts": 0}
+
+    def submit(self, contact_id, method, path, on_success=None, on_failure=None, **kwargs):
+        item = self._item(contact_id, method, path, on_success, on_failure, kwargs)
+
+        if mode == "sync":
+            item["attempts"] = 1
+            ok, _ = self._send(item)
+
+            if not ok:
+                give_up(item)
+
+            return
+
+        self._start()
+
+        with self.lock:
+            pending = self.queues.get(contact_id)
+
+            if pending is None:
+                self.queues[contact_id] = deque([item])
+                self.ready.put(contact_id)
+            else:
+                pending.append(item)
+
+    # envios na fila (de um contato ou de todos)
+    def pending(self, contact_id=None) -> int:
+        with self.lock:
+            if contact_id is not None:
+                return len(self.queues.get(contact_id) or ())
+
+            return sum(len(pending) for pending in self.queues.values())
+
+    # espera a fila esvaziar (testes e benchmarks)
+    def flush(self, timeout=30) -> bool:
+        deadline = time.time() + timeout
+
+        while self.pending() and time.time() < deadline:
+            time.sleep(0.01)
+
+        return not self.pending()
+
+dispatcher = Dispatcher()
+
+def dispatch(contact_id, method, path, on_success=None, on_failure=None, **kwargs):
+    dispatcher.submit(contact_id, method, path, on_success=on_success, on_failure=on_failure, **kwargs)
+
+# o envio não vai mais ser tentado: avisa quem enviou (on_failure) e guarda na dead-letter
+def give_up(item):
+    if item.get("on_failure"):
+        try:
+            item["on_failure"]()
+        except Exception as exception:
+            logger.exception("Erro no callback de falha do envio: %s", exception)
+
+    dead_letter(item)
+
+# os callbacks ficam de fora (funções não são serializáveis; ver o comentário no topo)
+def dead_letter(item):
+    entry = {key: item[key] for key in ("contactId", "method", "path", "kwargs", "attempts")}
+    entry["failed_at"] = time.time()
+
+    redis_list_push(dead_letter_key, json.dumps(entry))
+    logger.error("Envio para %s do contato %s foi para a dead-letter", item["path"], item["contactId"])
+
+def dead_letter_count() -> int:
+    return redis_list_len(dead_letter_key)
+
+register_gauge("chatbot_dispatcher_pending", "Envios ao Digisac aguardando na fila do dispatcher", dispatcher.pending)
+register_gauge("chatbot_dispatcher_dead_letters", "Envios na lista de dead-letter", dead_letter_count)
+
+# reenvia as requisições da dead-letter (na ordem em que falharam)
+def replay_dead_letters(limit=None) -> int:
+    replayed = 0
+
+    while limit is None or replayed < limit:
+        entry = redis_list_pop(dead_letter_key)
+
+        if not entry:
+            break
+
+        entry = json.loads(entry)
+        dispatch(entry["contactId"], entry["method"], entry["path"], **entry["kwargs"])
+        replayed += 1
+
+    return replayed
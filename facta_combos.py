@@ -0,0 +1,106 @@
+import os, json, time, logging, threading, unicodedata
+from .redis_client import redis_get, redis_set, redis_hmget, redis_hupdate
+
+# Cache das tabelas auxiliares da Facta (estado civil e códigos de cidade).
+# Os dados ficam indexados em memória por nome normalizado (sem acento e em
+# maiúsculas) e também no Redis, compartilhados entre os workers.
+# O estado civil é recarregado a cada FACTA_COMBOS_REFRESH segundos; código de
+# cidade não muda, então cada cidade só é buscada na Facta na primeira vez.
+refresh_interval = int(os.getenv("FACTA_COMBOS_REFRESH", 86400))
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_estado_civil = {}
+_estado_civil_loaded_at = 0
+_cidades = {}
+_refresh_thread = None
+
+def normalize(text) -> str:
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return " ".join(text.upper().split())
+
+def _index(table: dict) -> dict:
+    return {normalize(name): code for code, name in table.items()}
+
+def refresh_estado_civil(client):
+    global _estado_civil, _estado_civil_loaded_at
+
+    table = client.with_token(lambda token: client.proposta_combos_estado_civil_lista(token))
+
+    with _lock:
+        _estado_civil = _index(table)
+        _estado_civil_loaded_at = time.time()
+
+    redis_set("facta:combos:estado_civil", json.dumps(table), ex=refresh_interval)
+    logger.info("Tabela de estado civil da Facta atualizada (%s itens)", len(table))
+
+def _refresh_loop(client_factory):
+    while True:
+        time.sleep(refresh_interval)
+
+        try:
+            refresh_estado_civil(client_factory())
+        except Exception as exception:
+            logger.exception("Erro ao atualizar tabela de estado civil da Facta: %s", exception)
+
+def _start_refresh(client_factory):
+    global _refresh_thread
+
+    with _lock:
+        if _refresh_thread is None:
+            _refresh_thread = threading.Thread(target=_refresh_loop, args=(client_factory,), daemon=True, name="facta-combos")
+            _refresh_thread.start()
+
+def _load_estado_civil(client):
+    global _estado_civil, _estado_civil_loaded_at
+
+    if _estado_civil and time.time() - _estado_civil_loaded_at < refresh_interval:
+        return
+
+    cached = redis_get("facta:combos:estado_civil")
+
+    if cached:
+        with _lock:
+            _estado_civil = _index(json.loads(cached))
+            _estado_civil_loaded_at = time.time()
+    else:
+        refresh_estado_civil(client)
+
+    _start_refresh(type(client))
+
+def estado_civil_code(client, estado_civil: str) -> str | None:
+    _load_estado_civil(client)
+
+    return _estado_civil.get(normalize(estado_civil))
+
+def cidade_code(client, estado: str, cidade: str) -> str:
+    uf = normalize(estado)
+    name = normalize(cidade)
+    code = _cidades.get((uf, name))
+
+    if code:
+        return code
+
+    code = redis_hmget(f"facta:combos:cidade:{uf}", [name]).get(name)
+
+    if not code:
+        cities = client.with_token(lambda token: client.proposta_combos_cidade_lista(token, estado, cidade))
+
+        if not cities:
+            raise ValueError(f"Cidade '{cidade}' não encontrada para o estado '{estado}'.")
+
+        index = _index(cities)
+        # a busca da Facta é por trecho do nome; sem nome exato usa o primeiro resultado, como antes
+        code = index.get(name) or next(iter(cities))
+        index[name] = code
+        redis_hupdate(f"facta:combos:cidade:{uf}", index)
+
+        with _lock:
+            _cidades.update({(uf, key): value for key, value in index.items()})
+
+    _cidades[(uf, name)] = code
+
+    return code
@@ -0,0 +1,295 @@
+import os, time, asyncio, weakref, threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+from .budget import DeadlineExceeded, allows, budget, remaining, timeout_for
+from .circuit_breaker import CircuitOpenError, get_breaker
+from .metrics import register_gauge
+from .rate_limit import acquire, acquire_async, endpoint_of, limit_for, throttled
+
+# Sessões HTTP de longa duração, uma por upstream, compartilhadas por todo o processo.
+# O tamanho do pool deve acompanhar o número de threads do worker:
+#   HTTP_POOL_MAXSIZE (padrão para todos) ou HTTP_POOL_<UPSTREAM>_MAXSIZE (ex.: HTTP_POOL_FACTA_MAXSIZE)
+pool_connections = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+pool_maxsize = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
+# timeout de cada tentativa quando quem chama não informa nenhum
+default_timeout = float(os.getenv("HTTP_DEFAULT_TIMEOUT", 60))
+
+all_methods = ["HEAD", "GET", "POST", "PUT", "DELETE", "OPTIONS", "TRACE"]
+
+# política de retry de cada upstream (a mesma que cada cliente usava)
+upstreams = {
+    "digisac": None,
+    "parana": Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    "facta": Retry(total=3, backoff_factor=0.05, status_forcelist=[429, 500, 502, 503, 504]),
+    "newcorban": Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=all_methods),
+    "brasilapi": None
+}
+
+# erros de uma chamada a um upstream, para os clientes registrarem e repassarem: além dos
+# erros de rede/HTTP, o disjuntor aberto e o prazo da mensagem esgotado (inclusive
+# RateLimitExceeded), que não são RequestException/HTTPError
+upstream_errors = (requests.exceptions.RequestException, CircuitOpenError, DeadlineExceeded)
+async_upstream_errors = (httpx.HTTPError, CircuitOpenError, DeadlineExceeded)
+
+_sessions = {}
+_lock = threading.Lock()
+
+# clientes httpx ficam presos ao event loop em que foram criados: um conjunto por loop
+_async_clients = weakref.WeakKeyDictionary()
+_background_loop = None
+
+def _backoff(retry, attempt):
+    return 0 if attempt < 2 else min(retry.backoff_factor * 2 ** (attempt - 1), retry.DEFAULT_BACKOFF_MAX)
+
+def _connect_failed(exception) -> bool:
+    reason = getattr(exception.args[0], "reason", None) if exception.args else None
+
+    return isinstance(exception, requests.exceptions.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+# 429: o Retry-After vale para todos (rate_limit.py) e só tenta de novo se couber no prazo.
+# O upstream recusou sem processar, então qualquer método pode ser repetido (inclusive POST).
+# Com limite configurado o próximo acquire() já espera o bloqueio; sem limite, espera aqui
+def _after_throttle(name, endpoint, headers, retryable, pause):
+    blocked = throttled(name, endpoint, headers)
+
+    if limit_for(name, endpoint) is None:
+        pause = max(pause, blocked)
+
+    return retryable and allows(blocked), pause
+
+class UpstreamAdapter(HTTPAdapter):
+    """Aplica a Retry do upstream aqui, e não no urllib3, pra que cada tentativa use só o
+    que resta do prazo da mensagem (budget.py), o retry pare quando o prazo acabar, o
+    disjuntor do upstream (circuit_breaker.py) veja o resultado de cada tentativa e cada
+    tentativa espere sua vez no limite de requisições do endpoint (rate_limit.py)."""
+
+    def __init__(self, name, **kwargs):
+        super().__init__(max_retries=0, **kwargs)
+        self.name = name
+        self.retry = upstreams[name]
+        self.breaker = get_breaker(name)
+
+    def send(self, request, timeout=None, **kwargs):
+        requested = timeout or default_timeout
+        retry = self.retry
+        endpoint = endpoint_of(request.url)
+        attempt = 0
+
+        while True:
+            acquire(self.name, endpoint)
+            attempt_timeout = timeout_for(requested)
+            pause = _backoff(retry, attempt + 1) if retry is not None else 0
+            # erro de conexão sempre pode ser tentado de novo; status e erro de leitura só nos métodos permitidos
+            retryable = retry is not None and attempt < retry.total and allows(pause)
+            allowed = retryable and (retry.allowed_methods is None or request.method.upper() in retry.allowed_methods)
+
+            self.breaker.before()
+
+            try:
+                response = super().send(request, timeout=attempt_timeout, **kwargs)
+            except requests.exceptions.RequestException as exception:
+                # timeout encurtado pelo prazo da mensagem não conta como falha do upstream
+                clamped = isinstance(exception, requests.exceptions.Timeout) and attempt_timeout < requested
+                upstream_failed = isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)) and not clamped
+
+                self.breaker.record(False if upstream_failed else None)
+
+                if not upstream_failed or not (retryable if _connect_failed(exception) else allowed):
+                    raise
+            except BaseException:
+                # saída sem resultado (ex.: erro fora do requests): libera a chamada de teste do disjuntor
+                self.breaker.record(None)
+
+                raise
+            else:
+                self.breaker.record(response.status_code < 500)
+
+                if response.status_code == 429:
+                    allowed, pause = _after_throttle(self.name, endpoint, response.headers, retryable, pause)
+
+                if not (allowed and response.status_code in retry.status_forcelist):
+                    return response
+
+                response.close()
+
+            attempt += 1
+            time.sleep(pause)
+
+def _make_session(name):
+    maxsize = int(os.getenv(f"HTTP_POOL_{name.upper()}_MAXSIZE", pool_maxsize))
+    adapter = UpstreamAdapter(name, pool_connections=pool_connections, pool_maxsize=maxsize)
+    session = requests.Session()
+
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+def get_session(name: str) -> requests.Session:
+    if name not in upstreams:
+        raise ValueError(f"Upstream '{name}' não configurado.")
+
+    session = _sessions.get(name)
+
+    if session is None:
+        with _lock:
+            session = _sessions.get(name)
+
+            if session is None:
+                session = _sessions[name] = _make_session(name)
+
+    return session
+
+# estatísticas por host: hits = requisições que reaproveitaram conexão, misses = conexões novas
+def pool_stats() -> dict:
+    stats = {}
+
+    for name, session in list(_sessions.items()):
+        adapter = session.get_adapter("https://")
+        pools = adapter.poolmanager.pools
+        hosts = {}
+
+        for key in pools.keys():
+            pool = pools.get(key)
+
+            if pool is None:
+                continue
+
+            requests_count = pool.num_requests
+            connections = pool.num_connections
+            idle = sum(1 for connection in list(pool.pool.queue) if connection) if pool.pool else 0
+
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "requests": requests_count,
+                "hits": max(requests_count - connections, 0),
+                "misses": connections,
+                "idle": idle,
+                # conexões emprestadas agora (o pool guarda None nas vagas ainda não abertas)
+                "in_use": (pool.pool.maxsize - pool.pool.qsize()) if pool.pool else 0,
+                "maxsize": adapter._pool_maxsize
+            }
+
+        stats[name] = hosts
+
+    return stats
+
+def _pool_gauge(field):
+    return lambda: [({"upstream": name, "host": host}, values[field]) for name, hosts in pool_stats().items() for host, values in hosts.items()]
+
+register_gauge("chatbot_http_pool_in_use", "Conexões HTTP em uso, por upstream e host", _pool_gauge("in_use"))
+register_gauge("chatbot_http_pool_idle", "Conexões HTTP abertas e livres no pool", _pool_gauge("idle"))
+register_gauge("chatbot_http_pool_maxsize", "Tamanho máximo do pool de conexões", _pool_gauge("maxsize"))
+
+def _make_async_client(name):
+    maxsize = int(os.getenv(f"HTTP_POOL_{name.upper()}_MAXSIZE", pool_maxsize))
+    limits = httpx.Limits(max_connections=maxsize, max_keepalive_connections=maxsize)
+
+    return httpx.AsyncClient(limits=limits)
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+    if name not in upstreams:
+        raise ValueError(f"Upstream '{name}' não configurado.")
+
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+
+    if client is None:
+        client = clients[name] = _make_async_client(name)
+
+    return client
+
+# requisição assíncrona com a mesma política de retry da sessão síncrona do upstream:
+# erro de conexão sempre é tentado de novo; status da status_forcelist e erro de leitura
+# só nos métodos permitidos pela Retry (POST fica de fora, salvo na Newcorban);
+# respeita o prazo da mensagem, o disjuntor e o limite de requisições, como o UpstreamAdapter
+async def async_request(name: str, method: str, url: str, **kwargs) -> httpx.Response:
+    client = get_async_client(name)
+    retry = upstreams[name]
+    breaker = get_breaker(name)
+    requested = kwargs.pop("timeout", None) or default_timeout
+    attempt = 0
+
+    # o requests ignora headers com valor None (ex.: variável de ambiente ausente); o httpx não
+    if kwargs.get("headers"):
+        kwargs["headers"] = {key: value for key, value in kwargs["headers"].items() if value is not None}
+
+    endpoint = endpoint_of(url)
+
+    while True:
+        await acquire_async(name, endpoint)
+        attempt_timeout = timeout_for(requested)
+        pause = _backoff(retry, attempt + 1) if retry is not None else 0
+        retryable = retry is not None and attempt < retry.total and allows(pause)
+        allowed = retryable and (retry.allowed_methods is None or method.upper() in retry.allowed_methods)
+
+        breaker.before()
+
+        try:
+            response = await client.request(method, url, timeout=attempt_timeout, **kwargs)
+        except httpx.TimeoutException as exception:
+            clamped = attempt_timeout < requested
+            breaker.record(None if clamped else False)
+
+            if clamped or not (retryable if isinstance(exception, httpx.ConnectTimeout) else allowed):
+                raise
+        except httpx.ConnectError:
+            breaker.record(False)
+
+            if not retryable:
+                raise
+        except (httpx.ReadError, httpx.RemoteProtocolError):
+            breaker.record(False)
+
+            if not allowed:
+                raise
+        except BaseException:
+            # outros erros e CancelledError (task cancelada no fim do prazo da cotação):
+            # sem resultado, mas a chamada de teste do disjuntor precisa ser liberada
+            breaker.record(None)
+
+            raise
+        else:
+            breaker.record(response.status_code < 500)
+
+            if response.status_code == 429:
+                allowed, pause = _after_throttle(name, endpoint, response.headers, retryable, pause)
+
+            if not (allowed and response.status_code in retry.status_forcelist):
+                return response
+
+        attempt += 1
+        await asyncio.sleep(pause)
+
+# event loop em thread própria, pra código síncrono usar os clientes assíncronos
+# (muitas chamadas em espera dividem uma thread em vez de uma thread cada)
+def background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+
+    with _lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, daemon=True, name="http-async").start()
+
+    return _background_loop
+
+async def _within(coro, seconds):
+    with budget(seconds):
+        return await coro
+
+# roda a corrotina no event loop compartilhado; o prazo da mensagem vai junto
+def run_async(coro, timeout: float | None = None):
+    left = remaining()
+
+    if left is not None:
+        coro = _within(coro, left)
+        timeout = left if timeout is None else min(timeout, left)
+
+    return asyncio.run_coroutine_threadsafe(coro, background_loop()).result(timeout)
+
+# fecha os clientes assíncronos do loop atual (ex.: no shutdown do servidor ASGI)
+async def close_async_clients():
+    for client in _async_clients.pop(asyncio.get_running_loop(), {}).values():
+        await client.aclose()
@@ -0,0 +1,61 @@
+import os, json, base64, hashlib, logging
+from pathlib import Path
+from clients.redis_client import redis_get, redis_set, redis_delete
+
+# Mídias estáticas enviadas pelo bot: lidas e codificadas em base64 uma única vez.
+# Com DIGISAC_MEDIA_REUSE=1, depois do primeiro envio a URL devolvida pelo Digisac
+# fica salva no Redis e os próximos envios mandam só a referência, sem o base64.
+# A referência vale por DIGISAC_MEDIA_REUSE_TTL segundos (o Digisac não garante que a
+# URL dure para sempre) e é descartada se um envio que a usou falhar; nos dois casos o
+# próximo envio volta a mandar o arquivo e guarda a nova referência.
+reuse_reference = os.getenv("DIGISAC_MEDIA_REUSE", "0") == "1"
+reference_ttl = int(os.getenv("DIGISAC_MEDIA_REUSE_TTL", 86400))
+
+logger = logging.getLogger(__name__)
+
+class MediaAsset:
+    def __init__(self, path: Path, mimetype: str):
+        self.name = path.name
+        self.mimetype = mimetype
+
+        with open(path, "rb") as file:
+            content = file.read()
+
+        self.base64 = base64.b64encode(content).decode("utf-8")
+        self.reference_key = f"media:{hashlib.sha256(content).hexdigest()}"
+
+    # bloco "file" do payload de /api/v1/messages
+    def file_payload(self) -> dict:
+        if reuse_reference:
+            reference = redis_get(self.reference_key)
+
+            if reference:
+                return {"url": json.loads(reference).get("url"), "mimetype": self.mimetype, "name": self.name}
+
+        return {"base64": self.base64, "mimetype": self.mimetype, "name": self.name}
+
+    # guarda a referência da mídia devolvida pelo Digisac depois de um envio com sucesso
+    def remember(self, response_json: dict):
+        if not reuse_reference:
+            return
+
+        file = (response_json or {}).get("file") or {}
+
+        if file.get("url"):
+            redis_set(self.reference_key, json.dumps({"id": file.get("id"), "url": file.get("url")}), ex=reference_ttl)
+
+    # envio com a referência falhou (ex.: URL expirada): o próximo manda o base64 de novo
+    def forget(self):
+        redis_delete(self.reference_key)
+
+    # callbacks do dispatcher para um envio com este bloco "file"
+    def callbacks(self, file_payload: dict) -> dict:
+        return {"on_success": self.remember, "on_failure": self.forget if "url" in file_payload else None}
+
+def load_asset(path: Path, mimetype: str) -> MediaAsset | None:
+    try:
+        return MediaAsset(path, mimetype)
+    except OSError as exception:
+        logger.error(f"Erro ao carregar a mídia {path.name}: {exception}")
+
+        return None
@@ -0,0 +1,234 @@
+import os, json, time, atexit, bisect, inspect, logging, functools, threading
+from contextlib import contextmanager
+from .redis_client import cache_stats, redis_hgetall, redis_hincr_many
+
+# Métricas no formato texto do Prometheus, sem dependência extra.
+#
+# Histogramas: cada processo acumula as observações em memória e a cada
+# METRICS_FLUSH_INTERVAL segundos soma os valores num hash do Redis, então o
+# /metrics de qualquer processo mostra o total de todos os workers (webhook e Celery).
+# Gauges e contadores registrados com register_gauge/register_counter são lidos na hora,
+# no processo que responde o /metrics (contadores: totais desde o início do processo).
+flush_interval = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+redis_key = "metrics:histograms"
+reply_timeout = 600
+
+histograms = {
+    "chatbot_stage_seconds": "Duração de cada etapa do atendimento (webhook, handler, proposta)",
+    "chatbot_upstream_seconds": "Duração das chamadas aos upstreams, por método do cliente",
+    "chatbot_reply_latency_seconds": "Tempo entre a mensagem do cliente chegar no webhook e a primeira resposta do bot ser entregue",
+    "chatbot_rate_limit_wait_seconds": "Espera pela vez no limite de requisições de cada upstream (rejected = não cabia no prazo)"
+}
+
+logger = logging.getLogger(__name__)
+
+_pending = {}
+_gauges = {}
+_awaiting_reply = {}
+_lock = threading.Lock()
+_flusher = None
+
+def _labels_key(labels: dict) -> str:
+    return json.dumps({key: str(value) for key, value in sorted(labels.items())}, ensure_ascii=False, separators=(",", ":"))
+
+def _start_flusher():
+    global _flusher
+
+    if _flusher is not None:
+        return
+
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush")
+            _flusher.start()
+
+def observe(name: str, seconds: float, **labels):
+    key = (name, _labels_key(labels))
+
+    with _lock:
+        # contagem por bucket (+Inf no fim), soma e total
+        series = _pending.get(key)
+
+        if series is None:
+            series = _pending[key] = [0] * (len(buckets) + 3)
+
+        series[bisect.bisect_left(buckets, seconds)] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+    _start_flusher()
+
+# resultado da operação para o label outcome: ok, http_<status> ou o tipo da exceção
+def outcome_of(exception) -> str:
+    if exception is None:
+        return "ok"
+
+    status = getattr(getattr(exception, "response", None), "status_code", None)
+
+    return f"http_{status}" if status else type(exception).__name__
+
+# mede o bloco; labels pode ser completado dentro do bloco (ex.: estado só conhecido depois)
+@contextmanager
+def span(name: str, **labels):
+    start = time.perf_counter()
+    outcome = "ok"
+
+    try:
+        yield labels
+    except BaseException as exception:
+        outcome = outcome_of(exception)
+
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+# decorator para os métodos dos clientes (síncronos ou corrotinas)
+def timed(upstream: str, operation: str | None = None):
+    def decorator(fn):
+        labels = {"upstream": upstream, "operation": operation or fn.__name__}
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span("chatbot_upstream_seconds", **labels):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span("chatbot_upstream_seconds", **labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+# fn() devolve um número ou uma lista de (labels, valor); None não é exportado
+def register_gauge(name: str, help: str, fn):
+    _gauges[name] = (help, fn, "gauge")
+
+# igual a register_gauge, para valores que só crescem; o nome deve terminar em _total
+def register_counter(name: str, help: str, fn):
+    _gauges[name] = (help, fn, "counter")
+
+# latência de ponta a ponta: começa quando o handler pega a mensagem (com o horário em
+# que ela chegou no webhook) e termina na primeira resposta entregue ao Digisac
+def await_reply(contact_id, received_at, state):
+    now = time.time()
+
+    with _lock:
+        if len(_awaiting_reply) > 1000:
+            for key, (started_at, _) in list(_awaiting_reply.items()):
+                if now - started_at > reply_timeout:
+                    del _awaiting_reply[key]
+
+        _awaiting_reply[contact_id] = (received_at or now, state)
+
+def replied(contact_id):
+    with _lock:
+        waiting = _awaiting_reply.pop(contact_id, None)
+
+    if waiting:
+        observe("chatbot_reply_latency_seconds", max(time.time() - waiting[0], 0), state=waiting[1])
+
+def flush():
+    global _pending
+
+    with _lock:
+        pending, _pending = _pending, {}
+
+    increments = {}
+
+    for (name, labels), series in pending.items():
+        for index, count in enumerate(series[:-2]):
+            if count:
+                le = buckets[index] if index < len(buckets) else "+Inf"
+                increments[f"{name}\t{labels}\t{le}"] = count
+
+        increments[f"{name}\t{labels}\tsum"] = series[-2]
+        increments[f"{name}\t{labels}\tcount"] = series[-1]
+
+    redis_hincr_many(redis_key, increments)
+
+def _flush_loop():
+    while True:
+        time.sleep(flush_interval)
+
+        try:
+            flush()
+        except Exception as exception:
+            logger.exception("Erro ao gravar métricas: %s", exception)
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+
+    values = ",".join(f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in labels.items())
+
+    return "{" + values + "}"
+
+def _render_histograms(lines):
+    series = {}
+
+    for field, value in redis_hgetall(redis_key).items():
+        name, labels, suffix = field.split("\t")
+        entry = series.setdefault((name, labels), {})
+        entry[suffix] = float(value)
+
+    for name, help in histograms.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} histogram")
+
+        for (series_name, labels), entry in sorted(series.items()):
+            if series_name != name:
+                continue
+
+            labels = json.loads(labels)
+            cumulative = 0
+
+            for le in [*buckets, "+Inf"]:
+                cumulative += entry.get(str(le), 0)
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {int(cumulative)}")
+
+            lines.append(f"{name}_sum{_format_labels(labels)} {entry.get('sum', 0)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {int(entry.get('count', 0))}")
+
+def _render_gauges(lines):
+    for name, (help, fn, kind) in _gauges.items():
+        try:
+            value = fn()
+        except Exception as exception:
+            logger.warning("Erro ao ler gauge %s: %s", name, exception)
+            continue
+
+        if value is None:
+            continue
+
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        for labels, sample in (value if isinstance(value, list) else [({}, value)]):
+            lines.append(f"{name}{_format_labels(labels)} {sample}")
+
+# texto do /metrics (formato de exposição 0.0.4 do Prometheus)
+def render() -> str:
+    flush()
+    lines = []
+
+    _render_histograms(lines)
+    _render_gauges(lines)
+
+    return "\n".join(lines) + "\n"
+
+def _cache_stat(stat):
+    return lambda: [({"cache": name}, stats[stat]) for name, stats in cache_stats().items() if stats.get(stat) is not None]
+
+register_gauge("chatbot_cache_entries", "Entradas no near-cache e no fallback em memória do redis_client", _cache_stat("size"))
+register_counter("chatbot_cache_evictions_total", "Entradas descartadas por falta de espaço (LRU) desde o início do processo", _cache_stat("evictions"))
+register_counter("chatbot_cache_hits_total", "Leituras atendidas pelo near-cache desde o início do processo", _cache_stat("hits"))
+register_counter("chatbot_cache_misses_total", "Leituras que foram ao Redis com o near-cache ativo", _cache_stat("misses"))
+register_gauge("chatbot_cache_hit_ratio", "Acertos / leituras do near-cache", _cache_stat("hit_ratio"))
+
+atexit.register(flush)
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+# Dicionário LRU limitado e seguro entre threads.
+# Usado pelo redis_client para o near-cache do processo e para o _memory_store
+# (fallback sem Redis): passado de maxsize entradas, a usada há mais tempo sai.
+# A expiração fica a cargo de quem grava (os itens carregam o próprio expires_at).
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # muda a cada invalidação: put() descarta valores lidos antes dela
+        self.epoch = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key, default)
+
+            if key in self._items:
+                self._items.move_to_end(key)
+
+            return item
+
+    def __setitem__(self, key, item):
+        with self._lock:
+            self._store(key, item)
+
+    def _store(self, key, item):
+        self._items[key] = item
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    # grava só se nada foi invalidado desde `epoch` (lido antes da ida ao Redis)
+    def put(self, key, item, epoch: int) -> bool:
+        with self._lock:
+            if epoch != self.epoch:
+                return False
+
+            self._store(key, item)
+
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.epoch += 1
+
+            if self._items.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._items.clear()
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
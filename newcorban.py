@@ -0,0 +1,150 @@
+import requests, os, json, time, base64, logging
+from .http_pool import get_session, upstream_errors
+from .metrics import timed
+from .token_cache import TokenRejectedError, call_with_token
+
+# URLs da Newcorban (podem ser trocadas por ambiente, ex.: benchmarks)
+server_url = os.getenv("NEWCORBAN_SERVER_URL", "https://server.newcorban.com.br")
+api_url = os.getenv("NEWCORBAN_API_URL", "https://api.newcorban.com.br")
+timeout = 60
+
+logger = logging.getLogger(__name__)
+
+user_agent = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/139.0.0.0 Safari/537.36 Edg/139.0.0.0"
+)
+
+# segundos até o "exp" de um JWT; None se o token não for JWT
+def _jwt_expires_in(token: str) -> float | None:
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+
+        return exp - time.time() if exp else None
+    except (IndexError, ValueError, TypeError):
+        return None
+
+class NewcorbanClient:
+    def __init__(self):
+        # sessão compartilhada pelo processo (pool de conexões + retry)
+        self.session = get_session("newcorban")
+        self.username = os.getenv("NEWCORBAN_USERNAME")
+        self.password = os.getenv("NEWCORBAN_PASSWORD")
+
+    def _headers(self, token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "Origin": "https://freitas.newcorban.com.br",
+            "Referer": "https://freitas.newcorban.com.br/",
+            "User-Agent": user_agent
+        }
+
+    def _handle_response(self, response):
+        if response.status_code != 200:
+            response.raise_for_status()
+
+        return response.json()
+
+    def _login_headers(self) -> dict:
+        return {
+            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+            "Accept": "*/*",
+            "Origin": "https://freitas.newcorban.com.br",
+            "Referer": "https://freitas.newcorban.com.br/",
+            "User-Agent": user_agent
+        }
+
+    def _login_data(self) -> dict:
+        return {
+            "usuario": self.username,
+            "empresa": "freitas",
+            "senha": self.password,
+            "ip": "192.141.239.5",
+            "cf-turnstile-response": "0"
+        }
+
+    def _login_token(self, response_json: dict) -> dict:
+        if not response_json.get("token"):
+            raise RuntimeError("Falha ao obter token de login")
+
+        return response_json
+
+    # a Newcorban responde 200 com "error" quando a sessão não é válida
+    def _cliente(self, response_json: dict) -> dict:
+        logger.debug(f"[CLIENTE_BUSCAR]: {response_json}")
+
+        if response_json.get("error"):
+            raise TokenRejectedError(response_json.get("error"))
+
+        return response_json
+
+    # o histórico é uma lista de contas; com a sessão inválida vem 200 com {"error": ...},
+    # que não pode virar "nenhuma conta encontrada"
+    def _historico(self, response_json) -> list:
+        if not isinstance(response_json, list):
+            error = response_json.get("error") if isinstance(response_json, dict) else None
+
+            raise TokenRejectedError(error or f"Histórico bancário inesperado: {type(response_json).__name__}")
+
+        return response_json
+
+    @timed("newcorban")
+    def login(self) -> dict:
+        try:
+            response = self.session.post(f"{server_url}/api/v2/login", headers=self._login_headers(), data=self._login_data(), timeout=timeout)
+
+            return self._login_token(self._handle_response(response))
+        except upstream_errors as exception:
+            logger.exception("Erro ao fazer login na Newcorban: %s", exception)
+
+            raise
+
+    def _fetch_token(self):
+        token = self.login().get("token")
+
+        return token, _jwt_expires_in(token)
+
+    # executa call(token) com o token de sessão compartilhado entre os workers
+    # (renovado antes de expirar); se a Newcorban recusar, faz login e tenta de novo
+    def with_token(self, call):
+        return call_with_token("newcorban", self._fetch_token, call)
+
+    @timed("newcorban")
+    def cliente_buscar(self, token: str, cpf: str) -> dict:
+        try:
+            response = self.session.get(f"{server_url}/system/cliente.php?action=buscar&cpf={cpf}", headers=self._headers(token), timeout=timeout)
+
+            return self._cliente(self._handle_response(response))
+        except upstream_errors as exception:
+            logger.exception("Erro ao buscar cliente na Newcorban: %s", exception)
+
+            raise
+
+    @timed("newcorban")
+    def cliente_historico_bancario(self, token: str, cpf: str) -> list:
+        try:
+            response = self.session.get(f"{server_url}/system/cliente.php?action=getBankAccountHistory&cpf={cpf}", headers=self._headers(token), timeout=timeout)
+
+            return self._historico(self._handle_response(response))
+        except upstream_errors as exception:
+            logger.exception("Erro ao buscar histórico bancário na Newcorban: %s", exception)
+
+            raise
+
+    @timed("newcorban")
+    def criar_proposta(self, payload: dict) -> requests.Response:
+        try:
+            headers = {"Content-Type": "application/json"}
+            response = self.session.post(f"{api_url}/api/propostas/", json=payload, headers=headers, timeout=timeout)
+            response.raise_for_status()
+
+            return response
+        except upstream_errors as exception:
+            logger.exception("Erro ao cadastrar proposta na Newcorban: %s", exception)
+
+            raise
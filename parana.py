@@ -1,28 +1,23 @@
-import requests, os, logging
+import os, logging
 from datetime import datetime, timezone
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from .http_pool import async_request, async_upstream_errors, get_session, upstream_errors
+from .metrics import timed
+from .token_cache import call_with_token, call_with_token_async
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ParanaClient:
     def __init__(self):
-        self.session = requests.Session()
-        self.base_url = "https://api-marketplace.paranabanco.com.br"
+        # sessão compartilhada pelo processo (pool de conexões + retry pra tolerar falhas transitórias)
+        self.session = get_session("parana")
+        self.base_url = os.getenv("PARANA_BASE_URL", "https://api-marketplace.paranabanco.com.br")
         # variáveis sensíveis via ENV
         self.client_id = os.getenv("CLIENT_ID")
         self.client_secret = os.getenv("CLIENT_SECRET")
         self.username = os.getenv("USER")
         self.password = os.getenv("password")
 
-        # usa sessão com retry pra tolerar falhas transitórias
-        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retry)
-
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
-
     # validar resposta: se não for status 200, dá erro
     def _handle_response(self, response):
         if response.status_code != 200:
@@ -30,85 +25,141 @@ class ParanaClient:
         
         return response.json()
 
+    def _auth_headers(self) -> dict:
+        return {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "X-Client-Id": self.client_id
+        }
+
+    def _auth_data(self) -> dict:
+        return {
+            "grant_type": "password",
+            "scope": "openid",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "username": self.username,
+            "password": self.password
+        }
+
+    def _headers(self, token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {token}",
+            "X-Client-Id": self.client_id,
+            "Content-Type": "application/json"
+        }
+
+    def _saldo_payload(self, cpf: str) -> dict:
+        return {
+            "cpf": cpf,
+            "quantidadeDePeriodos": "10",
+            "cacheParam": cpf,
+            "fromCacheFGTS": False
+        }
+
+    # parâmetros da simulação, inclusive data atual UTC
+    def _simulacao_payload(self, cpf: str, saldosPorPeriodos: dict) -> dict:
+        return {
+            "cpf": cpf,
+            "dataDeNascimento": "1991-02-19T00:00:00.763Z",
+            "dataDeCalculo": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "codigoDaRegra": "040030",
+            "tipoDeSimulacaoSaqueAniversario": 2,
+            "quantidadeDeParcelas": 10,
+            "taxaMensal": 1.79,
+            "percentualProtecaoFGTS": 6,
+            "incluirSeguro": False,
+            "incluirTarifaDeCadastro": False,
+            "usuarioBanco": self.username,
+            "saldoDisponivel": None,
+            "valorSolicitado": 999999,
+            "saldosPorPeriodos": saldosPorPeriodos
+        }
+
     # pega token com grant type password
+    @timed("parana")
     def auth_token(self) -> dict:
         try:
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "X-Client-Id": self.client_id
-            }
-
-            data = {
-                "grant_type": "password",
-                "scope": "openid",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "username": self.username,
-                "password": self.password
-            }
-
-            response = self.session.post(f"{self.base_url}/v1/auth/token", headers=headers, data=data, timeout=60)
+            response = self.session.post(f"{self.base_url}/v1/auth/token", headers=self._auth_headers(), data=self._auth_data(), timeout=60)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro ao obter token: %s", exception)
 
             raise
 
+    def _fetch_token(self):
+        response = self.auth_token()
+
+        return response.get("access_token"), response.get("expires_in")
+
+    # executa call(token) com o token compartilhado entre os workers; em 401 renova e tenta de novo
+    def with_token(self, call):
+        return call_with_token("parana", self._fetch_token, call)
+
     # pega saldo disponível de saque aniversário usando token + CPF
+    @timed("parana")
     def fgts_saque_aniversario_saldo_disponivel(self, token: str, cpf: str) -> dict:
         try:
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "X-Client-Id": self.client_id,
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "cpf": cpf,
-                "quantidadeDePeriodos": "10",
-                "cacheParam": cpf,
-                "fromCacheFGTS": False
-            }
-
-            response = self.session.post(f"{self.base_url}/v1/fgts/saque-aniversario/saldo-disponivel", headers=headers, json=payload, timeout=60)
+            response = self.session.post(f"{self.base_url}/v1/fgts/saque-aniversario/saldo-disponivel", headers=self._headers(token), json=self._saldo_payload(cpf), timeout=60)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro ao consultar saldo disponível para CPF %s: %s", cpf, exception)
 
             raise
 
     # simula saque aniversário usando vários parâmetros, inclusive data atual UTC
+    @timed("parana")
     def fgts_saque_aniversario_simulacao(self, token: str, cpf: str, saldosPorPeriodos: dict) -> dict:
         try:
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "X-Client-Id": self.client_id,
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "cpf": cpf,
-                "dataDeNascimento": "1991-02-19T00:00:00.763Z",
-                "dataDeCalculo": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
-                "codigoDaRegra": "040030",
-                "tipoDeSimulacaoSaqueAniversario": 2,
-                "quantidadeDeParcelas": 10,
-                "taxaMensal": 1.79,
-                "percentualProtecaoFGTS": 6,
-                "incluirSeguro": False,
-                "incluirTarifaDeCadastro": False,
-                "usuarioBanco": self.username,
-                "saldoDisponivel": None,
-                "valorSolicitado": 999999,
-                "saldosPorPeriodos": saldosPorPeriodos
-            }
-
-            response = self.session.post(f"{self.base_url}/v3/fgts/saque-aniversario/simulacao", headers=headers, json=payload)
+            response = self.session.post(f"{self.base_url}/v3/fgts/saque-aniversario/simulacao", headers=self._headers(token), json=self._simulacao_payload(cpf, saldosPorPeriodos), timeout=60)
 
             return self._handle_response(response)
-        except requests.RequestException as exception:
+        except upstream_errors as exception:
             logger.exception("Erro na simulação para CPF %s: %s", cpf, exception)
 
-            raise
\ No newline at end of file
+            raise
+
+# consultas FGTS do ParanaClient com httpx, para a cotação assíncrona (quote.run_quotes_async):
+# as corrotinas esperam os bancos no event loop sem ocupar uma thread cada
+class AsyncParanaClient(ParanaClient):
+    @timed("parana")
+    async def auth_token(self) -> dict:
+        try:
+            response = await async_request("parana", "POST", f"{self.base_url}/v1/auth/token", headers=self._auth_headers(), data=self._auth_data(), timeout=60)
+
+            return self._handle_response(response)
+        except async_upstream_errors as exception:
+            logger.exception("Erro ao obter token: %s", exception)
+
+            raise
+
+    async def _fetch_token(self):
+        response = await self.auth_token()
+
+        return response.get("access_token"), response.get("expires_in")
+
+    async def with_token(self, call):
+        return await call_with_token_async("parana", self._fetch_token, call)
+
+    @timed("parana")
+    async def fgts_saque_aniversario_saldo_disponivel(self, token: str, cpf: str) -> dict:
+        try:
+            response = await async_request("parana", "POST", f"{self.base_url}/v1/fgts/saque-aniversario/saldo-disponivel", headers=self._headers(token), json=self._saldo_payload(cpf), timeout=60)
+
+            return self._handle_response(response)
+        except async_upstream_errors as exception:
+            logger.exception("Erro ao consultar saldo disponível para CPF %s: %s", cpf, exception)
+
+            raise
+
+    @timed("parana")
+    async def fgts_saque_aniversario_simulacao(self, token: str, cpf: str, saldosPorPeriodos: dict) -> dict:
+        try:
+            response = await async_request("parana", "POST", f"{self.base_url}/v3/fgts/saque-aniversario/simulacao", headers=self._headers(token), json=self._simulacao_payload(cpf, saldosPorPeriodos), timeout=60)
+
+            return self._handle_response(response)
+        except async_upstream_errors as exception:
+            logger.exception("Erro na simulação para CPF %s: %s", cpf, exception)
+
+            raise
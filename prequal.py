@@ -0,0 +1,183 @@
+import os, sys, csv, json, logging, argparse, threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from clients.budget import budget
+from services.cpf import normalize_cpf, validate_cpf
+from services.quote import best_quote, deadline, lenders, pipelines
+from services.simulation_cache import get_or_compute
+
+# Pré-qualificação FGTS em lote (ex.: lista de CPFs de uma campanha), sem passar pelo chat.
+#
+# Lê um CSV (coluna "cpf" ou a primeira coluna) ou JSONL ({"cpf": ...}) e consulta cada
+# banco pelos mesmos pipelines do quote.py, através do cache de simulações: os tokens são
+# os compartilhados do token_cache e o resultado já fica em cache para quando o cliente
+# chamar no WhatsApp. PREQUAL_<BANCO>_CONCURRENCY limita as consultas simultâneas por banco
+# (padrão 4); as requisições ainda respeitam o limite compartilhado de cada endpoint
+# (RATE_LIMIT_<UPSTREAM>, ver clients/rate_limit.py), junto com o tráfego do chat.
+# Cada CPF vira uma linha JSON no arquivo de saída, gravada assim que termina. O próprio
+# arquivo é o checkpoint: rodando de novo, os CPFs com linha completa são pulados e os que
+# tiveram falha em algum banco são consultados de novo (vale a última linha de cada CPF).
+#
+#   python -m services.prequal campanha.csv
+#   python -m services.prequal campanha.jsonl --output resultado.jsonl --lenders facta
+workers = int(os.getenv("PREQUAL_WORKERS", 8))
+
+logger = logging.getLogger(__name__)
+
+_semaphores = {lender: threading.BoundedSemaphore(int(os.getenv(f"PREQUAL_{lender.upper()}_CONCURRENCY", 4))) for lender in lenders}
+
+def read_cpfs(path):
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        if path.endswith(".jsonl"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line).get("cpf")
+
+            return
+
+        sample = file.read(4096)
+        file.seek(0)
+
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+
+        rows = csv.reader(file, dialect)
+        header = next(rows, None)
+
+        if header is None:
+            return
+
+        columns = [cell.strip().lower() for cell in header]
+        column = columns.index("cpf") if "cpf" in columns else 0
+
+        if "cpf" not in columns and header:
+            yield header[column]
+
+        for row in rows:
+            if len(row) > column:
+                yield row[column]
+
+# CPFs que já têm linha completa no arquivo de saída
+def completed(output) -> set:
+    done = set()
+
+    if not os.path.exists(output):
+        return done
+
+    with open(output, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # última linha cortada por uma interrupção
+                continue
+
+            if record.get("completo"):
+                done.add(record["cpf"])
+            else:
+                done.discard(record.get("cpf"))
+
+    return done
+
+def consult(lender: str, cpf: str) -> dict:
+    with _semaphores[lender], budget(deadline):
+        return get_or_compute(lender, cpf, pipelines[lender])
+
+def _record(cpf, results, failures) -> dict:
+    best = best_quote(results)
+
+    return {
+        "cpf": cpf,
+        "elegivel": best is not None,
+        "melhor": best,
+        "bancos": results,
+        "falhas": failures,
+        "completo": not failures,
+        "consultado_em": datetime.now().isoformat(timespec="seconds")
+    }
+
+def run(source, output, selected=None, resume=True) -> dict:
+    selected = selected or lenders
+    done = completed(output) if resume else set()
+    counts = {"lidos": 0, "invalidos": 0, "pulados": 0, "consultados": 0, "elegiveis": 0, "incompletos": 0}
+    pending = {}
+    futures = {}
+    seen = set()
+
+    def collect(out):
+        finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+        for future in finished:
+            cpf, lender = futures.pop(future)
+            results, failures = pending[cpf]
+
+            try:
+                results[lender] = future.result()
+            except Exception as exception:
+                logger.warning("Pré-qualificação %s falhou para um CPF: %s", lender, exception)
+                failures[lender] = str(exception) or type(exception).__name__
+
+            if len(results) + len(failures) < len(selected):
+                continue
+
+            record = _record(cpf, pending.pop(cpf)[0], failures)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts["consultados"] += 1
+            counts["elegiveis"] += record["elegivel"]
+            counts["incompletos"] += not record["completo"]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prequal") as executor, open(output, "a" if resume else "w", encoding="utf-8") as out:
+        for value in source:
+            counts["lidos"] += 1
+            cpf = normalize_cpf(value)
+
+            if cpf is None or not validate_cpf(cpf):
+                counts["invalidos"] += 1
+                continue
+
+            if cpf in done or cpf in seen:
+                counts["pulados"] += 1
+                continue
+
+            seen.add(cpf)
+            pending[cpf] = ({}, {})
+
+            for lender in selected:
+                futures[executor.submit(consult, lender, cpf)] = (cpf, lender)
+
+            # não lê a lista inteira para a memória: no máximo 2 consultas por thread em espera
+            while len(futures) >= workers * 2:
+                collect(out)
+
+        while futures:
+            collect(out)
+
+    logger.info("Pré-qualificação: %s", counts)
+
+    return counts
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m services.prequal", description="Pré-qualificação FGTS de uma lista de CPFs.")
+    parser.add_argument("input", help="CSV (coluna cpf ou a primeira) ou JSONL com {\"cpf\": ...}")
+    parser.add_argument("--output", help="JSONL de saída e checkpoint (padrão: <input>.prequal.jsonl)")
+    parser.add_argument("--lenders", default=",".join(lenders), help="bancos consultados, separados por vírgula")
+    parser.add_argument("--restart", action="store_true", help="ignora o checkpoint e reescreve a saída")
+    args = parser.parse_args(argv)
+
+    selected = [lender.strip() for lender in args.lenders.split(",") if lender.strip()]
+
+    for lender in selected:
+        if lender not in pipelines:
+            parser.error(f"banco desconhecido: {lender}")
+
+    logging.basicConfig(level=logging.INFO)
+    output = args.output or f"{os.path.splitext(args.input)[0]}.prequal.jsonl"
+    print(json.dumps(run(read_cpfs(args.input), output, selected, resume=not args.restart)))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import os, asyncio, logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from clients.budget import budget, remaining, submit
+from clients.circuit_breaker import is_open
+from clients.http_pool import run_async
+from clients.parana import AsyncParanaClient, ParanaClient
+from clients.api_facta import AsyncFactaClient, FactaClient
+from services.simulation_cache import get_or_compute, get_or_compute_async
+
+# Motor de cotação FGTS: consulta Paraná e Facta ao mesmo tempo e
+# devolve o que chegou dentro do prazo total (QUOTE_DEADLINE, em segundos)
+# QUOTE_ENGINE=async faz as consultas com os clientes httpx num event loop compartilhado
+# (as esperas pelos bancos não ocupam uma thread cada); o padrão "threads" usa o pool abaixo
+deadline = float(os.getenv("QUOTE_DEADLINE", 30))
+max_workers = int(os.getenv("QUOTE_WORKERS", 16))
+engine = os.getenv("QUOTE_ENGINE", "threads")
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quote")
+
+# ordem de preferência em caso de empate no valor liberado
+lenders = ["facta", "parana"]
+
+def quote_parana(cpf: str) -> dict:
+    parana = ParanaClient()
+    saldo_response = parana.with_token(lambda token: parana.fgts_saque_aniversario_saldo_disponivel(token, cpf))
+
+    if saldo_response.get("codigo") == "9":
+        return {"banco": "parana", "erro": True, "codigo": "9", "mensagem": saldo_response.get("mensagem")}
+
+    if not saldo_response.get("saldoTotal"):
+        return {"banco": "parana", "valorLiberado": None}
+
+    saldos_por_periodos = saldo_response.get("saldosPorPeriodos")
+    simulacao_response = parana.with_token(lambda token: parana.fgts_saque_aniversario_simulacao(token, cpf, saldos_por_periodos))
+
+    return {"banco": "parana", "bancoId": 254, "valorLiberado": simulacao_response.get("valorLiberado")}
+
+def quote_facta(cpf: str) -> dict:
+    facta = FactaClient()
+    saldo_facta = facta.with_token(lambda token: facta.fgts_saldo(cpf, token))
+    logger.debug("[SALDO FACTA]: %s", saldo_facta)
+
+    if saldo_facta.get("erro"):
+        return {"banco": "facta", "erro": True, "mensagem": saldo_facta.get("mensagem")}
+
+    retorno_normalizado, payload = _facta_calculo_payload(cpf, saldo_facta.get("retorno"))
+    response_calculo = facta.with_token(lambda token: facta.fgts_calculo(token, payload))
+    logger.debug("[RESPONSE_CALCULO]: %s", response_calculo)
+
+    return _facta_result(retorno_normalizado, response_calculo)
+
+def _facta_calculo_payload(cpf: str, retorno: dict):
+    retorno_normalizado = { key: ("0" if key.startswith("valor_") and float(value) < 5 else value) for key, value in retorno.items() }
+
+    payload = {
+        "cpf": cpf,
+        "taxa": "1.8",
+        "tabela": "60151",
+        "parcelas": []
+    }
+
+    for i in range(1, 11):
+        data = f"dataRepasse_{i}"
+        valor = f"valor_{i}"
+        data_val = retorno_normalizado.get(data)
+        valor_val = retorno_normalizado.get(valor)
+
+        if data_val is not None and valor_val is not None:
+            payload["parcelas"].append({data: data_val, valor: valor_val})
+
+    return retorno_normalizado, payload
+
+def _facta_result(retorno_normalizado: dict, response_calculo: dict) -> dict:
+    if response_calculo.get("permitido") == "NAO":
+        return {"banco": "facta", "permitido": "NAO", "valorLiberado": None}
+
+    valor_liberado = response_calculo.get("valor_liquido")
+
+    if valor_liberado is None:
+        return {"banco": "facta", "valorLiberado": None}
+
+    prazo = sum(1 for key, value in retorno_normalizado.items() if key.startswith("valor_") and float(value) > 5)
+
+    return {
+        "banco": "facta",
+        "bancoId": 935,
+        "valorLiberado": valor_liberado,
+        "prazo": prazo,
+        "taxa": "1.8",
+        "tabela": "60151" if valor_liberado < 100 else ("60119" if valor_liberado < 900 else "53694"),
+        "simulacao_fgts": response_calculo.get("simulacao_fgts")
+    }
+
+async def quote_parana_async(cpf: str) -> dict:
+    parana = AsyncParanaClient()
+    saldo_response = await parana.with_token(lambda token: parana.fgts_saque_aniversario_saldo_disponivel(token, cpf))
+
+    if saldo_response.get("codigo") == "9":
+        return {"banco": "parana", "erro": True, "codigo": "9", "mensagem": saldo_response.get("mensagem")}
+
+    if not saldo_response.get("saldoTotal"):
+        return {"banco": "parana", "valorLiberado": None}
+
+    saldos_por_periodos = saldo_response.get("saldosPorPeriodos")
+    simulacao_response = await parana.with_token(lambda token: parana.fgts_saque_aniversario_simulacao(token, cpf, saldos_por_periodos))
+
+    return {"banco": "parana", "bancoId": 254, "valorLiberado": simulacao_response.get("valorLiberado")}
+
+async def quote_facta_async(cpf: str) -> dict:
+    facta = AsyncFactaClient()
+    saldo_facta = await facta.with_token(lambda token: facta.fgts_saldo(cpf, token))
+
+    if saldo_facta.get("erro"):
+        return {"banco": "facta", "erro": True, "mensagem": saldo_facta.get("mensagem")}
+
+    retorno_normalizado, payload = _facta_calculo_payload(cpf, saldo_facta.get("retorno"))
+    response_calculo = await facta.with_token(lambda token: facta.fgts_calculo(token, payload))
+
+    return _facta_result(retorno_normalizado, response_calculo)
+
+pipelines = {
+    "facta": quote_facta,
+    "parana": quote_parana
+}
+
+async_pipelines = {
+    "facta": quote_facta_async,
+    "parana": quote_parana_async
+}
+
+# prazo das cotações: QUOTE_DEADLINE (ou o timeout pedido), sem passar do prazo da mensagem
+def _quote_timeout(timeout: float | None) -> float:
+    timeout = deadline if timeout is None else timeout
+    left = remaining()
+
+    return timeout if left is None else max(min(timeout, left), 0)
+
+# bancos com o circuito aberto (fora do ar) nem são consultados
+def available_lenders() -> list:
+    available = [lender for lender in lenders if not is_open(lender)]
+
+    for lender in set(lenders) - set(available):
+        logger.warning("Cotação %s pulada: circuito aberto", lender)
+
+    return available
+
+# dispara todos os bancos ao mesmo tempo; banco que falhar ou estourar o prazo fica de fora.
+# cada banco passa pelo cache de simulações (resultado por CPF, consultas iguais viram uma só)
+def run_quotes(cpf: str, timeout: float | None = None) -> dict:
+    if engine == "async":
+        return run_async(run_quotes_async(cpf, timeout))
+
+    timeout = _quote_timeout(timeout)
+
+    with budget(timeout):
+        futures = {submit(_executor, get_or_compute, lender, cpf, pipelines[lender]): lender for lender in available_lenders()}
+
+    done, not_done = wait(futures, timeout=timeout)
+    results = {}
+
+    # a thread de um banco atrasado não é interrompida, mas também não fica presa: tudo o
+    # que ela faz (HTTP, retries, fila do rate limit, espera por token) roda no budget(timeout)
+    # acima e desiste quando o prazo acaba, devolvendo o worker do _executor
+    for future in not_done:
+        logger.warning("Cotação %s descartada: não respondeu dentro do prazo", futures[future])
+
+    for future in done:
+        lender = futures[future]
+
+        try:
+            results[lender] = future.result()
+        except Exception as exception:
+            logger.exception("Erro na cotação %s: %s", lender, exception)
+
+    return results
+
+async def run_quotes_async(cpf: str, timeout: float | None = None) -> dict:
+    timeout = _quote_timeout(timeout)
+
+    with budget(timeout):
+        tasks = {asyncio.ensure_future(get_or_compute_async(lender, cpf, async_pipelines[lender])): lender for lender in available_lenders()}
+
+    if not tasks:
+        return {}
+
+    done, not_done = await asyncio.wait(tasks, timeout=timeout)
+    results = {}
+
+    for task in not_done:
+        task.cancel()
+        logger.warning("Cotação %s descartada: não respondeu dentro do prazo", tasks[task])
+
+    for task in done:
+        lender = tasks[task]
+
+        try:
+            results[lender] = task.result()
+        except Exception as exception:
+            logger.exception("Erro na cotação %s: %s", lender, exception)
+
+    return results
+
+# escolhe a cotação com maior valor liberado
+def best_quote(results: dict) -> dict | None:
+    best = None
+
+    for lender in lenders:
+        result = results.get(lender)
+
+        if not result or result.get("erro") or not result.get("valorLiberado"):
+            continue
+
+        if best is None or float(result["valorLiberado"]) > float(best["valorLiberado"]):
+            best = result
+
+    return best
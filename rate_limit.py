@@ -0,0 +1,123 @@
+import os, re, time, asyncio, logging
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from .budget import DeadlineExceeded, remaining
+from .metrics import observe
+from .redis_client import redis_token_bucket, redis_token_bucket_throttle
+
+# Limite de requisições por upstream e endpoint (caminho da URL), num token bucket no
+# Redis compartilhado por todos os workers e máquinas.
+#   RATE_LIMIT_<UPSTREAM>="<req/s>[:<rajada>]" vale para cada endpoint do upstream
+#   RATE_LIMIT_<UPSTREAM>_<ENDPOINT> sobrescreve um endpoint, ex.: RATE_LIMIT_FACTA_FGTS_SALDO="2:4"
+#   (vazio ou 0 = sem limite; Paraná e Facta têm limite por padrão)
+# Cada chamada reserva sua vez e espera por ela; se a espera passar do que resta do prazo
+# da mensagem (budget.py) ou, fora de um prazo, de RATE_LIMIT_MAX_WAIT segundos, falha na
+# hora com RateLimitExceeded. Um 429 bloqueia o endpoint para todos até passar o
+# Retry-After (ou RATE_LIMIT_BACKOFF segundos, se o upstream não mandar).
+defaults = {"parana": "10:20", "facta": "10:20"}
+max_wait = float(os.getenv("RATE_LIMIT_MAX_WAIT", 30))
+throttle_backoff = float(os.getenv("RATE_LIMIT_BACKOFF", 2))
+
+logger = logging.getLogger(__name__)
+
+_limits = {}
+
+class RateLimitExceeded(DeadlineExceeded):
+    pass
+
+def endpoint_of(url: str) -> str:
+    return urlsplit(str(url)).path or "/"
+
+def _parse(spec):
+    rate, _, burst = (spec or "").partition(":")
+
+    if not rate or float(rate) <= 0:
+        return None
+
+    return float(rate), float(burst) if burst else max(float(rate), 1.0)
+
+# (req/s, rajada) do endpoint, ou None se não tiver limite
+def limit_for(upstream: str, endpoint: str):
+    key = (upstream, endpoint)
+
+    if key not in _limits:
+        name = f"RATE_LIMIT_{upstream.upper()}"
+        spec = os.getenv(f"{name}_{re.sub(r'[^A-Z0-9]+', '_', endpoint.upper()).strip('_')}")
+        _limits[key] = _parse(spec if spec is not None else os.getenv(name, defaults.get(upstream)))
+
+    return _limits[key]
+
+def _key(upstream, endpoint):
+    return f"ratelimit:{upstream}:{endpoint}"
+
+def _reserve(key, limit, upstream, description) -> float:
+    left = remaining()
+    wait = redis_token_bucket(key, *limit, max_wait if left is None else max(left, 0))
+
+    if wait is None:
+        observe("chatbot_rate_limit_wait_seconds", 0, upstream=upstream, outcome="rejected")
+
+        raise RateLimitExceeded(f"Limite de requisições de {description}: a vez não chega dentro do prazo")
+
+    observe("chatbot_rate_limit_wait_seconds", wait, upstream=upstream, outcome="ok")
+
+    return wait
+
+# reserva a vez da chamada; devolve quantos segundos esperar por ela
+def reserve(upstream: str, endpoint: str) -> float:
+    limit = limit_for(upstream, endpoint)
+
+    if limit is None:
+        return 0.0
+
+    return _reserve(_key(upstream, endpoint), limit, upstream, f"{upstream} {endpoint}")
+
+def acquire(upstream: str, endpoint: str):
+    wait = reserve(upstream, endpoint)
+
+    if wait > 0:
+        time.sleep(wait)
+
+# vez numa cota única para todas as chamadas de `name`, somando os endpoints
+# (ex.: total de envios ao Digisac); mesma espera e mesmo RateLimitExceeded de acquire()
+def acquire_shared(name: str, rate: float, burst: float | None = None):
+    wait = _reserve(f"ratelimit:{name}", (rate, burst or max(rate, 1.0)), name, name)
+
+    if wait > 0:
+        time.sleep(wait)
+
+async def acquire_async(upstream: str, endpoint: str):
+    wait = reserve(upstream, endpoint)
+
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+# segundos do header Retry-After (número ou data HTTP), ou None
+def retry_after(headers) -> float | None:
+    value = headers.get("Retry-After")
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+# 429 do upstream: bloqueia o endpoint para todos os workers; devolve o bloqueio em segundos
+def throttled(upstream: str, endpoint: str, headers) -> float:
+    seconds = retry_after(headers)
+    seconds = throttle_backoff if seconds is None else seconds
+    limit = limit_for(upstream, endpoint)
+
+    if limit is not None:
+        redis_token_bucket_throttle(_key(upstream, endpoint), *limit, seconds)
+
+    logger.warning("429 de %s %s: novas chamadas aguardam %.1fs", upstream, endpoint, seconds)
+
+    return seconds
@@ -1,53 +1,623 @@
-import os
+import os, time, uuid, fnmatch, logging, threading
 import redis as redis_mod
+from .near_cache import LRUCache
 
-_memory_store = {}
+# Cliente Redis único do processo, com pool de conexões explícito.
+# Se o Redis estiver fora, as operações caem no _memory_store local (LRU com até
+# REDIS_MEMORY_STORE_SIZE chaves; as mais antigas saem quando enche).
+#
+# Near-cache: cópia local, por processo, das leituras que se repetem (LRU com até
+# NEAR_CACHE_SIZE entradas; 0 desliga). Vale para:
+#   - chaves com prefixo em NEAR_CACHE_PREFIXES (tokens, tabelas), por até NEAR_CACHE_TTL
+#     segundos e nunca além do TTL da chave; as gravações feitas por este módulo avisam
+#     todos os processos pelo canal NEAR_CACHE_CHANNEL (pub/sub) para descartar a cópia
+#   - hashes lidos com scope=fence (estado do contato dentro do contact_lock): enquanto o
+#     lease é nosso ninguém mais grava com fencing, então a cópia acompanha as nossas
+#     gravações e deixa de valer quando o lease muda
+max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+memory_store_size = int(os.getenv("REDIS_MEMORY_STORE_SIZE", 10000))
+near_cache_size = int(os.getenv("NEAR_CACHE_SIZE", 10000))
+near_cache_ttl = float(os.getenv("NEAR_CACHE_TTL", 60))
+near_cache_prefixes = tuple(prefix for prefix in os.getenv("NEAR_CACHE_PREFIXES", "token:,banks:,facta:combos:,media:").split(",") if prefix)
+near_cache_channel = os.getenv("NEAR_CACHE_CHANNEL", "near-cache:invalidate")
 
-import os
-import redis as redis_mod
+logger = logging.getLogger(__name__)
+
+_memory_store = LRUCache(memory_store_size)
+_near = LRUCache(max(near_cache_size, 1))
+_listener = None
+_listening = threading.Event()
+_listener_lock = threading.Lock()
+
+def _make_pool():
+    options = {
+        "decode_responses": True,
+        "max_connections": max_connections,
+        "socket_timeout": socket_timeout,
+        "socket_connect_timeout": socket_timeout,
+        "health_check_interval": 30
+    }
 
-def _make_redis():
     try:
         redis_url = os.getenv("REDIS_URL")
         if redis_url:
-            print(f"Conectando ao Redis via URL: {redis_url}")
-            # Desabilitar verificação SSL para evitar erro de certificado autoassinado
-            return redis_mod.from_url(redis_url, decode_responses=True, ssl_cert_reqs=None)
+            logger.info("Conectando ao Redis via URL")
+            if redis_url.startswith("rediss://"):
+                # Desabilitar verificação SSL para evitar erro de certificado autoassinado
+                options["ssl_cert_reqs"] = None
+            return redis_mod.ConnectionPool.from_url(redis_url, **options)
 
         # fallback local
         host = os.getenv("REDIS_HOST", "localhost")
         port = int(os.getenv("REDIS_PORT", 6379))
         db = int(os.getenv("REDIS_DB", 0))
-        print(f"Conectando ao Redis local: {host}:{port}, db={db}")
-        return redis_mod.StrictRedis(host=host, port=port, db=db, decode_responses=True)
+        logger.info(f"Conectando ao Redis local: {host}:{port}, db={db}")
+        return redis_mod.ConnectionPool(host=host, port=port, db=db, **options)
     except Exception as e:
-        print(f"Erro ao conectar ao Redis: {e}")
+        logger.error(f"Erro ao conectar ao Redis: {e}")
         return None
 
-_redis = _make_redis()
+pool = _make_pool()
+_redis = redis_mod.Redis(connection_pool=pool) if pool else None
+
+# libera o lock só se ele ainda for nosso (outro processo pode ter assumido depois de expirar)
+_release_script = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# grava no hash só se o lock (KEYS[2]) ainda estiver com o nosso token de fencing;
+# ARGV[3] > 0 renova a expiração do hash
+_fenced_hupdate_script = """
+if redis.call("get", KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+local n = tonumber(ARGV[2])
+if n > 0 then
+    redis.call("hset", KEYS[1], unpack(ARGV, 4, 3 + n * 2))
+end
+if #ARGV > 3 + n * 2 then
+    redis.call("hdel", KEYS[1], unpack(ARGV, 4 + n * 2, #ARGV))
+end
+if tonumber(ARGV[3]) > 0 and redis.call("exists", KEYS[1]) == 1 then
+    redis.call("expire", KEYS[1], ARGV[3])
+end
+return 1
+"""
+
+# tira o primeiro item da lista (KEYS[1]) só se o lock (KEYS[2]) ainda estiver com o nosso token
+_fenced_lpop_script = """
+if redis.call("get", KEYS[2]) ~= ARGV[1] then
+    return false
+end
+return redis.call("lpop", KEYS[1])
+"""
+
+# token bucket (rate_limit.py), com o relógio do Redis pra valer igual em todas as máquinas.
+# ARGV: taxa (tokens/s), rajada, "take" ou "throttle", e
+#   take: espera máxima (ms); reserva um token e devolve a espera até a vez dele (ms),
+#         ou -espera sem reservar nada se ela passar do máximo
+#   throttle: bloqueio (ms); o próximo token só sai depois dele (429 com Retry-After)
+# tokens negativos = tokens já reservados por quem está esperando
+_token_bucket_script = """
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local rate = tonumber(ARGV[1]) / 1000
+local burst = tonumber(ARGV[2])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = math.min(burst, (tonumber(state[1]) or burst) + (now - (tonumber(state[2]) or now)) * rate)
+local wait = 0
+if ARGV[3] == "throttle" then
+    tokens = math.min(tokens, 1 - tonumber(ARGV[4]) * rate)
+else
+    if tokens < 1 then
+        wait = math.ceil((1 - tokens) / rate)
+    end
+    if wait > tonumber(ARGV[4]) then
+        return -wait
+    end
+    tokens = tokens - 1
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil((burst - tokens) / rate) + 1000)
+return wait
+"""
+
+def _start_listener():
+    global _listener
+
+    if _listener is not None:
+        return
+
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, name="near-cache-invalidation", daemon=True)
+            _listener.start()
+
+# assina o canal de invalidação; sem assinatura (Redis caiu, reconectando) as chaves com
+# prefixo não usam o near-cache, e a cópia local é descartada a cada nova assinatura
+# porque as invalidações do intervalo se perderam
+def _listen():
+    while True:
+        client = _redis
+
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(near_cache_channel)
+            _near.clear()
+            _listening.set()
+
+            while client is _redis:
+                message = pubsub.get_message(timeout=1.0)
+
+                if message:
+                    _near.invalidate(message["data"])
+
+            _listening.clear()
+            pubsub.close()
+        except Exception as e:
+            _listening.clear()
+            _near.clear()
+            logger.warning(f"Near-cache sem invalidação pelo Redis: {e}")
+            time.sleep(1)
+
+def _cacheable(key):
+    if near_cache_size <= 0 or not _redis or not key.startswith(near_cache_prefixes):
+        return False
+
+    _start_listener()
 
-_redis = _make_redis()
+    return _listening.is_set()
+
+def _use_near(key, scope):
+    if scope is None:
+        return _cacheable(key)
+
+    if near_cache_size <= 0 or not _redis:
+        return False
+
+    # mesmo com o lease, as invalidações de gravações sem lease chegam pelo canal:
+    # sem a assinatura ativa a cópia local pode estar velha
+    _start_listener()
+
+    return _listening.is_set()
+
+# item (valor, expira_em, scope, completo) do near-cache, se ainda valer para o escopo
+def _near_get(key, scope=None):
+    item = _near.get(key)
+
+    if item is None or item[2] != scope or item[1] < time.time():
+        return None
+
+    return item
+
+# junta o que veio do Redis na cópia do hash; completo = veio de HGETALL
+def _near_merge(key, scope, values, complete, epoch):
+    item = _near_get(key, scope)
+
+    if not complete and item is not None:
+        values, complete = {**item[0], **values}, item[3]
+
+    _near.put(key, (values, time.time() + near_cache_ttl, scope, complete), epoch)
+
+# gravação com fencing que deu certo: a cópia do mesmo lease passa a ter os novos valores
+def _near_write(key, scope, mapping, delete_fields):
+    if near_cache_size <= 0:
+        return
+
+    item = _near_get(key, scope)
+    values, complete = (dict(item[0]), item[3]) if item else ({}, False)
+    values.update(mapping)
+    values.update(dict.fromkeys(delete_fields))
+    _near[key] = (values, time.time() + near_cache_ttl, scope, complete)
+
+# descarta a cópia local e, se a chave tem prefixo do near-cache, a dos outros processos
+def _invalidate(key):
+    if near_cache_size <= 0:
+        return
+
+    if key.startswith(near_cache_prefixes):
+        _near.invalidate(key)
+
+        try:
+            _redis.publish(near_cache_channel, key)
+        except Exception as e:
+            logger.error(f"Erro ao publicar invalidação do near-cache: {e}")
+    elif _near.get(key) is not None:
+        _near.invalidate(key)
+
+# GET com near-cache; na falta, GET + PTTL numa ida só pra cópia não passar do TTL da chave
+def _near_string(key):
+    item = _near_get(key)
+    _near.record(item is not None)
+
+    if item is not None:
+        return item[0]
+
+    epoch = _near.epoch
+    value, pttl = _redis.pipeline(transaction=False).get(key).pttl(key).execute()
+    expires_in = near_cache_ttl if pttl < 0 else min(near_cache_ttl, pttl / 1000)
+    _near.put(key, (value, time.time() + expires_in, None, True), epoch)
+
+    return value
+
+def cache_stats():
+    return {
+        "near_cache": dict(_near.stats(), maxsize=near_cache_size, listening=_listening.is_set()),
+        "memory_store": {stat: value for stat, value in _memory_store.stats().items() if stat in ("size", "maxsize", "evictions")}
+    }
+
+def _memory_get(key):
+    item = _memory_store.get(key)
+
+    if item is None:
+        return None
+
+    value, expires_at = item
+
+    if expires_at and expires_at < time.time():
+        _memory_store.pop(key, None)
+        return None
+
+    return value
+
+def _memory_hash(key):
+    value = _memory_get(key)
+
+    if not isinstance(value, dict):
+        value = {}
+        _memory_store[key] = (value, None)
+
+    return value
 
 def redis_get(key):
     if _redis:
         try:
-            value = _redis.get(key)
-            print(f"Redis GET: {key} => {value}")
+            value = _near_string(key) if _cacheable(key) else _redis.get(key)
+            logger.debug(f"Redis GET: {key}")
             return value
         except Exception as e:
-            print(f"Erro no redis_get: {e}")
-    value = _memory_store.get(key)
-    print(f"Memory GET: {key} => {value}")
+            logger.error(f"Erro no redis_get: {e}")
+    value = _memory_get(key)
+    logger.debug(f"Memory GET: {key}")
     return value
 
-def redis_set(key, value):
+# ex: expiração em segundos; nx: só grava se a chave ainda não existir
+def redis_set(key, value, ex=None, nx=False):
     if _redis:
         try:
-            result = _redis.set(key, value)
-            print(f"Redis SET: {key} => {value}, resultado: {result}")
+            result = _redis.set(key, value, ex=ex, nx=nx)
+            if result:
+                _invalidate(key)
+            logger.debug(f"Redis SET: {key}, resultado: {result}")
             return result
         except Exception as e:
-            print(f"Erro no redis_set: {e}")
-    _memory_store[key] = value
-    print(f"Memory SET: {key} => {value}")
+            logger.error(f"Erro no redis_set: {e}")
+    if nx and _memory_get(key) is not None:
+        return None
+    _memory_store[key] = (value, time.time() + ex if ex else None)
+    logger.debug(f"Memory SET: {key}")
     return True
+
+def redis_delete(key):
+    if _redis:
+        try:
+            result = _redis.delete(key)
+            _invalidate(key)
+            return result
+        except Exception as e:
+            logger.error(f"Erro no redis_delete: {e}")
+    return 1 if _memory_store.pop(key, None) is not None else 0
+
+def redis_exists(key):
+    if _redis:
+        try:
+            return bool(_redis.exists(key))
+        except Exception as e:
+            logger.error(f"Erro no redis_exists: {e}")
+    return _memory_get(key) is not None
+
+# lê só os campos pedidos de um hash
+# scope: fence do lease do contato, para usar o near-cache dentro do contact_lock
+def redis_hmget(key, fields, scope=None):
+    if _redis:
+        try:
+            near = _use_near(key, scope)
+            if near:
+                item = _near_get(key, scope)
+                hit = item is not None and (item[3] or all(field in item[0] for field in fields))
+                _near.record(hit)
+                if hit:
+                    return {field: item[0].get(field) for field in fields}
+                epoch = _near.epoch
+            values = dict(zip(fields, _redis.hmget(key, fields)))
+            logger.debug(f"Redis HMGET: {key} {fields}")
+            if near:
+                _near_merge(key, scope, values, False, epoch)
+            return values
+        except Exception as e:
+            logger.error(f"Erro no redis_hmget: {e}")
+    value = _memory_hash(key)
+    return {field: value.get(field) for field in fields}
+
+# lê vários hashes inteiros em uma única ida ao Redis
+def redis_hgetall_many(keys):
+    if _redis:
+        try:
+            pipe = _redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            values = pipe.execute()
+            logger.debug(f"Redis HGETALL: {keys}")
+            return dict(zip(keys, values))
+        except Exception as e:
+            logger.error(f"Erro no redis_hgetall_many: {e}")
+    return {key: dict(_memory_hash(key)) for key in keys}
+
+def redis_hgetall(key, scope=None):
+    if _redis and _use_near(key, scope):
+        try:
+            item = _near_get(key, scope)
+            _near.record(item is not None and item[3])
+            if item is not None and item[3]:
+                return {field: value for field, value in item[0].items() if value is not None}
+            epoch = _near.epoch
+            value = _redis.hgetall(key)
+            logger.debug(f"Redis HGETALL: {key}")
+            _near_merge(key, scope, value, True, epoch)
+            return dict(value)
+        except Exception as e:
+            logger.error(f"Erro no redis_hgetall: {e}")
+            return dict(_memory_hash(key))
+    return redis_hgetall_many([key])[key]
+
+# grava e remove campos de um hash em uma única ida ao Redis.
+# fence=(lock_key, token): só grava se o lock ainda for nosso; devolve False se não for
+# ex: renova a expiração do hash (segundos)
+def redis_hupdate(key, mapping, delete_fields=(), fence=None, ex=None):
+    if not mapping and not delete_fields:
+        return True
+    if _redis and fence:
+        try:
+            args = [fence[1], len(mapping), ex or 0]
+            for field, value in mapping.items():
+                args += [field, value]
+            args += list(delete_fields)
+            result = _redis.eval(_fenced_hupdate_script, 2, key, fence[0], *args)
+            if result:
+                _near_write(key, fence, mapping, delete_fields)
+            else:
+                _near.invalidate(key)
+            logger.debug(f"Redis HSET (fencing): {key} {list(mapping)}, resultado: {result}")
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Erro no redis_hupdate: {e}")
+    elif _redis:
+        try:
+            pipe = _redis.pipeline(transaction=False)
+            if mapping:
+                pipe.hset(key, mapping=mapping)
+            if delete_fields:
+                pipe.hdel(key, *delete_fields)
+            if ex:
+                pipe.expire(key, ex)
+            if near_cache_size > 0:
+                # gravação sem lease: a cópia de quem está com o lease também fica velha
+                pipe.publish(near_cache_channel, key)
+            pipe.execute()
+            _near.invalidate(key)
+            logger.debug(f"Redis HSET: {key} {list(mapping)}, HDEL: {list(delete_fields)}")
+            return True
+        except Exception as e:
+            logger.error(f"Erro no redis_hupdate: {e}")
+    if fence and _memory_get(fence[0]) != fence[1]:
+        return False
+    value = _memory_hash(key)
+    value.update(mapping)
+    for field in delete_fields:
+        value.pop(field, None)
+    if ex:
+        _memory_store[key] = (value, time.time() + ex)
+    logger.debug(f"Memory HSET: {key} {list(mapping)}")
+    return True
+
+def redis_expire(key, seconds):
+    if _redis:
+        try:
+            result = _redis.expire(key, seconds)
+            _invalidate(key)
+            return result
+        except Exception as e:
+            logger.error(f"Erro no redis_expire: {e}")
+    value = _memory_get(key)
+    if value is None:
+        return False
+    _memory_store[key] = (value, time.time() + seconds)
+    return True
+
+# segundos até cada chave expirar (-1 = sem expiração, -2 = não existe), numa ida só
+def redis_ttl_many(keys):
+    if _redis:
+        try:
+            pipe = _redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.ttl(key)
+            return dict(zip(keys, pipe.execute()))
+        except Exception as e:
+            logger.error(f"Erro no redis_ttl_many: {e}")
+    ttls = {}
+    for key in keys:
+        item = _memory_store.get(key) if _memory_get(key) is not None else None
+        ttls[key] = -2 if item is None else (int(item[1] - time.time()) if item[1] else -1)
+    return ttls
+
+# percorre as chaves que casam com o padrão sem travar o Redis (SCAN)
+def redis_scan(pattern, count=500):
+    if _redis:
+        try:
+            yield from _redis.scan_iter(match=pattern, count=count)
+            return
+        except Exception as e:
+            logger.error(f"Erro no redis_scan: {e}")
+    yield from [key for key in list(_memory_store) if fnmatch.fnmatchcase(key, pattern)]
+
+def redis_incr(key):
+    if _redis:
+        try:
+            return _redis.incr(key)
+        except Exception as e:
+            logger.error(f"Erro no redis_incr: {e}")
+    value = int(_memory_get(key) or 0) + 1
+    _memory_store[key] = (str(value), None)
+    return value
+
+# incrementa um contador dentro de um hash (estatísticas compartilhadas entre workers)
+def redis_hincrby(key, field, amount=1):
+    if _redis:
+        try:
+            return _redis.hincrby(key, field, amount)
+        except Exception as e:
+            logger.error(f"Erro no redis_hincrby: {e}")
+    value = _memory_hash(key)
+    value[field] = int(value.get(field) or 0) + amount
+    return value[field]
+
+# soma vários valores (podem ser fracionários) em campos de um hash, numa ida só ao Redis
+def redis_hincr_many(key, increments):
+    if not increments:
+        return
+    if _redis:
+        try:
+            pipe = _redis.pipeline(transaction=False)
+            for field, amount in increments.items():
+                pipe.hincrbyfloat(key, field, amount)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.error(f"Erro no redis_hincr_many: {e}")
+    value = _memory_hash(key)
+    for field, amount in increments.items():
+        value[field] = float(value.get(field) or 0) + amount
+
+# mesmo token bucket do script, no fallback em memória (vale só para este processo)
+def _memory_token_bucket(key, rate, burst, mode, limit):
+    now = time.time()
+    state = _memory_get(key) or {"tokens": burst, "ts": now}
+    tokens = min(burst, state["tokens"] + (now - state["ts"]) * rate)
+    wait = 0.0
+    if mode == "throttle":
+        tokens = min(tokens, 1 - limit * rate)
+    else:
+        wait = (1 - tokens) / rate if tokens < 1 else 0.0
+        if wait > limit:
+            return None
+        tokens -= 1
+    _memory_store[key] = ({"tokens": tokens, "ts": now}, now + (burst - tokens) / rate + 1)
+    return wait
+
+# reserva um token do bucket (rate tokens/s, até burst acumulados); devolve a espera em
+# segundos até a vez da chamada, ou None (sem reservar) se ela passar de max_wait
+def redis_token_bucket(key, rate, burst, max_wait):
+    if _redis:
+        try:
+            wait = _redis.eval(_token_bucket_script, 1, key, rate, burst, "take", int(max_wait * 1000))
+            return None if wait < 0 else wait / 1000
+        except Exception as e:
+            logger.error(f"Erro no redis_token_bucket: {e}")
+    return _memory_token_bucket(key, rate, burst, "take", max_wait)
+
+# bloqueia o bucket por `seconds` (o próximo token só sai depois disso)
+def redis_token_bucket_throttle(key, rate, burst, seconds):
+    if _redis:
+        try:
+            _redis.eval(_token_bucket_script, 1, key, rate, burst, "throttle", int(seconds * 1000))
+            return
+        except Exception as e:
+            logger.error(f"Erro no redis_token_bucket_throttle: {e}")
+    _memory_token_bucket(key, rate, burst, "throttle", seconds)
+
+# listas usadas como filas simples (ex.: dead-letter, eventos pendentes do contato)
+# ex: expiração em segundos da lista inteira, renovada a cada push
+def redis_list_push(key, value, ex=None):
+    if _redis:
+        try:
+            if not ex:
+                return _redis.rpush(key, value)
+            pipe = _redis.pipeline()
+            pipe.rpush(key, value)
+            pipe.expire(key, ex)
+            return pipe.execute()[0]
+        except Exception as e:
+            logger.error(f"Erro no redis_list_push: {e}")
+    value_list = _memory_get(key)
+    if not isinstance(value_list, list):
+        value_list = []
+    _memory_store[key] = (value_list, time.time() + ex if ex else None)
+    value_list.append(value)
+    return len(value_list)
+
+# fence: (lock_key, token); com ele o item só sai se o lock ainda for nosso
+def redis_list_pop(key, fence=None):
+    if _redis:
+        try:
+            if fence:
+                return _redis.eval(_fenced_lpop_script, 2, key, fence[0], fence[1])
+            return _redis.lpop(key)
+        except Exception as e:
+            logger.error(f"Erro no redis_list_pop: {e}")
+    if fence and _memory_get(fence[0]) != fence[1]:
+        return None
+    value_list = _memory_get(key)
+    return value_list.pop(0) if isinstance(value_list, list) and value_list else None
+
+# primeiro item da lista, sem tirar
+def redis_list_first(key):
+    if _redis:
+        try:
+            return _redis.lindex(key, 0)
+        except Exception as e:
+            logger.error(f"Erro no redis_list_first: {e}")
+    value_list = _memory_get(key)
+    return value_list[0] if isinstance(value_list, list) and value_list else None
+
+# remove a última ocorrência do valor
+def redis_list_remove(key, value):
+    if _redis:
+        try:
+            return _redis.lrem(key, -1, value)
+        except Exception as e:
+            logger.error(f"Erro no redis_list_remove: {e}")
+    value_list = _memory_get(key)
+    if not isinstance(value_list, list) or value not in value_list:
+        return 0
+    del value_list[len(value_list) - 1 - value_list[::-1].index(value)]
+    return 1
+
+def redis_list_len(key):
+    if _redis:
+        try:
+            return _redis.llen(key)
+        except Exception as e:
+            logger.error(f"Erro no redis_list_len: {e}")
+    value_list = _memory_get(key)
+    return len(value_list) if isinstance(value_list, list) else 0
+
+# lock distribuído simples; devolve o identificador do dono ou None se já estiver em uso
+def acquire_lock(key, ttl):
+    owner = uuid.uuid4().hex
+
+    return owner if redis_set(key, owner, ex=ttl, nx=True) else None
+
+def release_lock(key, owner):
+    if _redis:
+        try:
+            return _redis.eval(_release_script, 1, key, owner)
+        except Exception as e:
+            logger.error(f"Erro no release_lock: {e}")
+    if _memory_get(key) == owner:
+        _memory_store.pop(key, None)
+        return 1
+    return 0
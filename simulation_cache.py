@@ -0,0 +1,208 @@
+import os, re, json, time, asyncio, logging, threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from clients.budget import remaining
+from clients.redis_client import redis_get, redis_set, acquire_lock, release_lock
+
+# Cache das simulações FGTS por CPF e banco.
+#
+# O tempo de vida segue a regra de negócio:
+#   - sem saldo (valor liberado 0) / valor não permitido: até o próximo dia 20 (quando o saldo do FGTS é atualizado)
+#   - "Operação não permitida antes de <data>": até a data informada
+#   - simulação com valor: SIMULATION_CACHE_TTL segundos, sem passar da meia-noite (a data de cálculo muda)
+#   - demais erros (ex.: banco ainda não autorizado) e respostas sem valor liberado: não
+#     ficam em cache, só são compartilhados por alguns segundos com consultas idênticas
+#     que chegaram juntas
+#
+# Consultas simultâneas para o mesmo CPF e banco viram uma só, no processo e entre workers;
+# quem espera a consulta de outro não passa do prazo da mensagem (budget.py).
+positive_ttl = int(os.getenv("SIMULATION_CACHE_TTL", 3600))
+share_ttl = int(os.getenv("SIMULATION_SHARE_TTL", 5))
+fiduciaria_ttl = int(os.getenv("SIMULATION_FIDUCIARIA_TTL", 900))
+lock_ttl = 90
+wait_timeout = 60
+
+timezone = ZoneInfo("America/Sao_Paulo")
+
+logger = logging.getLogger(__name__)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_inflight_async = {}
+
+def _key(lender, cpf):
+    return f"simulacao:{lender}:{re.sub(r'\D', '', cpf)}"
+
+def _seconds_until(moment: datetime) -> int:
+    return max(int((moment - datetime.now(timezone)).total_seconds()), 0)
+
+def _next_balance_update() -> datetime:
+    now = datetime.now(timezone)
+    update = now.replace(day=20, hour=0, minute=0, second=0, microsecond=0)
+
+    if now >= update:
+        update = (update.replace(day=1) + timedelta(days=32)).replace(day=20)
+
+    return update
+
+def _end_of_day() -> datetime:
+    return datetime.now(timezone).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+# valor liberado como número, ou None se faltar ou não for numérico
+def _amount(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# quanto esperar pela consulta de outro worker: wait_timeout, limitado ao prazo da mensagem
+def _wait_limit() -> float:
+    left = remaining()
+
+    return wait_timeout if left is None else max(min(wait_timeout, left), 0)
+
+def ttl_for(result: dict) -> int:
+    mensagem = result.get("mensagem") or ""
+
+    if result.get("erro"):
+        if mensagem == "Cliente não possui saldo FGTS (101)":
+            return _seconds_until(_next_balance_update())
+
+        if "Operação não permitida antes de" in mensagem:
+            match = re.search(r"(\d{2}/\d{2}/\d{4})", mensagem)
+
+            if match:
+                return _seconds_until(datetime.strptime(match.group(1), "%d/%m/%Y").replace(tzinfo=timezone))
+
+        if mensagem.startswith("Existe uma Operação Fiduciária em andamento"):
+            return fiduciaria_ttl
+
+        return 0
+
+    amount = _amount(result.get("valorLiberado"))
+
+    if result.get("permitido") == "NAO" or amount == 0:
+        return _seconds_until(_next_balance_update())
+
+    # sem valor não dá pra saber se falta saldo ou se a consulta falhou no meio
+    if amount is None:
+        return 0
+
+    return min(positive_ttl, _seconds_until(_end_of_day()), _seconds_until(_next_balance_update()))
+
+def _read(key):
+    cached = redis_get(key)
+
+    return json.loads(cached) if cached else None
+
+def _store(key, result):
+    ttl = ttl_for(result) or share_ttl
+
+    # SIMULATION_SHARE_TTL=0: resultados não cacheáveis não são compartilhados
+    if ttl > 0:
+        redis_set(key, json.dumps(result), ex=ttl)
+
+def _compute(key, lender, cpf, compute):
+    lock_key = f"{key}:lock"
+    owner = acquire_lock(lock_key, lock_ttl)
+
+    if not owner:
+        # outro worker já está consultando esse CPF: espera o resultado dele
+        deadline = time.time() + _wait_limit()
+
+        while time.time() < deadline:
+            time.sleep(0.2)
+            cached = _read(key)
+
+            if cached is not None:
+                return cached
+
+            if not redis_get(lock_key):
+                break
+
+    try:
+        result = compute(cpf)
+        _store(key, result)
+
+        return result
+    finally:
+        if owner:
+            release_lock(lock_key, owner)
+
+def get_or_compute(lender: str, cpf: str, compute) -> dict:
+    key = _key(lender, cpf)
+    cached = _read(key)
+
+    if cached is not None:
+        logger.info("Simulação %s em cache para o CPF", lender)
+
+        return cached
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        return future.result(timeout=_wait_limit())
+
+    try:
+        result = _compute(key, lender, cpf, compute)
+        future.set_result(result)
+
+        return result
+    except Exception as exception:
+        future.set_exception(exception)
+
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+async def _compute_async(key, lender, cpf, compute):
+    lock_key = f"{key}:lock"
+    owner = acquire_lock(lock_key, lock_ttl)
+
+    if not owner:
+        deadline = time.time() + _wait_limit()
+
+        while time.time() < deadline:
+            await asyncio.sleep(0.2)
+            cached = _read(key)
+
+            if cached is not None:
+                return cached
+
+            if not redis_get(lock_key):
+                break
+
+    try:
+        result = await compute(cpf)
+        _store(key, result)
+
+        return result
+    finally:
+        if owner:
+            release_lock(lock_key, owner)
+
+# mesmo cache para corrotinas: compute é async e consultas iguais no mesmo loop viram uma task só
+async def get_or_compute_async(lender: str, cpf: str, compute) -> dict:
+    key = _key(lender, cpf)
+    cached = _read(key)
+
+    if cached is not None:
+        logger.info("Simulação %s em cache para o CPF", lender)
+
+        return cached
+
+    inflight_key = (asyncio.get_running_loop(), key)
+    task = _inflight_async.get(inflight_key)
+
+    if task is None:
+        task = _inflight_async[inflight_key] = asyncio.ensure_future(_compute_async(key, lender, cpf, compute))
+        task.add_done_callback(lambda _: _inflight_async.pop(inflight_key, None))
+
+    return await asyncio.shield(task)
@@ -0,0 +1,161 @@
+import os, sys, json, gzip, time, logging, argparse
+from datetime import datetime
+from .contact_lock import ContactBusyError, contact_lock, delete_fence
+from .redis_client import redis_delete, redis_expire, redis_hgetall, redis_hmget, redis_scan, redis_ttl_many
+from .state_store import contact_from_key, delete_state, finished_field, has_state, idle_ttl, key_pattern, read_state
+
+# Arquivamento dos estados de conversa (armazenamento frio).
+#
+# Tira do Redis, gravando antes em arquivos JSON Lines comprimidos em STATE_ARCHIVE_DIR
+# (um arquivo por dia e processo, prontos para subir num bucket), os estados:
+#   - de conversas encerradas (finish_state) sem mensagens há STATE_FINISHED_GRACE segundos
+#   - abandonados: a menos de STATE_ARCHIVE_MARGIN segundos de expirar pelo STATE_IDLE_TTL
+# Rodar periodicamente (cron ou agendador), com intervalo menor que a margem:
+#
+#   python -m clients.state_archive
+#   python -m clients.state_archive --legacy   # também arquiva os hashes "state:<id>" antigos
+#
+# Os estados mais antigos ainda, um JSON na chave "<contactId>" sem prefixo, não são
+# varridos (não dá para separá-los das outras chaves do Redis): eles são migrados para o
+# hash novo na primeira mensagem do contato e a partir daí expiram e são arquivados como os outros.
+archive_dir = os.getenv("STATE_ARCHIVE_DIR", "archive/state")
+finished_grace = int(os.getenv("STATE_FINISHED_GRACE", 86400))
+archive_margin = int(os.getenv("STATE_ARCHIVE_MARGIN", 6 * 3600))
+batch_size = 500
+
+logger = logging.getLogger(__name__)
+
+def archive_path() -> str:
+    return os.path.join(archive_dir, f"{datetime.now().strftime('%Y-%m-%d')}-{os.getpid()}.jsonl.gz")
+
+def _record(contact_id, reason, state) -> str:
+    return json.dumps({"contactId": contact_id, "reason": reason, "archived_at": time.time(), "state": state}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+# grava o estado lido por `read` no arquivo e apaga com `delete`, com o lock do contato
+# (o atendimento não grava nem migra o estado no meio); pula contatos em atendimento agora
+def _archive(contact_id, reason, archive, read, delete) -> bool:
+    try:
+        with contact_lock(contact_id, wait=0):
+            state = read()
+
+            if not state:
+                return False
+
+            archive.write(_record(contact_id, reason, state))
+            archive.flush()
+            delete()
+    except ContactBusyError:
+        logger.info("Contato %s em atendimento; arquivamento fica para a próxima rodada", contact_id)
+
+        return False
+
+    return True
+
+def archive_contact(contact_id, reason, archive) -> bool:
+    def delete():
+        delete_state(contact_id)
+        delete_fence(contact_id)
+
+    return _archive(contact_id, reason, archive, lambda: read_state(contact_id), delete)
+
+# valores do hash antigo eram JSON; um valor que não decodifica vai para o arquivo como está
+def _legacy_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+# hash "state:<id>" de antes do namespace
+def archive_legacy(key, archive) -> bool:
+    contact_id = key[len("state:"):]
+
+    def read():
+        return {field: _legacy_value(value) for field, value in redis_hgetall(key).items()}
+
+    def delete():
+        redis_delete(key)
+
+        # o contador de fencing só é do hash antigo se o contato não tiver estado novo
+        if not has_state(contact_id):
+            delete_fence(contact_id)
+
+    return _archive(contact_id, "legacy", archive, read, delete)
+
+def _batches(pattern):
+    batch = []
+
+    for key in redis_scan(pattern):
+        batch.append(key)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+# motivo para arquivar o estado (ou None se ele continua no Redis)
+def _reason(key, ttl) -> str | None:
+    if ttl == -1:
+        # sem expiração (gravado antes do TTL existir): passa a expirar a partir de agora
+        redis_expire(key, idle_ttl)
+
+        return None
+
+    if ttl < 0:
+        return None
+
+    idle = idle_ttl - ttl
+
+    if idle >= idle_ttl - archive_margin:
+        return "idle"
+
+    if idle >= finished_grace and redis_hmget(key, [finished_field])[finished_field] is not None:
+        return "finished"
+
+    return None
+
+def sweep(legacy=False) -> dict:
+    counts = {"scanned": 0, "idle": 0, "finished": 0, "legacy": 0, "skipped": 0}
+    os.makedirs(archive_dir, exist_ok=True)
+
+    with gzip.open(archive_path(), "at", encoding="utf-8") as archive:
+        for batch in _batches(key_pattern()):
+            counts["scanned"] += len(batch)
+
+            for key, ttl in redis_ttl_many(batch).items():
+                reason = _reason(key, ttl)
+
+                if reason is None:
+                    continue
+
+                if archive_contact(contact_from_key(key), reason, archive):
+                    counts[reason] += 1
+                else:
+                    counts["skipped"] += 1
+
+        if legacy:
+            # hashes "state:<id>" de antes do namespace, que nunca mais foram lidos
+            for batch in _batches("state:*"):
+                for key in batch:
+                    if archive_legacy(key, archive):
+                        counts["legacy"] += 1
+                    else:
+                        counts["skipped"] += 1
+
+    logger.info("Arquivamento de estados: %s", counts)
+
+    return counts
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m clients.state_archive", description="Arquiva estados de conversa encerrados ou abandonados.")
+    parser.add_argument("--legacy", action="store_true", help="também arquiva os hashes state:<id> de antes do namespace")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(sweep(legacy=args.legacy)))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os, json, time, zlib, base64, logging
+from .contact_lock import StaleLeaseError, current_fence
+from .redis_client import redis_get, redis_delete, redis_exists, redis_hmget, redis_hgetall, redis_hgetall_many, redis_hupdate
+
+# Estado de cada contato guardado como hash no Redis (um campo por chave do estado,
+# valor em JSON), pra que cada handler leia e grave só os campos que usa.
+# Dentro de contact_lock as gravações usam o token de fencing do lock e as leituras
+# passam pelo near-cache do redis_client (load_state + get_fields da mesma mensagem
+# leem o Redis uma vez só).
+#
+# Ciclo de vida:
+#   - chave "<STATE_NAMESPACE>:state:<contactId>", que expira depois de STATE_IDLE_TTL
+#     segundos sem gravação (cada gravação renova o prazo)
+#   - conversa encerrada (proposta cadastrada) é marcada com finish_state() e arquivada
+#     pelo state_archive.py depois de STATE_FINISHED_GRACE; transferida para atendente
+#     não conta como encerrada (segue o prazo de STATE_IDLE_TTL)
+#   - campos grandes (ex.: perfil_newcorban) a partir de STATE_COMPRESS_MIN bytes são
+#     gravados comprimidos (zlib + base64, prefixo "z:"), o resto em JSON compacto
+#   - campos registrados com detach_field() só são lidos por get_fields(): load_state não
+#     os decodifica e save_state não os regrava a cada mensagem
+namespace = os.getenv("STATE_NAMESPACE", "chatbot")
+idle_ttl = int(os.getenv("STATE_IDLE_TTL", 7 * 86400))
+compress_min = int(os.getenv("STATE_COMPRESS_MIN", 512))
+finished_field = "encerrada_em"
+
+logger = logging.getLogger(__name__)
+
+_compressed = "z:"
+_detached = set()
+
+class ContactState(dict):
+    """Estado do contato; lembra os valores lidos do Redis (em JSON) pra gravar só o que mudou."""
+
+    def __init__(self, contact_id, values=None, loaded=None):
+        super().__init__(values or {})
+        self.contact_id = contact_id
+        self.loaded = dict(loaded or {})
+
+def _key(contact_id):
+    return f"{namespace}:state:{contact_id}"
+
+def key_pattern():
+    return f"{namespace}:state:*"
+
+def contact_from_key(key):
+    return key[len(_key("")):]
+
+def detach_field(field):
+    _detached.add(field)
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+# JSON -> valor gravado no Redis (comprimido se for grande)
+def _pack(text):
+    if len(text) < compress_min:
+        return text
+
+    return _compressed + base64.b64encode(zlib.compress(text.encode(), 6)).decode()
+
+# valor gravado no Redis -> JSON
+def _unpack(raw):
+    if raw is None or not raw.startswith(_compressed):
+        return raw
+
+    return zlib.decompress(base64.b64decode(raw[len(_compressed):])).decode()
+
+def _write(contact_id, texts, delete_fields=()):
+    mapping = {field: _pack(text) for field, text in texts.items()}
+
+    if not redis_hupdate(_key(contact_id), mapping, delete_fields, fence=current_fence(contact_id), ex=idle_ttl):
+        raise StaleLeaseError(f"Lock do contato {contact_id} expirou; estado não gravado")
+
+def _decode(value):
+    return json.loads(value) if value is not None else None
+
+def _from_hash(contact_id, raw):
+    texts = {field: _unpack(value) for field, value in raw.items() if field not in _detached}
+
+    return ContactState(contact_id, {field: _decode(text) for field, text in texts.items()}, texts)
+
+# estados antigos: hash "state:<contactId>" (sem namespace) ou, antes disso, um JSON
+# único na chave contactId; migra na primeira leitura de um contato sem o hash novo
+def _migrate_legacy(contact_id):
+    legacy_key = f"state:{contact_id}"
+    texts = redis_hgetall(legacy_key)
+
+    if texts:
+        legacy_key_type = "hash"
+    else:
+        legacy = redis_get(contact_id)
+
+        if not legacy:
+            return None
+
+        try:
+            texts = {field: _encode(value) for field, value in json.loads(legacy).items()}
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+        legacy_key, legacy_key_type = contact_id, "JSON"
+
+    _write(contact_id, texts)
+    redis_delete(legacy_key)
+    logger.info("Estado do contato %s migrado (%s) para %s", contact_id, legacy_key_type, _key(contact_id))
+
+    return _from_hash(contact_id, texts)
+
+def load_state(contact_id) -> ContactState:
+    raw = redis_hgetall(_key(contact_id), scope=current_fence(contact_id))
+
+    if not raw:
+        return _migrate_legacy(contact_id) or ContactState(contact_id)
+
+    return _from_hash(contact_id, raw)
+
+# vários contatos em uma única ida ao Redis
+def load_states(contact_ids) -> dict:
+    raws = redis_hgetall_many([_key(contact_id) for contact_id in contact_ids])
+
+    return {contact_id: _from_hash(contact_id, raws[_key(contact_id)]) for contact_id in contact_ids}
+
+def get_fields(contact_id, *fields) -> dict:
+    raw = redis_hmget(_key(contact_id), list(fields), scope=current_fence(contact_id))
+
+    # campos vazios num hash que já existe são só campos ainda não gravados
+    if not any(value is not None for value in raw.values()) and not redis_exists(_key(contact_id)):
+        state = _migrate_legacy(contact_id)
+
+        if state is not None:
+            return {field: state.get(field) for field in fields}
+
+    return {field: _decode(_unpack(value)) for field, value in raw.items()}
+
+def update_fields(contact_id, **fields):
+    _write(contact_id, {field: _encode(value) for field, value in fields.items()})
+
+def delete_fields(contact_id, *fields):
+    _write(contact_id, {}, fields)
+
+# grava só os campos alterados desde a leitura (ou todos, se o estado não veio de load_state)
+def save_state(contact_id, state: dict):
+    loaded = state.loaded if isinstance(state, ContactState) else {}
+    encoded = {field: _encode(value) for field, value in state.items()}
+    changed = {field: value for field, value in encoded.items() if loaded.get(field) != value}
+    removed = [field for field in loaded if field not in encoded]
+
+    _write(contact_id, changed, removed)
+
+    if isinstance(state, ContactState):
+        state.loaded = encoded
+
+# conversa encerrada: vai para o arquivo se ficar STATE_FINISHED_GRACE segundos sem mensagens
+def finish_state(contact_id):
+    update_fields(contact_id, **{finished_field: time.time()})
+
+# estado completo, inclusive os campos destacados (ex.: para arquivar)
+def read_state(contact_id) -> dict:
+    return {field: _decode(_unpack(value)) for field, value in redis_hgetall(_key(contact_id)).items()}
+
+def delete_state(contact_id):
+    return redis_delete(_key(contact_id))
+
+def has_state(contact_id) -> bool:
+    return redis_exists(_key(contact_id))
@@ -0,0 +1,173 @@
+import os, time, zlib, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from clients.metrics import register_gauge
+
+# Fila de processamento em segundo plano
+#
+# QUEUE_BACKEND define onde as tarefas rodam:
+#   - "celery": workers Celery (produção), iniciar com `celery -A app.celery_app worker`
+#   - "local": thread pool dentro do próprio processo
+#   - "eager": executa na hora, na mesma thread (útil em testes)
+#
+# Tarefas enfileiradas com key (ex.: contactId) caem sempre na mesma partição:
+#   - local: QUEUE_WORKERS executores de uma thread cada, escolhidos pela key
+#   - celery: com QUEUE_PARTITIONS > 1 a tarefa vai para a fila "<QUEUE_NAME>.<n>"
+#     (ex.: `celery -A app.celery_app worker -Q chatbot.0`).
+# A fila em si não garante a ordem de uma key: com QUEUE_PARTITIONS=1, concurrency > 1
+# ou depois de um RetryLater as tarefas podem rodar fora de ordem. A ordem dos eventos
+# de um contato vem da lista pendente do contato (clients/contact_lock.py); a partição
+# só evita que tarefas do mesmo contato disputem o lock.
+#
+# Uma tarefa que levanta RetryLater (ex.: contato ocupado por outro worker) volta para a
+# fila depois de `countdown` segundos, até QUEUE_RETRY_LIMIT vezes, em vez de prender o
+# worker esperando. No Celery vai para o fim da mesma fila (self.retry); local, para o fim
+# da mesma partição.
+backend = os.getenv("QUEUE_BACKEND", "celery")
+workers = int(os.getenv("QUEUE_WORKERS", 8))
+partitions = int(os.getenv("QUEUE_PARTITIONS", 1))
+queue_name = os.getenv("QUEUE_NAME", "chatbot")
+retry_limit = int(os.getenv("QUEUE_RETRY_LIMIT", 40))
+retry_countdown = float(os.getenv("QUEUE_RETRY_COUNTDOWN", 5))
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+_executor = None
+_partitions = None
+celery_app = None
+broker_url = None
+_broker_redis = None
+
+class RetryLater(Exception):
+    """A tarefa não pode rodar agora: volta para a fila depois de `countdown` segundos."""
+
+    def __init__(self, message="", countdown=None):
+        super().__init__(message)
+        self.countdown = retry_countdown if countdown is None else countdown
+
+if backend == "celery":
+    from celery import Celery
+
+    broker_url = os.getenv("CELERY_BROKER_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379/0"
+    celery_app = Celery("devchatbot", broker=broker_url)
+    celery_app.conf.update(
+        task_serializer="json",
+        accept_content=["json"],
+        task_ignore_result=True,
+        # só confirma a mensagem depois de processada, pra não perder evento se o worker cair
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+        task_default_queue=queue_name
+    )
+
+# registra a função como tarefa da fila
+def task(fn):
+    name = fn.__name__
+    _tasks[name] = _celery_task(fn) if celery_app else fn
+
+    return fn
+
+# com acks_late, uma tarefa que falha é confirmada e a mensagem se perde: RetryLater
+# republica a mensagem com self.retry() em vez de falhar
+def _celery_task(fn):
+    def run(self, *args):
+        try:
+            return fn(*args)
+        except RetryLater as exception:
+            raise self.retry(countdown=exception.countdown, exc=exception)
+
+    return celery_app.task(name=fn.__name__, bind=True, max_retries=retry_limit)(run)
+
+def _run(fn, args, key=None, attempt=0):
+    try:
+        fn(*args)
+    except RetryLater as exception:
+        if attempt >= retry_limit:
+            logger.error("Tarefa %s descartada depois de %s tentativas: %s", fn.__name__, attempt + 1, exception)
+
+            return
+
+        if backend == "eager":
+            time.sleep(exception.countdown)
+            _run(fn, args, key, attempt + 1)
+
+            return
+
+        # não ocupa a partição esperando: volta para ela depois do countdown
+        threading.Timer(exception.countdown, _submit, args=(fn, args, key, attempt + 1)).start()
+    except Exception as exception:
+        logger.exception("Erro ao processar tarefa %s: %s", fn.__name__, exception)
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="queue")
+
+    return _executor
+
+def _get_partition(index):
+    global _partitions
+
+    if _partitions is None:
+        _partitions = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"queue-{i}") for i in range(workers)]
+
+    return _partitions[index]
+
+def _submit(fn, args, key, attempt=0):
+    if key is not None:
+        _get_partition(partition_for(key, workers)).submit(_run, fn, args, key, attempt)
+    else:
+        _get_executor().submit(_run, fn, args, key, attempt)
+
+# partição estável entre processos (hash() do Python muda a cada execução)
+def partition_for(key, count):
+    return zlib.crc32(str(key).encode()) % count
+
+# coloca a tarefa na fila e retorna sem esperar o processamento
+def enqueue(fn, *args, key=None):
+    name = fn.__name__
+
+    if name not in _tasks:
+        raise ValueError(f"Tarefa '{name}' não registrada na fila.")
+
+    if backend == "celery":
+        if key is not None and partitions > 1:
+            _tasks[name].apply_async(args=args, queue=f"{queue_name}.{partition_for(key, partitions)}")
+        else:
+            _tasks[name].delay(*args)
+    elif backend == "eager":
+        _run(fn, args)
+    else:
+        _submit(fn, args, key)
+
+def _broker():
+    global _broker_redis
+
+    if _broker_redis is None:
+        import redis
+
+        _broker_redis = redis.Redis.from_url(broker_url)
+
+    return _broker_redis
+
+# tarefas aguardando na fila: no Celery (broker Redis) o tamanho das listas das filas;
+# local, as tarefas ainda não iniciadas nos executores deste processo
+def queue_depth() -> int | None:
+    if backend == "celery":
+        if not broker_url.startswith(("redis://", "rediss://")):
+            return None
+
+        names = [f"{queue_name}.{i}" for i in range(partitions)] if partitions > 1 else [queue_name]
+        pipe = _broker().pipeline(transaction=False)
+
+        for name in names:
+            pipe.llen(name)
+
+        return sum(pipe.execute())
+
+    executors = (_partitions or []) + ([_executor] if _executor else [])
+
+    return sum(executor._work_queue.qsize() for executor in executors)
+
+register_gauge("chatbot_queue_depth", "Tarefas aguardando na fila de processamento", queue_depth)
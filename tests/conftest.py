@@ -0,0 +1,43 @@
+import os, sys, types
+from pathlib import Path
+import pytest
+
+# Os módulos ficam na raiz do repositório, mas são importados como clients.<módulo> e
+# services.<módulo> (layout do deploy): os dois pacotes apontam para a raiz.
+root = Path(__file__).resolve().parent.parent
+
+for name in ("clients", "services"):
+    package = sys.modules.setdefault(name, types.ModuleType(name))
+    package.__path__ = [str(root)]
+
+# configuração lida na importação dos módulos: fila local, envios rápidos, sem espera longa
+defaults = {
+    "QUEUE_BACKEND": "local",
+    "QUEUE_WORKERS": "4",
+    "QUEUE_RETRY_COUNTDOWN": "0.05",
+    "DISPATCH_MODE": "async",
+    "DISPATCH_WORKERS": "4",
+    "DISPATCH_BACKOFF": "0.01",
+    "DISPATCH_MAX_ATTEMPTS": "3",
+    "DIGISAC_RATE_LIMIT": "1000",
+    "CONTACT_LOCK_WAIT": "0.2",
+    "METRICS_FLUSH_INTERVAL": "3600",
+    "REDIS_SOCKET_TIMEOUT": "0.1"
+}
+
+for key, value in defaults.items():
+    os.environ.setdefault(key, value)
+
+# cada teste com um Redis novo em memória (fakeredis[lua], pelos scripts do token bucket);
+# o último fica no lugar até o fim, para as threads e o flush de métricas no atexit
+@pytest.fixture(autouse=True)
+def fake_redis():
+    import fakeredis
+    from clients import redis_client
+
+    client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client._redis = client
+    redis_client._memory_store.clear()
+    redis_client._near.clear()
+
+    yield client
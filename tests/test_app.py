@@ -0,0 +1,109 @@
+import time, threading
+import pytest
+import requests
+import app
+from clients import contact_lock
+from clients.budget import DeadlineExceeded
+from clients.circuit_breaker import CircuitOpenError
+from clients.rate_limit import RateLimitExceeded
+from clients.state_store import finished_field, get_fields, update_fields
+from services import task_queue
+from services.dedup import first_delivery
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+def event(message_id, text, contact_id="c1"):
+    return {"event": "message.created", "data": {"id": message_id, "contactId": contact_id, "text": text, "data": {"number": "5511999999999"}}}
+
+@pytest.fixture
+def handled(monkeypatch):
+    handled = []
+    lock = threading.Lock()
+
+    def handle_event(payload):
+        with lock:
+            handled.append(payload["data"]["text"])
+
+    monkeypatch.setattr(app, "handle_event", handle_event)
+
+    return handled
+
+def test_events_of_a_busy_contact_run_in_arrival_order(fake_redis, handled, monkeypatch):
+    # o primeiro evento desiste do lock na hora e só volta depois que o segundo já chegou
+    monkeypatch.setattr(contact_lock, "wait_timeout", 0)
+    monkeypatch.setattr(task_queue, "retry_countdown", 0.5)
+    fake_redis.set("lock:contact:c1", "outro worker", ex=60)
+
+    assert app.accept_event(event("m1", "primeira")) == 200
+    time.sleep(0.2)
+    assert handled == []
+
+    fake_redis.delete("lock:contact:c1")
+
+    assert app.accept_event(event("m2", "segunda")) == 200
+    assert wait_for(lambda: len(handled) == 2)
+
+    # a retentativa do primeiro evento encontra a lista vazia
+    time.sleep(0.6)
+
+    assert handled == ["primeira", "segunda"]
+    assert not fake_redis.exists("pending:contact:c1")
+
+def test_failed_event_does_not_hold_up_the_next_one(monkeypatch):
+    handled = []
+
+    def handle_event(payload):
+        handled.append(payload["data"]["text"])
+
+        if payload["data"]["text"] == "primeira":
+            raise RuntimeError("erro no atendimento")
+
+    monkeypatch.setattr(app, "handle_event", handle_event)
+
+    app.accept_event(event("m1", "primeira"))
+    app.accept_event(event("m2", "segunda"))
+
+    assert wait_for(lambda: len(handled) == 2)
+    assert handled == ["primeira", "segunda"]
+
+def test_event_is_dropped_when_the_queue_is_down(fake_redis, monkeypatch):
+    def enqueue(*args, **kwargs):
+        raise ConnectionError("broker fora do ar")
+
+    monkeypatch.setattr(app, "enqueue", enqueue)
+
+    with pytest.raises(ConnectionError):
+        app.accept_event(event("m1", "primeira"))
+
+    assert not fake_redis.exists("pending:contact:c1")
+    # a reentrega do Digisac é aceita de novo
+    assert first_delivery("message.created", "m1")
+
+def test_transfer_to_an_attendant_does_not_finish_the_conversation(monkeypatch):
+    monkeypatch.setattr(app, "dispatch", lambda *args, **kwargs: None)
+    update_fields("c1", state="NOVO")
+
+    app.transfer_call("c1")
+
+    assert get_fields("c1", finished_field) == {finished_field: None}
+
+@pytest.mark.parametrize("error", [CircuitOpenError("Circuito facta aberto"), DeadlineExceeded("Prazo da mensagem esgotado"), RateLimitExceeded("fila do facta"), requests.ConnectionError("sem rede")])
+def test_customer_is_told_to_try_again_when_an_upstream_is_down(monkeypatch, error):
+    sent = []
+
+    def handle_event(payload):
+        raise error
+
+    monkeypatch.setattr(app, "handle_event", handle_event)
+    monkeypatch.setattr(app, "send_message", lambda message, contact_id, number, **kwargs: sent.append((message, contact_id, number)))
+
+    app.accept_event(event("m1", "primeira"))
+
+    assert wait_for(lambda: sent)
+    assert sent == [(app.unavailable_message, "c1", "5511999999999")]
@@ -0,0 +1,40 @@
+import json
+import pytest
+from services import banks
+from services.banks import bank_name, resolve_bank
+
+@pytest.fixture
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(banks, "_overlay_loaded", False)
+    banks._load()
+
+    yield
+
+    banks._load()
+
+def test_bundled_file_loads_without_touching_redis(fresh_index, monkeypatch):
+    reads = []
+    monkeypatch.setattr(banks, "redis_get", lambda key: reads.append(key))
+
+    banks._load()
+
+    assert reads == []
+    assert not banks._overlay_loaded
+    assert bank_name(341) is not None
+
+def test_redis_overlay_is_read_once_on_first_lookup(fresh_index, fake_redis, monkeypatch):
+    fake_redis.set("banks:index", json.dumps({"999": "Banco Novo S.A."}))
+    reads = []
+    redis_get = banks.redis_get
+    monkeypatch.setattr(banks, "redis_get", lambda key: reads.append(key) or redis_get(key))
+
+    assert resolve_bank("999") == 999
+    assert resolve_bank("banco novo s.a.") == 999
+    assert bank_name("999") == "Banco Novo S.A."
+    assert reads == ["banks:index"]
+
+def test_aliases_and_codes():
+    assert resolve_bank("nubank") == 260
+    assert resolve_bank("Banco Itaú") == 341
+    assert resolve_bank("0341") == 341
+    assert resolve_bank("banco que não existe") is None
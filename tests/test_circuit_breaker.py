@@ -0,0 +1,135 @@
+import time, asyncio
+import httpx
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from clients import circuit_breaker, http_pool
+from clients.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+def open_breaker(breaker):
+    breaker.failures = breaker.failures_threshold
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("teste", failures_threshold=3, reset_timeout=30)
+
+    for _ in range(3):
+        breaker.before()
+        breaker.record(False)
+
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker("teste", failures_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+
+    breaker.before()
+
+    assert breaker.state == "half_open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker("teste", failures_threshold=5, reset_timeout=30)
+    open_breaker(breaker)
+    breaker.before()
+    breaker.record(False)
+
+    assert breaker.state == "open"
+    assert breaker.retry_in() > 0
+
+    open_breaker(breaker)
+    breaker.before()
+    breaker.record(True)
+
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+def test_inconclusive_probe_releases_half_open():
+    breaker = CircuitBreaker("teste", failures_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    breaker.before()
+    breaker.record(None)
+
+    # a próxima chamada vira a nova chamada de teste
+    breaker.before()
+
+    assert breaker.probing
+
+def test_sync_send_releases_probe_on_unexpected_error(monkeypatch):
+    breaker = get_breaker("brasilapi")
+    open_breaker(breaker)
+
+    def explode(self, request, **kwargs):
+        raise RuntimeError("erro fora do requests")
+
+    monkeypatch.setattr(HTTPAdapter, "send", explode)
+    session = requests.Session()
+    session.mount("http://", http_pool.UpstreamAdapter("brasilapi"))
+
+    with pytest.raises(RuntimeError):
+        session.get("http://upstream.test/cep")
+
+    assert not breaker.probing
+    breaker.before()
+    breaker.record(True)
+
+def test_async_request_releases_probe_when_cancelled(monkeypatch):
+    breaker = get_breaker("brasilapi")
+    open_breaker(breaker)
+    started = asyncio.Event()
+
+    async def slow(request):
+        started.set()
+        await asyncio.sleep(10)
+
+        return httpx.Response(200)
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        monkeypatch.setattr(http_pool, "get_async_client", lambda name: client)
+        task = asyncio.create_task(http_pool.async_request("brasilapi", "GET", "http://upstream.test/cep"))
+        await asyncio.wait_for(started.wait(), 5)
+
+        assert breaker.probing
+
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+    assert not breaker.probing
+    breaker.before()
+    breaker.record(True)
+
+    assert breaker.state == "closed"
+
+def test_clients_log_an_open_circuit_like_any_upstream_error(monkeypatch, caplog):
+    from clients.api_facta import FactaClient
+
+    monkeypatch.setenv("CREDENCIAIS_FACTA", "usuario:senha")
+    breaker = get_breaker("facta")
+    open_breaker(breaker)
+    breaker.opened_at = time.monotonic()
+
+    with pytest.raises(CircuitOpenError):
+        FactaClient().fgts_saldo("12345678909", "token")
+
+    assert "Erro ao consultar saldo FGTS" in caplog.text
+
+    # a sessão da Facta (e o disjuntor dela) fica em cache no processo: fecha de novo
+    open_breaker(breaker)
+    breaker.before()
+    breaker.record(True)
@@ -0,0 +1,59 @@
+import pytest
+from clients.contact_lock import ContactBusyError, StaleLeaseError, contact_lock, current_fence, done_pending, next_pending, push_pending
+from clients.state_store import get_fields, update_fields
+
+def test_second_holder_gives_up_when_busy():
+    with contact_lock("c1"):
+        with pytest.raises(ContactBusyError):
+            with contact_lock("c1", wait=0):
+                pass
+
+    with contact_lock("c1", wait=0):
+        pass
+
+def test_each_lease_gets_a_higher_fence_token():
+    with contact_lock("c1") as first:
+        assert current_fence("c1") == ("lock:contact:c1", first)
+        assert current_fence("c2") is None
+
+    with contact_lock("c1") as second:
+        assert int(second) > int(first)
+
+    assert current_fence("c1") is None
+
+def test_expired_lease_cannot_write_state(fake_redis):
+    with contact_lock("c1"):
+        update_fields("c1", state="NOVO")
+
+        # o lease venceu e outro worker assumiu o contato
+        fake_redis.set("lock:contact:c1", "outro")
+
+        with pytest.raises(StaleLeaseError):
+            update_fields("c1", state="ANTECIPAR_FGTS")
+
+    assert get_fields("c1", "state") == {"state": "NOVO"}
+    # a saída do lock vencido não libera o lock de quem assumiu
+    assert fake_redis.get("lock:contact:c1") == "outro"
+
+def test_pending_events_leave_the_list_only_when_done():
+    push_pending("c1", {"n": 1})
+    push_pending("c1", {"n": 2})
+
+    with contact_lock("c1"):
+        assert next_pending("c1") == {"n": 1}
+        assert next_pending("c1") == {"n": 1}
+
+        done_pending("c1")
+
+        assert next_pending("c1") == {"n": 2}
+
+def test_expired_lease_leaves_the_event_for_the_new_holder(fake_redis):
+    push_pending("c1", {"n": 1})
+
+    with contact_lock("c1"):
+        fake_redis.set("lock:contact:c1", "outro")
+
+        with pytest.raises(StaleLeaseError):
+            done_pending("c1")
+
+    assert fake_redis.lrange("pending:contact:c1", 0, -1) == ['{"n": 1}']
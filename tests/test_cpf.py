@@ -0,0 +1,74 @@
+import random
+import numpy as np
+from services.cpf import check_digit, normalize_cpf, normalize_cpfs, validate_cpf, validate_cpfs, weights_1, weights_2
+
+def random_cpf(rng) -> str:
+    digits = [rng.randint(0, 9) for _ in range(9)]
+    digits.append(check_digit(sum(digit * weight for digit, weight in zip(digits, weights_1))))
+    digits.append(check_digit(sum(digit * weight for digit, weight in zip(digits, weights_2))))
+
+    return "".join(map(str, digits))
+
+# CPFs como chegam nas listas de campanha: com e sem máscara, dígito errado, zeros perdidos, lixo
+def campaign_values(rows=5000, seed=1) -> list:
+    rng = random.Random(seed)
+    values = []
+
+    for _ in range(rows):
+        cpf = random_cpf(rng)
+        roll = rng.random()
+
+        if roll < 0.2:
+            cpf = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+        elif roll < 0.3:
+            cpf = cpf[:-1] + str((int(cpf[-1]) + 1) % 10)
+        elif roll < 0.4:
+            cpf = cpf.lstrip("0") or "0"
+        elif roll < 0.45:
+            cpf = cpf[0] * 11
+        elif roll < 0.5:
+            cpf = f"CPF {cpf} "
+        elif roll < 0.55:
+            cpf = cpf + "1"
+        elif roll < 0.6:
+            cpf = rng.choice(["", "-", "abc", "   "])
+
+        values.append(cpf)
+
+    return values
+
+def test_batch_validation_matches_validate_cpf():
+    values = campaign_values()
+    expected = [validate_cpf(value) for value in values]
+
+    assert validate_cpfs(values).tolist() == expected
+    assert validate_cpfs(np.array(values)).tolist() == expected
+
+def test_batch_normalization_matches_normalize_cpf():
+    values = campaign_values(seed=2)
+    normalized, valid = normalize_cpfs(values)
+
+    for value, batch, ok in zip(values, normalized.tolist(), valid.tolist()):
+        single = normalize_cpf(value)
+        single_ok = single is not None and validate_cpf(single)
+
+        assert ok == single_ok
+        assert batch == (single if single_ok else "")
+
+def test_numeric_columns_restore_leading_zeros():
+    cpf = "01234567890"
+
+    assert validate_cpf(cpf)
+
+    normalized, valid = normalize_cpfs(np.array([float(cpf), 1.5, -1.0, np.nan]))
+
+    assert normalized.tolist() == [cpf, "", "", ""]
+    assert valid.tolist() == [True, False, False, False]
+    assert normalize_cpfs(np.array([int(cpf)]))[0].tolist() == [cpf]
+    assert validate_cpfs([int(cpf)]).tolist() == [False]
+
+def test_missing_values_are_invalid():
+    normalized, valid = normalize_cpfs(np.array([None, "529.982.247-25"], dtype=object))
+
+    assert normalized.tolist() == ["", "52998224725"]
+    assert valid.tolist() == [False, True]
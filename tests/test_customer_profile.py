@@ -0,0 +1,93 @@
+import json
+import pytest
+import requests
+from clients import newcorban
+from clients.state_store import get_fields
+from clients.token_cache import TokenRejectedError
+from services.customer_profile import field, get_profile
+
+cliente = {"cliente": {"pessoais": {"nome": "Maria"}, "documentos": {"7": {"numero": "123"}}, "telefones": {}, "enderecos": {}}}
+contas = [{"banco": "341", "agencia": "1", "conta": "123"}]
+
+def response(payload):
+    result = requests.Response()
+    result.status_code = 200
+    result._content = json.dumps(payload).encode()
+
+    return result
+
+# sessão da Newcorban em memória: só aceita o token de `valid`
+class FakeSession:
+    def __init__(self, valid="novo", historico=None):
+        self.valid = valid
+        self.historico = historico
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append("login")
+
+        return response({"token": self.valid})
+
+    def get(self, url, headers=None, **kwargs):
+        action = "buscar" if "action=buscar" in url else "historico"
+        self.calls.append(action)
+
+        if headers["Authorization"] != f"Bearer {self.valid}":
+            return response({"error": "Sessão expirada"})
+
+        if action == "buscar":
+            return response(cliente)
+
+        return response(contas if self.historico is None else self.historico)
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(newcorban, "get_session", lambda name: session)
+
+    return session
+
+def cache_token(fake_redis, token):
+    fake_redis.set("token:newcorban", json.dumps({"token": token, "refresh_at": 9e12}), ex=600)
+
+def test_profile_is_fetched_once_per_conversation(session):
+    profile = get_profile("c1", "12345678909")
+
+    assert profile["pessoais"] == {"nome": "Maria"}
+    assert profile["documento"] == ["7", {"numero": "123"}]
+    assert profile["contas"] == contas
+    assert get_fields("c1", field)[field]["contas"] == contas
+
+    calls = len(session.calls)
+
+    assert get_profile("c1", "12345678909")["contas"] == contas
+    assert len(session.calls) == calls
+
+def test_profile_is_fetched_again_when_the_cpf_changes(session):
+    get_profile("c1", "12345678909")
+    calls = len(session.calls)
+
+    assert get_profile("c1", "98765432100")["cpf"] == "98765432100"
+    assert len(session.calls) > calls
+
+def test_stale_token_on_the_history_call_logs_in_again(session, fake_redis):
+    cache_token(fake_redis, "velho")
+
+    profile = get_profile("c1", "12345678909")
+
+    assert profile["contas"] == contas
+    assert "login" in session.calls
+    assert get_fields("c1", field)[field]["contas"] == contas
+
+def test_failed_history_is_never_cached(session):
+    session.historico = {"error": "Sessão expirada"}
+
+    with pytest.raises(TokenRejectedError):
+        get_profile("c1", "12345678909")
+
+    assert get_fields("c1", field)[field] is None
+
+def test_empty_history_is_a_valid_answer(session):
+    session.historico = []
+
+    assert get_profile("c1", "12345678909")["contas"] == []
@@ -0,0 +1,24 @@
+from services.dedup import dedup_stats, first_delivery, forget_delivery, ttl
+
+def test_repeated_delivery_is_dropped(fake_redis):
+    assert first_delivery("message.created", "m1")
+    assert not first_delivery("message.created", "m1")
+    assert first_delivery("message.created", "m2")
+    assert dedup_stats() == {"checked": 3, "dropped": 1}
+    assert 0 < fake_redis.ttl("webhook:dedup:message.created:m1") <= ttl
+
+def test_same_id_in_another_event_is_not_a_repeat():
+    assert first_delivery("message.created", "m1")
+    assert first_delivery("ticket.updated", "m1")
+
+def test_events_without_id_are_always_processed():
+    assert first_delivery("message.created", None)
+    assert first_delivery("message.created", None)
+    assert dedup_stats() == {"checked": 0, "dropped": 0}
+
+def test_forgotten_delivery_is_accepted_again():
+    assert first_delivery("message.created", "m1")
+
+    forget_delivery("message.created", "m1")
+
+    assert first_delivery("message.created", "m1")
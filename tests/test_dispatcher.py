@@ -0,0 +1,101 @@
+import json, threading
+from collections import defaultdict
+from services import dispatcher as dispatcher_module
+from services.dispatcher import Dispatcher, dead_letter_count, dead_letter_key
+
+# Dispatcher com _send trocado: outcome(item) devolve (sucesso, pode tentar de novo) ou levanta
+def make_dispatcher(outcome):
+    dispatcher = Dispatcher()
+    sent = defaultdict(list)
+    lock = threading.Lock()
+
+    def send(item):
+        with lock:
+            sent[item["contactId"]].append((item["kwargs"]["json"]["n"], item["attempts"]))
+
+        return outcome(item)
+
+    dispatcher._send = send
+
+    return dispatcher, sent
+
+def delivered(sent, contact_id):
+    return [n for n, _ in sent[contact_id]]
+
+def test_messages_of_a_contact_keep_order_across_retries():
+    # a primeira tentativa de cada mensagem par falha com erro temporário
+    dispatcher, sent = make_dispatcher(lambda item: (item["kwargs"]["json"]["n"] % 2 == 1 or item["attempts"] > 1, True))
+
+    for n in range(6):
+        for contact_id in ("a", "b", "c"):
+            dispatcher.submit(contact_id, "POST", "/api/v1/messages", json={"n": n})
+
+    assert dispatcher.flush(timeout=10)
+
+    for contact_id in ("a", "b", "c"):
+        assert delivered(sent, contact_id) == [0, 0, 1, 2, 2, 3, 4, 4, 5]
+
+    assert dead_letter_count() == 0
+
+def test_gives_up_after_max_attempts(fake_redis):
+    failures = []
+    dispatcher, sent = make_dispatcher(lambda item: (False, True))
+
+    dispatcher.submit("a", "POST", "/api/v1/messages", on_failure=lambda: failures.append(1), json={"n": 1})
+    dispatcher.submit("a", "POST", "/api/v1/messages", json={"n": 2})
+
+    assert dispatcher.flush(timeout=10)
+    assert sent["a"] == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)]
+    assert failures == [1]
+
+    entries = [json.loads(entry) for entry in fake_redis.lrange(dead_letter_key, 0, -1)]
+
+    assert sorted(entry["kwargs"]["json"]["n"] for entry in entries) == [1, 2]
+    assert all(entry["attempts"] == dispatcher_module.max_attempts for entry in entries)
+
+def test_client_errors_are_not_retried():
+    dispatcher, sent = make_dispatcher(lambda item: (False, False))
+
+    dispatcher.submit("a", "POST", "/api/v1/messages", json={"n": 1})
+
+    assert dispatcher.flush(timeout=10)
+    assert sent["a"] == [(1, 1)]
+    assert dead_letter_count() == 1
+
+def test_worker_survives_unexpected_errors():
+    def outcome(item):
+        if item["kwargs"]["json"]["n"] == 1:
+            raise ValueError("resposta inesperada")
+
+        return True, False
+
+    dispatcher, sent = make_dispatcher(outcome)
+
+    for n in range(1, 4):
+        dispatcher.submit("a", "POST", "/api/v1/messages", json={"n": n})
+
+    assert dispatcher.flush(timeout=10)
+    assert delivered(sent, "a") == [1, 2, 3]
+    assert dead_letter_count() == 1
+
+def test_sends_share_the_redis_rate_limit(fake_redis):
+    dispatcher, sent = make_dispatcher(lambda item: (True, False))
+
+    dispatcher.submit("a", "POST", "/api/v1/messages", json={"n": 1})
+
+    assert dispatcher.flush(timeout=10)
+    assert fake_redis.keys("ratelimit:digisac*")
+
+def test_replayed_dead_letters_are_sent_again(monkeypatch):
+    # só o primeiro envio falha
+    dispatcher, sent = make_dispatcher(lambda item: (len(sent["a"]) > 1, False))
+    monkeypatch.setattr(dispatcher_module, "dispatcher", dispatcher)
+
+    dispatcher.submit("a", "POST", "/api/v1/messages", json={"n": 1})
+
+    assert dispatcher.flush(timeout=10)
+    assert dead_letter_count() == 1
+    assert dispatcher_module.replay_dead_letters() == 1
+    assert dispatcher.flush(timeout=10)
+    assert delivered(sent, "a") == [1, 1]
+    assert dead_letter_count() == 0
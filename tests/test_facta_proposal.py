@@ -0,0 +1,91 @@
+import pytest
+import requests
+from clients import api_facta
+from clients.api_facta import FactaClient, register_proposal_facta
+from clients.state_store import update_fields
+
+# stand-in da API da Facta: conta as chamadas de cada etapa e pode falhar na etapa 3
+class FakeFacta:
+    def __init__(self):
+        self.calls = []
+        self.simulations = 0
+        self.fail_etapa3 = False
+
+    def etapa1(self, token, payload):
+        self.calls.append("etapa1")
+        self.simulations += 1
+
+        return {"id_simulador": f"sim-{self.simulations}"}
+
+    def etapa2(self, token, payload):
+        self.calls.append("etapa2")
+
+        return {"codigo_cliente": f"cli-{payload['conta']}"}
+
+    def etapa3(self, token, payload):
+        self.calls.append("etapa3")
+
+        if self.fail_etapa3:
+            raise requests.ConnectionError("Facta fora do ar")
+
+        return {"codigo": f"prop-{payload['id_simulador']}-{payload['codigo_cliente']}", "url_formalizacao": "https://facta.test/f"}
+
+@pytest.fixture
+def facta(monkeypatch):
+    facta = FakeFacta()
+    monkeypatch.setenv("CREDENCIAIS_FACTA", "usuario:senha")
+    monkeypatch.setattr(FactaClient, "with_token", lambda self, call: call("token"))
+    monkeypatch.setattr(FactaClient, "proposta_etapa1_simulador", facta.etapa1)
+    monkeypatch.setattr(FactaClient, "proposta_etapa2_dados_pessoais", facta.etapa2)
+    monkeypatch.setattr(FactaClient, "proposta_etapa3_proposta_cadastro", facta.etapa3)
+    monkeypatch.setattr(api_facta, "estado_civil_code", lambda client, estado_civil: "1")
+    monkeypatch.setattr(api_facta, "cidade_code", lambda client, estado, cidade: "100")
+    update_fields("c1", simulacao_fgts={"valor": 1000})
+
+    return facta
+
+def register(conta="123"):
+    return register_proposal_facta(
+        "c1", "12345678909", "01/01/1990", "3000", "Maria", "FEMININO", "Solteiro", "1234567", "SP",
+        "01/01/2010", "11999999999", "01001000", "Rua A", "1", "Centro", "SP", "Ana", "José", False,
+        "341", "0001", conta, "CONTA_CORRENTE", "São Paulo"
+    )
+
+def test_failed_registration_resumes_after_the_last_stage_done(facta):
+    facta.fail_etapa3 = True
+
+    with pytest.raises(requests.ConnectionError):
+        register()
+
+    facta.fail_etapa3 = False
+    facta.calls.clear()
+
+    assert register() == ("prop-sim-1-cli-123", "https://facta.test/f")
+    assert facta.calls == ["etapa3"]
+
+def test_registered_proposal_is_not_sent_again(facta):
+    first = register()
+    facta.calls.clear()
+
+    assert register() == first
+    assert facta.calls == []
+
+def test_changed_bank_account_redoes_only_the_personal_data(facta):
+    facta.fail_etapa3 = True
+
+    with pytest.raises(requests.ConnectionError):
+        register()
+
+    facta.fail_etapa3 = False
+    facta.calls.clear()
+
+    assert register(conta="456") == ("prop-sim-1-cli-456", "https://facta.test/f")
+    assert facta.calls == ["etapa2", "etapa3"]
+
+def test_new_simulation_starts_a_new_proposal(facta):
+    register()
+    update_fields("c1", simulacao_fgts={"valor": 2000})
+    facta.calls.clear()
+
+    assert register() == ("prop-sim-2-cli-123", "https://facta.test/f")
+    assert facta.calls == ["etapa1", "etapa2", "etapa3"]
@@ -0,0 +1,67 @@
+import time
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from clients import circuit_breaker, http_pool
+from clients.token_cache import get_token
+from services import quote
+from services.quote import run_quotes
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+@pytest.fixture(autouse=True)
+def threads_engine(monkeypatch):
+    monkeypatch.setattr(quote, "engine", "threads")
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+def test_late_lender_is_left_out_and_its_thread_returns_at_the_deadline(monkeypatch):
+    timeouts = []
+    finished = []
+
+    # upstream que nunca responde: cada tentativa espera o timeout inteiro
+    def hang(self, request, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        time.sleep(timeout)
+
+        raise requests.exceptions.ReadTimeout("sem resposta")
+
+    def slow_lender(cpf):
+        try:
+            http_pool.get_session("facta").get("http://facta.test/fgts/saldo", timeout=60)
+        finally:
+            finished.append(time.monotonic())
+
+    monkeypatch.setattr(HTTPAdapter, "send", hang)
+    monkeypatch.setattr(quote, "pipelines", {"facta": slow_lender, "parana": lambda cpf: {"valor_liberado": 100}})
+
+    started = time.monotonic()
+
+    assert run_quotes("12345678909", timeout=0.3) == {"parana": {"valor_liberado": 100}}
+    assert wait_for(lambda: finished)
+    # as tentativas usam só o que resta do prazo, então o worker volta logo depois dele
+    assert finished[0] - started < 0.6
+    assert max(timeouts) <= 0.3
+
+def test_waiting_for_another_worker_token_refresh_stops_at_the_deadline(fake_redis, monkeypatch):
+    finished = []
+    fake_redis.set("token:facta:lock", "outro worker", ex=60)
+
+    def lender_waiting_for_token(cpf):
+        try:
+            get_token("facta", lambda: ("novo", 3600))
+        finally:
+            finished.append(time.monotonic())
+
+    monkeypatch.setattr(quote, "pipelines", {"facta": lender_waiting_for_token, "parana": lambda cpf: {"valor_liberado": 100}})
+
+    started = time.monotonic()
+
+    assert "facta" not in run_quotes("12345678909", timeout=0.3)
+    assert wait_for(lambda: finished)
+    assert finished[0] - started < 0.8
@@ -0,0 +1,93 @@
+import time
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from clients import circuit_breaker, http_pool, rate_limit
+from clients.budget import budget
+from clients.rate_limit import RateLimitExceeded, limit_for, reserve, retry_after, throttled
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limits", {})
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setenv("RATE_LIMIT_PARANA", "10:2")
+
+def test_burst_is_served_at_once_and_then_calls_wait_their_turn(fake_redis):
+    waits = [reserve("parana", "/v1/fgts") for _ in range(4)]
+
+    # o bucket vive no Redis (script Lua), compartilhado entre os workers
+    assert fake_redis.hget("ratelimit:parana:/v1/fgts", "tokens") is not None
+
+    assert waits[:2] == [0, 0]
+    # 10 req/s: cada reserva seguinte fica 100ms depois da anterior
+    assert waits[2] == pytest.approx(0.1, abs=0.02)
+    assert waits[3] == pytest.approx(0.2, abs=0.02)
+
+def test_endpoints_have_separate_buckets():
+    for _ in range(2):
+        reserve("parana", "/v1/fgts")
+
+    assert reserve("parana", "/v1/auth/token") == 0
+    assert reserve("parana", "/v1/fgts") > 0
+
+def test_wait_past_the_deadline_fails_without_taking_a_turn(fake_redis):
+    for _ in range(2):
+        reserve("parana", "/v1/fgts")
+
+    with budget(0.05):
+        with pytest.raises(RateLimitExceeded):
+            reserve("parana", "/v1/fgts")
+
+    # a chamada recusada não reservou nada: a próxima vez continua a 100ms
+    assert reserve("parana", "/v1/fgts") == pytest.approx(0.1, abs=0.02)
+
+def test_endpoint_override_and_unlimited_upstreams(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_FACTA_FGTS_SALDO", "2:4")
+
+    assert limit_for("facta", "/fgts/saldo") == (2.0, 4.0)
+    assert limit_for("facta", "/fgts/calculo") == (10.0, 20.0)
+    assert limit_for("brasilapi", "/api/cep") is None
+    assert reserve("brasilapi", "/api/cep") == 0
+
+def test_429_blocks_the_endpoint_for_every_worker():
+    blocked = throttled("parana", "/v1/fgts", {"Retry-After": "3"})
+
+    assert blocked == 3
+    assert reserve("parana", "/v1/fgts") == pytest.approx(3, abs=0.05)
+
+    with budget(1):
+        with pytest.raises(RateLimitExceeded):
+            reserve("parana", "/v1/fgts")
+
+def test_retry_after_in_seconds_or_http_date():
+    date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+
+    assert retry_after({"Retry-After": "5"}) == 5
+    assert retry_after({"Retry-After": date}) == pytest.approx(60, abs=2)
+    assert retry_after({"Retry-After": "amanhã"}) is None
+    assert retry_after({}) is None
+
+def test_429_from_the_upstream_holds_back_the_next_call(monkeypatch):
+    calls = []
+
+    def too_many(self, request, **kwargs):
+        calls.append(request.url)
+        response = requests.Response()
+        response.status_code = 429
+        response.headers["Retry-After"] = "5"
+
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, "send", too_many)
+    session = requests.Session()
+    session.mount("http://", http_pool.UpstreamAdapter("parana"))
+
+    # o Retry-After não cabe no prazo: devolve o 429 sem tentar de novo
+    with budget(1):
+        assert session.post("http://upstream.test/v1/fgts").status_code == 429
+
+    with budget(1):
+        with pytest.raises(RateLimitExceeded):
+            session.post("http://upstream.test/v1/fgts")
+
+    assert len(calls) == 1
@@ -0,0 +1,86 @@
+import time, threading
+from datetime import datetime
+import pytest
+from clients.budget import budget
+from services import simulation_cache
+from services.simulation_cache import get_or_compute, ttl_for
+
+# 10/03/2026 12:00 em São Paulo: próximo dia 20 em 9,5 dias, meia-noite em 12h
+class frozen(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 3, 10, 12, 0, tzinfo=tz)
+
+until_20th = int(9.5 * 86400)
+
+@pytest.fixture(autouse=True)
+def frozen_clock(monkeypatch):
+    monkeypatch.setattr(simulation_cache, "datetime", frozen)
+
+def test_quote_with_value_expires_with_the_positive_ttl():
+    assert ttl_for({"banco": "facta", "valorLiberado": 1500.5}) == min(simulation_cache.positive_ttl, 12 * 3600)
+
+def test_no_balance_is_cached_until_the_20th():
+    assert ttl_for({"banco": "facta", "erro": True, "mensagem": "Cliente não possui saldo FGTS (101)"}) == until_20th
+    assert ttl_for({"banco": "facta", "permitido": "NAO", "valorLiberado": None}) == until_20th
+    assert ttl_for({"banco": "parana", "valorLiberado": 0}) == until_20th
+    assert ttl_for({"banco": "parana", "valorLiberado": "0.00"}) == until_20th
+
+def test_missing_value_is_not_cached():
+    assert ttl_for({"banco": "parana", "valorLiberado": None}) == 0
+    assert ttl_for({"banco": "parana"}) == 0
+    assert ttl_for({"banco": "parana", "valorLiberado": "indisponível"}) == 0
+
+def test_error_ttls():
+    assert ttl_for({"erro": True, "mensagem": "Operação não permitida antes de 15/03/2026"}) == int(4.5 * 86400)
+    assert ttl_for({"erro": True, "mensagem": "Existe uma Operação Fiduciária em andamento"}) == simulation_cache.fiduciaria_ttl
+    assert ttl_for({"erro": True, "mensagem": "Instituição Fiduciária não possui autorização"}) == 0
+
+def test_next_balance_update_after_the_20th(monkeypatch):
+    class late(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2026, 12, 25, 12, 0, tzinfo=tz)
+
+    monkeypatch.setattr(simulation_cache, "datetime", late)
+
+    assert simulation_cache._next_balance_update().date().isoformat() == "2027-01-20"
+
+def test_concurrent_requests_share_one_computation(fake_redis):
+    calls = []
+
+    def compute(cpf):
+        calls.append(cpf)
+        time.sleep(0.2)
+
+        return {"banco": "facta", "valorLiberado": 1000}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_or_compute("facta", "123.456.789-09", compute))) for _ in range(5)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["123.456.789-09"]
+    assert results == [{"banco": "facta", "valorLiberado": 1000}] * 5
+    assert get_or_compute("facta", "12345678909", compute) == results[0]
+    assert len(calls) == 1
+
+def test_uncacheable_result_is_only_shared_briefly(fake_redis):
+    get_or_compute("parana", "12345678909", lambda cpf: {"banco": "parana", "valorLiberado": None})
+
+    assert 0 < fake_redis.ttl("simulacao:parana:12345678909") <= simulation_cache.share_ttl
+
+def test_wait_for_another_worker_is_bounded_by_the_deadline(fake_redis):
+    # outro worker está com o lock da mesma consulta e não termina
+    fake_redis.set("simulacao:facta:12345678909:lock", "outro", ex=90)
+    started = time.monotonic()
+
+    with budget(0.3):
+        result = get_or_compute("facta", "12345678909", lambda cpf: {"banco": "facta", "valorLiberado": 10})
+
+    assert result == {"banco": "facta", "valorLiberado": 10}
+    assert time.monotonic() - started < 2
@@ -0,0 +1,47 @@
+import gzip, json
+import pytest
+from clients import state_archive
+from clients.contact_lock import contact_lock
+from clients.state_archive import sweep
+from clients.state_store import update_fields
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(state_archive, "archive_dir", str(tmp_path))
+
+    return tmp_path
+
+def archived(archive_dir):
+    return [json.loads(line) for path in archive_dir.iterdir() for line in gzip.open(path, "rt", encoding="utf-8")]
+
+def test_legacy_hash_keeps_values_that_are_not_json(fake_redis, archive_dir):
+    fake_redis.hset("state:c1", mapping={"state": '"NOVO"', "CPF": "123.456.789-09"})
+
+    assert sweep(legacy=True)["legacy"] == 1
+
+    [record] = archived(archive_dir)
+
+    assert record["contactId"] == "c1"
+    assert record["state"] == {"state": "NOVO", "CPF": "123.456.789-09"}
+    assert not fake_redis.exists("state:c1")
+    assert not fake_redis.exists("lock:contact:c1:fence")
+
+def test_legacy_hash_of_a_contact_in_service_is_skipped(fake_redis, archive_dir):
+    fake_redis.hset("state:c1", mapping={"state": '"NOVO"'})
+
+    with contact_lock("c1"):
+        counts = sweep(legacy=True)
+
+    assert counts["legacy"] == 0
+    assert counts["skipped"] == 1
+    assert fake_redis.exists("state:c1")
+
+def test_legacy_sweep_keeps_the_fence_of_a_current_state(fake_redis):
+    with contact_lock("c1"):
+        update_fields("c1", state="NOVO")
+
+    fake_redis.hset("state:c1", mapping={"state": '"NOVO"'})
+    sweep(legacy=True)
+
+    assert fake_redis.exists("chatbot:state:c1")
+    assert fake_redis.exists("lock:contact:c1:fence")
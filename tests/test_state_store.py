@@ -0,0 +1,63 @@
+import json
+from clients import state_store
+from clients.state_store import detach_field, get_fields, load_state, read_state, save_state, update_fields
+
+def test_only_changed_fields_are_written(fake_redis):
+    save_state("c1", {"state": "NOVO", "CPF": "12345678909"})
+
+    state = load_state("c1")
+    state["state"] = "ANTECIPAR_FGTS"
+    fake_redis.hset("chatbot:state:c1", "CPF", json.dumps("outro worker"))
+
+    save_state("c1", state)
+
+    assert read_state("c1") == {"state": "ANTECIPAR_FGTS", "CPF": "outro worker"}
+    assert fake_redis.ttl("chatbot:state:c1") > 0
+
+def test_large_fields_are_stored_compressed(fake_redis):
+    big = {"contas": [{"banco": "341", "agencia": "0001", "conta": str(n)} for n in range(50)]}
+    update_fields("c1", perfil=big, state="NOVO")
+
+    stored = fake_redis.hgetall("chatbot:state:c1")
+
+    assert stored["perfil"].startswith("z:")
+    assert len(stored["perfil"]) < len(json.dumps(big))
+    assert stored["state"] == '"NOVO"'
+    assert get_fields("c1", "perfil", "state") == {"perfil": big, "state": "NOVO"}
+
+def test_detached_fields_are_only_read_on_request(monkeypatch):
+    monkeypatch.setattr(state_store, "_detached", set())
+    detach_field("perfil")
+    update_fields("c1", perfil={"nome": "Maria"}, state="NOVO")
+
+    state = load_state("c1")
+
+    assert state == {"state": "NOVO"}
+
+    save_state("c1", state)
+
+    assert get_fields("c1", "perfil") == {"perfil": {"nome": "Maria"}}
+
+def test_legacy_hash_is_migrated_on_first_read(fake_redis):
+    fake_redis.hset("state:c1", mapping={"state": '"NOVO"', "CPF": '"12345678909"'})
+
+    assert load_state("c1") == {"state": "NOVO", "CPF": "12345678909"}
+    assert not fake_redis.exists("state:c1")
+    assert fake_redis.hgetall("chatbot:state:c1") == {"state": '"NOVO"', "CPF": '"12345678909"'}
+
+def test_legacy_json_is_migrated_by_get_fields(fake_redis):
+    fake_redis.set("c1", json.dumps({"state": "NOVO", "CPF": "12345678909"}))
+
+    assert get_fields("c1", "CPF") == {"CPF": "12345678909"}
+    assert not fake_redis.exists("c1")
+    assert read_state("c1") == {"state": "NOVO", "CPF": "12345678909"}
+
+def test_missing_fields_of_a_current_state_do_not_look_for_legacy_keys(monkeypatch):
+    update_fields("c1", state="NOVO")
+
+    def migrate(contact_id):
+        raise AssertionError("não deveria migrar")
+
+    monkeypatch.setattr(state_store, "_migrate_legacy", migrate)
+
+    assert get_fields("c1", "CPF") == {"CPF": None}
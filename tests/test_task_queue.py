@@ -0,0 +1,83 @@
+import time, threading
+import pytest
+from services import task_queue
+from services.task_queue import RetryLater, enqueue, task
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+def test_local_backend_keeps_order_per_key():
+    processed = []
+    lock = threading.Lock()
+
+    @task
+    def record(contact_id, n):
+        time.sleep(0.001 * (n % 3))
+
+        with lock:
+            processed.append((contact_id, n))
+
+    for n in range(20):
+        for contact_id in ("a", "b"):
+            enqueue(record, contact_id, n, key=contact_id)
+
+    assert wait_for(lambda: len(processed) == 40)
+
+    for contact_id in ("a", "b"):
+        assert [n for key, n in processed if key == contact_id] == list(range(20))
+
+def test_retry_later_runs_the_task_again():
+    attempts = []
+
+    @task
+    def busy_twice(contact_id):
+        attempts.append(contact_id)
+
+        if len(attempts) < 3:
+            raise RetryLater("contato ocupado", countdown=0.01)
+
+    enqueue(busy_twice, "a", key="a")
+
+    assert wait_for(lambda: len(attempts) == 3)
+
+def test_retry_later_on_eager_backend(monkeypatch):
+    monkeypatch.setattr(task_queue, "backend", "eager")
+    attempts = []
+
+    @task
+    def busy_once():
+        attempts.append(1)
+
+        if len(attempts) < 2:
+            raise RetryLater(countdown=0)
+
+    enqueue(busy_once)
+
+    assert attempts == [1, 1]
+
+def test_retries_stop_at_the_limit(monkeypatch):
+    monkeypatch.setattr(task_queue, "backend", "eager")
+    monkeypatch.setattr(task_queue, "retry_limit", 2)
+    attempts = []
+
+    @task
+    def always_busy():
+        attempts.append(1)
+
+        raise RetryLater(countdown=0)
+
+    enqueue(always_busy)
+
+    assert len(attempts) == 3
+
+def test_unregistered_task_is_rejected():
+    def loose():
+        pass
+
+    with pytest.raises(ValueError):
+        enqueue(loose)
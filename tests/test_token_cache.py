@@ -0,0 +1,58 @@
+import json, time, threading
+from clients import token_cache
+from clients.token_cache import get_token
+
+def cache(fake_redis, name, token, refresh_in):
+    fake_redis.set(f"token:{name}", json.dumps({"token": token, "refresh_at": time.time() + refresh_in}), ex=600)
+
+def test_concurrent_misses_fetch_the_token_once():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+
+        return "novo", 3600
+
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(get_token("facta", fetch))) for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert tokens == ["novo"] * 8
+
+def test_fresh_token_is_served_from_cache(fake_redis):
+    cache(fake_redis, "facta", "atual", 60)
+
+    assert get_token("facta", lambda: ("novo", 3600)) == "atual"
+
+def test_near_expiry_token_is_refreshed(fake_redis):
+    cache(fake_redis, "facta", "atual", -1)
+
+    assert get_token("facta", lambda: ("novo", 3600)) == "novo"
+    assert json.loads(fake_redis.get("token:facta"))["token"] == "novo"
+
+def test_failed_early_refresh_falls_back_to_the_current_token(fake_redis):
+    cache(fake_redis, "facta", "atual", -1)
+
+    def fetch():
+        raise ConnectionError("banco fora do ar")
+
+    assert get_token("facta", fetch) == "atual"
+    # o lock foi liberado: a próxima chamada tenta renovar de novo
+    assert not fake_redis.exists("token:facta:lock")
+    assert get_token("facta", lambda: ("novo", 3600)) == "novo"
+
+def test_near_expiry_token_is_served_while_another_worker_refreshes(fake_redis):
+    cache(fake_redis, "facta", "atual", -1)
+    fake_redis.set("token:facta:lock", "outro", ex=60)
+
+    assert get_token("facta", lambda: ("novo", 3600)) == "atual"
+
+def test_refresh_lock_outlives_the_fetch_timeout():
+    assert token_cache.lock_ttl > token_cache.fetch_timeout
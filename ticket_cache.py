@@ -0,0 +1,38 @@
+import os, json, logging
+from clients.redis_client import redis_get, redis_set
+
+# Cache por contato de "o ticket aberto já tem atendente?".
+# É atualizado pelos eventos ticket.* que o Digisac manda no webhook; a consulta
+# a /api/v1/tickets só acontece quando o cache expira (TICKET_CACHE_TTL segundos).
+ttl = int(os.getenv("TICKET_CACHE_TTL", 600))
+
+logger = logging.getLogger(__name__)
+
+def _key(contact_id):
+    return f"ticket:{contact_id}"
+
+# devolve {"ticketId": ..., "userId": ...} ou None se não houver nada em cache
+def get_assignment(contact_id) -> dict | None:
+    cached = redis_get(_key(contact_id))
+
+    return json.loads(cached) if cached else None
+
+def set_assignment(contact_id, ticket: dict | None):
+    ticket = ticket or {}
+    user_id = ticket.get("userId") if ticket.get("isOpen", True) else None
+    value = {"ticketId": ticket.get("id"), "userId": user_id}
+
+    redis_set(_key(contact_id), json.dumps(value), ex=ttl)
+
+# atualiza o cache a partir de um evento ticket.* do webhook
+def update_from_event(event: str, data: dict):
+    contact_id = data.get("contactId")
+
+    if not contact_id:
+        return
+
+    if event.endswith(".closed") or event.endswith(".deleted"):
+        data = dict(data, isOpen=False)
+
+    set_assignment(contact_id, data)
+    logger.debug("Ticket do contato %s atualizado pelo evento %s", contact_id, event)
@@ -0,0 +1,148 @@
+import os, json, time, asyncio, logging
+import httpx
+import requests
+from .budget import remaining
+from .redis_client import redis_get, redis_set, redis_delete, acquire_lock, release_lock
+
+# Cache de tokens dos bancos no Redis, compartilhado entre todos os workers.
+# O token é renovado TOKEN_REFRESH_MARGIN segundos antes de expirar e só um
+# worker por vez faz a renovação (os outros continuam usando o token atual).
+# Se a renovação antecipada falhar, o token atual segue em uso até expirar.
+refresh_margin = int(os.getenv("TOKEN_REFRESH_MARGIN", 120))
+default_ttl = int(os.getenv("TOKEN_DEFAULT_TTL", 3600))
+# timeout das chamadas de token (Paraná e Facta usam 60s); o lock dura mais que
+# isso, senão expira no meio de uma renovação lenta e outro worker renova junto
+fetch_timeout = int(os.getenv("TOKEN_FETCH_TIMEOUT", 60))
+lock_ttl = fetch_timeout + 10
+wait_timeout = 15
+
+logger = logging.getLogger(__name__)
+
+class TokenRejectedError(Exception):
+    """Para APIs que recusam o token sem devolver 401 (ex.: Newcorban responde 200 com "error")."""
+
+def _key(name):
+    return f"token:{name}"
+
+def _read(name):
+    cached = redis_get(_key(name))
+
+    return json.loads(cached) if cached else None
+
+# fetch() deve devolver (token, expires_in em segundos)
+def _refresh(name, fetch):
+    token, expires_in = fetch()
+
+    if not token:
+        raise RuntimeError(f"Falha ao obter token {name}")
+
+    expires_in = int(expires_in or default_ttl)
+    refresh_in = max(expires_in - refresh_margin, expires_in // 2)
+    data = {"token": token, "refresh_at": time.time() + refresh_in}
+
+    redis_set(_key(name), json.dumps(data), ex=max(expires_in - 5, 1))
+    logger.info("Token %s renovado, expira em %ss", name, expires_in)
+
+    return token
+
+def get_token(name, fetch) -> str:
+    lock_key = f"{_key(name)}:lock"
+    cached = _read(name)
+
+    if cached and cached["refresh_at"] > time.time():
+        return cached["token"]
+
+    if cached:
+        # ainda válido, mas perto de expirar: renova se ninguém estiver renovando
+        owner = acquire_lock(lock_key, lock_ttl)
+
+        if not owner:
+            return cached["token"]
+
+        try:
+            return _refresh(name, fetch)
+        except Exception as exception:
+            logger.warning("Falha ao renovar o token %s, usando o atual até expirar: %s", name, exception)
+
+            return cached["token"]
+        finally:
+            release_lock(lock_key, owner)
+
+    # espera quem está renovando no máximo wait_timeout, limitado ao prazo da mensagem
+    left = remaining()
+    deadline = time.time() + (wait_timeout if left is None else max(min(wait_timeout, left), 0))
+
+    while True:
+        owner = acquire_lock(lock_key, lock_ttl)
+
+        if owner:
+            try:
+                # outro worker pode ter renovado enquanto esperávamos o lock
+                cached = _read(name)
+
+                if cached and cached["refresh_at"] > time.time():
+                    return cached["token"]
+
+                return _refresh(name, fetch)
+            finally:
+                release_lock(lock_key, owner)
+
+        time.sleep(0.1)
+        cached = _read(name)
+
+        if cached:
+            return cached["token"]
+
+        if time.time() > deadline:
+            logger.warning("Tempo esgotado esperando renovação do token %s, renovando direto", name)
+
+            return _refresh(name, fetch)
+
+# descarta o token só se ainda for o que foi recusado, pra não apagar um token novo
+def invalidate_token(name, token):
+    cached = _read(name)
+
+    if cached and cached["token"] == token:
+        redis_delete(_key(name))
+
+# executa call(token) com o token em cache; se o token for recusado renova e tenta mais uma vez
+def call_with_token(name, fetch, call):
+    token = get_token(name, fetch)
+
+    try:
+        return call(token)
+    except (requests.HTTPError, TokenRejectedError) as exception:
+        if isinstance(exception, requests.HTTPError) and (exception.response is None or exception.response.status_code != 401):
+            raise
+
+        logger.warning("Token %s recusado, renovando", name)
+        invalidate_token(name, token)
+
+        return call(get_token(name, fetch))
+
+# versão assíncrona: fetch e call são corrotinas. O token em cache é lido direto; a
+# renovação (com o mesmo lock entre workers) roda numa thread e chama fetch() de volta
+# no event loop, pra não travar o loop enquanto espera outro worker renovar
+async def get_token_async(name, fetch) -> str:
+    cached = _read(name)
+
+    if cached and cached["refresh_at"] > time.time():
+        return cached["token"]
+
+    loop = asyncio.get_running_loop()
+
+    return await asyncio.to_thread(get_token, name, lambda: asyncio.run_coroutine_threadsafe(fetch(), loop).result())
+
+async def call_with_token_async(name, fetch, call):
+    token = await get_token_async(name, fetch)
+
+    try:
+        return await call(token)
+    except (httpx.HTTPStatusError, TokenRejectedError) as exception:
+        if isinstance(exception, httpx.HTTPStatusError) and exception.response.status_code != 401:
+            raise
+
+        logger.warning("Token %s recusado, renovando", name)
+        invalidate_token(name, token)
+
+        return await call(await get_token_async(name, fetch))